@@ -0,0 +1,386 @@
+from collections import Counter
+from typing import Any, Optional
+import asyncio
+import itertools
+import json
+import time
+
+import rlp
+from aiohttp import web
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import function_signature_to_4byte_selector, keccak, to_checksum_address
+from hexbytes import HexBytes
+
+AGGREGATE3 = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+GET_ETH_BALANCE = function_signature_to_4byte_selector("getEthBalance(address)")
+BALANCE_OF = function_signature_to_4byte_selector("balanceOf(address)")
+ALLOWANCE = function_signature_to_4byte_selector("allowance(address,address)")
+APPROVE = function_signature_to_4byte_selector("approve(address,uint256)")
+DECIMALS = function_signature_to_4byte_selector("decimals()")
+# Депозит токена солверу (transferFrom на сумму из calldata)
+DEPOSIT_ERC20 = function_signature_to_4byte_selector("depositErc20(address,uint256)")
+TOKEN_ADDRESS = to_checksum_address("0x00000000000000000000000000000000000005dc")
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeChain:
+    """Эмуляция EVM-узла для бенчмарка.
+
+    Хранит балансы, nonce и мемпул, выпускает блок каждые ``block_time`` секунд и включает
+    в него ожидающие транзакции, чья ``maxFeePerGas`` покрывает base fee блока. Транзакция
+    с тем же nonce заменяет прежнюю, только если комиссия выросла на 10% и больше, как в geth.
+    Первые ``fee_spike_duration`` секунд base fee умножена на ``fee_spike`` — так
+    моделируется скачок комиссий после выдачи квоты. Каждый HTTP-запрос задерживается
+    на ``latency``. Поддерживает batch-запросы, ``eth_getBlockReceipts`` и Multicall3 ``aggregate3``,
+    а также WebSocket (``handle_ws``) с подпиской ``eth_subscribe("newHeads")``. Транзакция
+    с неизвестным calldata считается битой: ``eth_call``/``eth_estimateGas`` для неё откатываются,
+    а в блоке она получает квитанцию со статусом 0. Токен ``TOKEN_ADDRESS`` (6 знаков) поддерживает
+    ``approve``/``allowance``; депозит ``depositErc20`` списывает allowance получателя, как
+    ``transferFrom``. У доли ``preapproved`` кошельков allowance уже бесконечный.
+    """
+
+    def __init__(self, chain_id: int, block_time: float = 1.0, latency: float = 0.0,
+                 initial_balance: int = 10 ** 18, base_fee: int = 10 ** 8, fee_spike: float = 1.0,
+                 fee_spike_duration: float = 0.0, initial_token_balance: int = 10 ** 12, preapproved: float = 0.0):
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.latency = latency
+        self.initial_balance = initial_balance
+        self.initial_token_balance = initial_token_balance
+        self.preapproved = preapproved
+        self.normal_base_fee = base_fee
+        self.fee_spike_until = time.monotonic() + fee_spike_duration
+        self.base_fee = int(base_fee * fee_spike) if fee_spike_duration else base_fee
+        self.block_number = 1000
+        self.block_timestamps: dict[int, int] = {self.block_number: int(time.time())}
+        self.balances: dict[str, int] = {}
+        self.token_balances: dict[str, int] = {}
+        # (владелец, spender) -> allowance
+        self.allowances: dict[tuple[str, str], int] = {}
+        self.nonces: dict[str, int] = {}
+        self.pending_nonces: dict[str, int] = {}
+        # (отправитель, nonce) -> (хэш, value, maxFeePerGas, получатель, calldata)
+        self.mempool: dict[tuple[str, int], tuple[str, int, int, str, bytes]] = {}
+        self.replaced = 0
+        self.reverted = 0
+        self.receipts: dict[str, dict] = {}
+        self.block_receipts: dict[int, list[dict]] = {}
+        self.http_requests = 0
+        self.batch_requests = 0
+        self.calls: Counter = Counter()
+        self.ws_messages = 0
+        # WebSocket-клиенты и их подписки newHeads
+        self._ws_clients: dict[web.WebSocketResponse, set[str]] = {}
+        self._subscription_ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._produce_blocks())
+
+    async def _produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self.block_number += 1
+            self.block_timestamps[self.block_number] = int(time.time())
+            if time.monotonic() >= self.fee_spike_until:
+                self.base_fee = self.normal_base_fee
+            receipts = []
+            for sender, nonce in sorted(self.mempool):
+                tx_hash, value, max_fee, to, data = self.mempool[(sender, nonce)]
+                # Транзакции кошелька включаются строго по порядку nonce
+                if nonce != self.nonces.get(sender, 0) or max_fee < self.base_fee:
+                    continue
+                del self.mempool[(sender, nonce)]
+                self.nonces[sender] = nonce + 1
+                reverted = not self._execute(sender, to, value, data)
+                self.reverted += reverted
+                receipt = self._receipt(tx_hash, sender, len(receipts), reverted)
+                self.receipts[tx_hash] = receipt
+                receipts.append(receipt)
+            self.block_receipts[self.block_number] = receipts
+            self._notify_heads()
+
+    def _notify_heads(self):
+        header = self._block(self.block_number)
+        header.pop("transactions")
+        for ws, subscriptions in list(self._ws_clients.items()):
+            for subscription in subscriptions:
+                asyncio.ensure_future(ws.send_json({
+                    "jsonrpc": "2.0", "method": "eth_subscription",
+                    "params": {"subscription": subscription, "result": header}
+                }))
+
+    def _receipt(self, tx_hash: str, sender: str, index: int, reverted: bool = False) -> dict:
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": hex(index),
+            "blockNumber": hex(self.block_number),
+            "blockHash": "0x" + keccak(text=str(self.block_number)).hex(),
+            "from": sender,
+            "to": "0x" + "00" * 20,
+            "contractAddress": None,
+            "cumulativeGasUsed": hex(21_000 * (index + 1)),
+            "gasUsed": hex(21_000),
+            "effectiveGasPrice": hex(self.base_fee),
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x0" if reverted else "0x1",
+            "type": "0x2"
+        }
+
+    def balance(self, address: str) -> int:
+        return self.balances.get(to_checksum_address(address), self.initial_balance)
+
+    def token_balance(self, address: str) -> int:
+        return self.token_balances.get(to_checksum_address(address), self.initial_token_balance)
+
+    def allowance(self, owner: str, spender: str) -> int:
+        owner, spender = to_checksum_address(owner), to_checksum_address(spender)
+        if (owner, spender) not in self.allowances and int(keccak(text=owner)[0]) < self.preapproved * 256:
+            return 2 ** 256 - 1
+        return self.allowances.get((owner, spender), 0)
+
+    def _check(self, sender: str, to: Optional[str], value: int, data: bytes) -> str:
+        """Вид транзакции (``transfer``, ``approve``, ``deposit``); откатывающаяся бросает ``RpcError``."""
+        if not data:
+            return "transfer"
+        selector, args = data[:4], data[4:]
+        if to is not None and to_checksum_address(to) == TOKEN_ADDRESS and selector == APPROVE:
+            return "approve"
+        if selector == DEPOSIT_ERC20:
+            token, amount = abi_decode(["address", "uint256"], args)
+            if self.allowance(sender, to) < amount or self.token_balance(sender) < amount:
+                raise RpcError(3, "execution reverted: ERC20: insufficient allowance")
+            return "deposit"
+        raise RpcError(3, "execution reverted")
+
+    def _execute(self, sender: str, to: str, value: int, data: bytes) -> bool:
+        try:
+            kind = self._check(sender, to, value, data)
+        except RpcError:
+            return False
+        if kind == "approve":
+            spender, amount = abi_decode(["address", "uint256"], data[4:])
+            self.allowances[(sender, to_checksum_address(spender))] = amount
+        elif kind == "deposit":
+            amount = abi_decode(["address", "uint256"], data[4:])[1]
+            recipient = to_checksum_address(to)
+            if self.allowance(sender, recipient) != 2 ** 256 - 1:
+                self.allowances[(sender, recipient)] = self.allowance(sender, recipient) - amount
+            self.token_balances[sender] = self.token_balance(sender) - amount
+        self.balances[sender] = self.balance(sender) - value
+        return True
+
+    def _block(self, number: int) -> dict:
+        return {
+            "number": hex(number),
+            "hash": "0x" + keccak(text=str(number)).hex(),
+            "parentHash": "0x" + keccak(text=str(number - 1)).hex(),
+            "timestamp": hex(self.block_timestamps.get(number, int(time.time()))),
+            "baseFeePerGas": hex(self.base_fee),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(21_000 * len(self.block_receipts.get(number, []))),
+            "miner": "0x" + "00" * 20,
+            "extraData": "0x",
+            "transactions": [receipt["transactionHash"] for receipt in self.block_receipts.get(number, [])]
+        }
+
+    def _block_number(self, tag: str) -> int:
+        if tag in ("latest", "pending", "safe", "finalized"):
+            return self.block_number
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def _send_raw_transaction(self, raw_hex: str) -> str:
+        raw = HexBytes(raw_hex)
+        sender = Account.recover_transaction(raw)
+        if raw[0] <= 0x7f:
+            fields = TypedTransaction.from_bytes(raw).as_dict()
+            nonce, value, data, to = fields["nonce"], fields["value"], bytes(fields["data"]), fields["to"]
+            max_fee = fields.get("maxFeePerGas", fields.get("gasPrice", 0))
+        else:
+            fields = rlp.decode(bytes(raw))
+            nonce, value, data = int.from_bytes(fields[0], "big"), int.from_bytes(fields[4], "big"), fields[5]
+            to = fields[3]
+            max_fee = int.from_bytes(fields[1], "big")
+
+        if nonce < self.nonces.get(sender, 0):
+            raise RpcError(-32000, "nonce too low")
+        if nonce > self.pending_nonces.get(sender, self.nonces.get(sender, 0)):
+            raise RpcError(-32000, "nonce too high")
+        tx_hash = "0x" + keccak(bytes(raw)).hex()
+        current = self.mempool.get((sender, nonce))
+        if current is not None:
+            if current[0] == tx_hash:
+                raise RpcError(-32000, "already known")
+            if max_fee * 10 < current[2] * 11:
+                raise RpcError(-32000, "replacement transaction underpriced")
+            self.replaced += 1
+        self.pending_nonces[sender] = max(self.pending_nonces.get(sender, 0), nonce + 1)
+        self.mempool[(sender, nonce)] = (tx_hash, value, max_fee, "0x" + bytes(to).hex(), data)
+        return tx_hash
+
+    def _view(self, target: str, call_data: bytes) -> Optional[bytes]:
+        """Результат view-вызова или ``None``, если селектор не view."""
+        selector, args = call_data[:4], call_data[4:]
+        if selector == GET_ETH_BALANCE:
+            return abi_encode(["uint256"], [self.balance(abi_decode(["address"], args)[0])])
+        if selector == BALANCE_OF:
+            address = abi_decode(["address"], args)[0]
+            token = target is not None and to_checksum_address(target) == TOKEN_ADDRESS
+            return abi_encode(["uint256"], [self.token_balance(address) if token else self.balance(address)])
+        if selector == ALLOWANCE:
+            return abi_encode(["uint256"], [self.allowance(*abi_decode(["address", "address"], args))])
+        if selector == DECIMALS:
+            return abi_encode(["uint8"], [6])
+        return None
+
+    def _eth_call(self, call: dict) -> str:
+        data = bytes(HexBytes(call.get("data") or call.get("input") or "0x"))
+        if data[:4] == AGGREGATE3:
+            results = []
+            for target, _, call_data in abi_decode(["(address,bool,bytes)[]"], data[4:])[0]:
+                result = self._view(target, call_data)
+                results.append((result is not None, result or b""))
+            return "0x" + abi_encode(["(bool,bytes)[]"], [results]).hex()
+        result = self._view(call.get("to"), data)
+        if result is not None:
+            return "0x" + result.hex()
+        self._simulate(call)
+        return "0x"
+
+    def _simulate(self, call: dict) -> int:
+        """Пробное выполнение транзакции (``eth_call``/``eth_estimateGas``); возвращает расход газа."""
+        data = bytes(HexBytes(call.get("data") or call.get("input") or "0x"))
+        sender = call.get("from")
+        kind = self._check(sender, call.get("to"), 0, data)
+        value = int(call.get("value") or "0x0", 16)
+        fee = int(call.get("gas") or "0x0", 16) * int(call.get("maxFeePerGas") or call.get("gasPrice") or "0x0", 16)
+        if sender and value + fee > self.balance(sender):
+            raise RpcError(-32000, "insufficient funds for gas * price + value")
+        return {"transfer": 21_000, "approve": 46_000, "deposit": 60_000}[kind]
+
+    def call(self, method: str, params: list) -> Any:
+        self.calls[method] += 1
+        if method == "eth_chainId":
+            return hex(self.chain_id)
+        if method == "net_version":
+            return str(self.chain_id)
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_getBalance":
+            return hex(self.balance(params[0]))
+        if method == "eth_getTransactionCount":
+            address = to_checksum_address(params[0])
+            if params[1] == "pending":
+                return hex(max(self.pending_nonces.get(address, 0), self.nonces.get(address, 0)))
+            return hex(self.nonces.get(address, 0))
+        if method == "eth_gasPrice":
+            return hex(self.base_fee * 2)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(self.base_fee // 10)
+        if method == "eth_feeHistory":
+            count = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+            percentiles = params[2] if len(params) > 2 else []
+            return {
+                "oldestBlock": hex(self.block_number - count + 1),
+                "baseFeePerGas": [hex(self.base_fee)] * (count + 1),
+                "gasUsedRatio": [0.5] * count,
+                "reward": [[hex(self.base_fee // 10)] * len(percentiles)] * count
+            }
+        if method == "eth_estimateGas":
+            return hex(self._simulate(params[0]))
+        if method == "eth_call":
+            return self._eth_call(params[0])
+        if method == "eth_sendRawTransaction":
+            return self._send_raw_transaction(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        if method == "eth_getBlockReceipts":
+            return self.block_receipts.get(self._block_number(params[0]), [])
+        if method == "eth_getBlockByNumber":
+            number = self._block_number(params[0])
+            return self._block(number) if number <= self.block_number else None
+        raise RpcError(-32601, f"the method {method} does not exist/is not available")
+
+    def _handle_one(self, request: dict) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.call(request["method"], request.get("params") or [])
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        return response
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.http_requests += 1
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(body, list):
+            self.batch_requests += 1
+            return web.json_response([self._handle_one(item) for item in body])
+        return web.json_response(self._handle_one(body))
+
+    async def _handle_ws_message(self, ws: web.WebSocketResponse, request: dict):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        subscriptions = self._ws_clients.get(ws)
+        if subscriptions is None:
+            return
+        method, params = request.get("method"), request.get("params") or []
+        if method == "eth_subscribe":
+            self.calls[method] += 1
+            response = {"jsonrpc": "2.0", "id": request.get("id")}
+            if params[:1] == ["newHeads"]:
+                subscription = hex(next(self._subscription_ids))
+                subscriptions.add(subscription)
+                response["result"] = subscription
+            else:
+                response["error"] = {"code": -32602, "message": f"unsupported subscription {params[:1]}"}
+        elif method == "eth_unsubscribe":
+            self.calls[method] += 1
+            response = {"jsonrpc": "2.0", "id": request.get("id"), "result": params[0] in subscriptions}
+            subscriptions.discard(params[0])
+        else:
+            response = self._handle_one(request)
+        if not ws.closed:
+            await ws.send_json(response)
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self._ws_clients[ws] = set()
+        tasks = set()
+        try:
+            async for message in ws:
+                if message.type != web.WSMsgType.TEXT:
+                    continue
+                self.ws_messages += 1
+                # Ответы приходят по мере готовности, а не в порядке запросов, как у настоящего узла
+                task = asyncio.ensure_future(self._handle_ws_message(ws, json.loads(message.data)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            del self._ws_clients[ws]
+        return ws
+
+    def stats(self) -> dict:
+        return {
+            "http_requests": self.http_requests,
+            "batch_requests": self.batch_requests,
+            "ws_messages": self.ws_messages,
+            "calls": sum(self.calls.values()),
+            "calls_by_method": dict(self.calls.most_common()),
+            "transactions": len(self.receipts),
+            "replaced": self.replaced,
+            "reverted": self.reverted
+        }
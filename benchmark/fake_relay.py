@@ -0,0 +1,113 @@
+from typing import Optional
+import asyncio
+import itertools
+import random
+import time
+
+from aiohttp import web
+from eth_abi import encode as abi_encode
+from eth_utils import keccak
+
+from benchmark.fake_chain import APPROVE, DEPOSIT_ERC20
+
+SOLVER_ADDRESS = "0xf70da97812cb96acdf810712aa562db8dfa3dbef"
+
+
+class FakeRelay:
+    """Эмуляция ``api.relay.link`` для бенчмарка: квоты и статусы интентов.
+
+    Квота возвращает один шаг с нативным переводом на адрес солвера. Интент считается
+    исполненным через ``fill_delay`` секунд после выдачи квоты. При ``rate_limit`` больше
+    нуля запросы сверх этой частоты получают 429 с ``Retry-After``, как у настоящего API.
+    Доля ``bad_quote_rate`` квот содержит calldata, на котором транзакция откатится.
+    Для токена (``originCurrency`` не нативная) квота, как и у Relay, содержит шаг ``approve``
+    на адрес солвера и шаг ``deposit`` с ``depositErc20``.
+    """
+
+    def __init__(self, latency: float = 0.0, fill_delay: float = 2.0, relayer_fee: int = 10 ** 12,
+                 rate_limit: float = 0.0, bad_quote_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.relayer_fee = relayer_fee
+        self.rate_limit = rate_limit
+        self.bad_quote_rate = bad_quote_rate
+        self._random = random.Random(seed)
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._ids = itertools.count(1)
+        self.quoted_at: dict[str, float] = {}
+        self.quotes = 0
+        self.status_requests = 0
+        self.rejected = 0
+        self.bad_quotes = 0
+
+    def _limited(self) -> Optional[web.Response]:
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return None
+        self.rejected += 1
+        return web.json_response({"message": "Too many requests"}, status=429, headers={"Retry-After": "1"})
+
+    async def quote(self, request: web.Request) -> web.Response:
+        self.quotes += 1
+        limited = self._limited()
+        if limited is not None:
+            return limited
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        request_id = "0x" + keccak(text=f"{body['user']}:{body['amount']}:{next(self._ids)}").hex()
+        self.quoted_at[request_id] = time.monotonic()
+        bad = self._random.random() < self.bad_quote_rate
+        self.bad_quotes += bad
+        token = body["originCurrency"]
+        # Комиссия релейера — в валюте отправления (у токена 6 знаков вместо 18)
+        fee, symbol = (self.relayer_fee // 10 ** 12, "USDC") if int(token, 16) else (self.relayer_fee, "ETH")
+        common = {"from": body["user"], "chainId": body["originChainId"],
+                  "maxFeePerGas": str(2 * 10 ** 8), "maxPriorityFeePerGas": str(10 ** 7)}
+        steps = []
+        if int(token, 16):
+            approve_data = APPROVE + abi_encode(["address", "uint256"], [SOLVER_ADDRESS, int(body["amount"])])
+            steps.append(self._step("approve", request_id, {
+                **common, "to": token, "data": "0x" + approve_data.hex(), "value": "0", "gas": "60000"}))
+            deposit_data = DEPOSIT_ERC20 + abi_encode(["address", "uint256"], [token, int(body["amount"])])
+            deposit = {**common, "to": SOLVER_ADDRESS, "data": "0x" + deposit_data.hex(), "value": "0", "gas": "80000"}
+        else:
+            deposit = {**common, "to": SOLVER_ADDRESS, "data": "0x", "value": body["amount"], "gas": "21000"}
+        if bad:
+            deposit["data"] = "0xdeadbeef"
+        steps.append(self._step("deposit", request_id, deposit))
+        return web.json_response({
+            "steps": steps,
+            "fees": {"relayer": {"amount": str(fee), "currency": {"symbol": symbol, "address": token}}},
+            "details": {"operation": "send", "timeEstimate": int(self.fill_delay)}
+        })
+
+    @staticmethod
+    def _step(step_id: str, request_id: str, data: dict) -> dict:
+        return {"id": step_id, "kind": "transaction", "requestId": request_id,
+                "items": [{"status": "incomplete", "data": data}]}
+
+    async def status(self, request: web.Request) -> web.Response:
+        self.status_requests += 1
+        limited = self._limited()
+        if limited is not None:
+            return limited
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        request_id = request.query.get("requestId", "")
+        quoted_at = self.quoted_at.get(request_id)
+        if quoted_at is None:
+            return web.json_response({"status": "unknown"})
+        status = "success" if time.monotonic() - quoted_at >= self.fill_delay else "pending"
+        return web.json_response({"status": status, "inTxHashes": [], "txHashes": []})
+
+    def stats(self) -> dict:
+        return {"quotes": self.quotes, "status_requests": self.status_requests, "rejected": self.rejected,
+                "bad_quotes": self.bad_quotes}
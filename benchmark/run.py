@@ -0,0 +1,364 @@
+"""Сквозной бенчмарк: N синтетических профилей через настоящий ``main.main`` без реального газа.
+
+Локальный сервер (отдельный процесс) эмулирует JSON-RPC обеих сетей и API Relay и
+одновременно служит HTTP-прокси для профилей. Результат сохраняется в JSON, чтобы
+прогоны можно было сравнивать::
+
+    python -m benchmark.run --profiles 200 --concurrency 20 --rpc-latency 0.02
+    python -m benchmark.run --profiles 200 --concurrency 20 --compare benchmark/results/<прошлый>.json
+"""
+from typing import Optional
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmark.fake_chain import TOKEN_ADDRESS, FakeChain
+from benchmark.fake_relay import FakeRelay
+
+FROM_NETWORK = ("Ronin", 2020)
+TO_NETWORK = ("Abstract", 2741)
+
+# (фаза, состояние начала, состояние конца) по переходам журнала прогона
+PHASES = (
+    ("balance", "started", "balance_checked"),
+    ("quote", "balance_checked", "quoted"),
+    ("sign", "quoted", "signed"),
+    ("send", "signed", "sent"),
+    ("confirm", "sent", "confirmed"),
+    ("fill", "confirmed", "filled"),
+    ("profile", "started", "confirmed"),
+)
+FINISHED_STATES = ("confirmed", "skipped", "failed")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port: int, options: dict, ready):
+    async def serve():
+        chains = {
+            chain_id: FakeChain(chain_id, block_time=options["block_time"], latency=options["rpc_latency"],
+                                fee_spike=options["fee_spike"], fee_spike_duration=options["fee_spike_duration"],
+                                preapproved=options["preapproved"])
+            for chain_id in (FROM_NETWORK[1], TO_NETWORK[1])
+        }
+        relay = FakeRelay(latency=options["relay_latency"], fill_delay=options["fill_delay"],
+                          rate_limit=options["relay_rate_limit"], bad_quote_rate=options["bad_quotes"],
+                          seed=options["seed"])
+
+        async def rpc(request: web.Request) -> web.Response:
+            # Первый эндпоинт можно сделать деградировавшим (--degraded-latency)
+            if request.match_info.get("endpoint") == "0" and options["degraded_latency"]:
+                await asyncio.sleep(options["degraded_latency"])
+            return await chains[int(request.match_info["chain_id"])].handle(request)
+
+        async def stats(_: web.Request) -> web.Response:
+            return web.json_response({
+                "rpc": {str(chain_id): chain.stats() for chain_id, chain in chains.items()},
+                "relay": relay.stats()
+            })
+
+        app = web.Application(client_max_size=64 * 2 ** 20)
+        app.router.add_post("/rpc/{chain_id}/{endpoint}", rpc)
+        app.router.add_get("/ws/{chain_id}", lambda request: chains[int(request.match_info["chain_id"])].handle_ws(request))
+        app.router.add_post("/quote", relay.quote)
+        app.router.add_get("/intents/status/v2", relay.status)
+        app.router.add_get("/stats", stats)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        for chain in chains.values():
+            chain.start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def _write_inputs(directory: str, args: argparse.Namespace, port: int) -> dict[str, str]:
+    from eth_utils import keccak
+
+    paths = {name: os.path.join(directory, name) for name in
+             ("settings.json", "networks_data.json", "private_keys.txt", "proxies.txt")}
+    with open(paths["private_keys.txt"], "w", encoding="utf-8") as keys_file, \
+            open(paths["proxies.txt"], "w", encoding="utf-8") as proxies_file:
+        for i in range(args.profiles):
+            keys_file.write("0x" + keccak(text=f"relay-bench:{args.seed}:{i}").hex() + "\n")
+            proxies_file.write(f"bench{i % args.proxies}:pass@127.0.0.1:{port}\n")
+
+    networks = {}
+    for name, chain_id in (FROM_NETWORK, TO_NETWORK):
+        networks[name] = {
+            "chain_id": chain_id,
+            "rpc_url": f"http://127.0.0.1:{port}/rpc/{chain_id}/0",
+            "explorer_url": "http://127.0.0.1/",
+            "native_address": "0x0000000000000000000000000000000000000000",
+            "receiver": "0x0000000000000000000000000000000000000001"
+        }
+        if args.token == "USDC":
+            networks[name]["usdc_address"] = TOKEN_ADDRESS
+        if args.ws:
+            networks[name]["ws_url"] = f"ws://127.0.0.1:{port}/ws/{chain_id}"
+        if args.rpc_endpoints > 1:
+            networks[name]["rpc_urls"] = [f"http://127.0.0.1:{port}/rpc/{chain_id}/{n}"
+                                          for n in range(args.rpc_endpoints)]
+    with open(paths["networks_data.json"], "w", encoding="utf-8") as file:
+        json.dump(networks, file)
+
+    settings = {
+        "from_network": FROM_NETWORK[0],
+        "to_network": TO_NETWORK[0],
+        "token": args.token,
+        "delay_between_profiles_range": [0, 0],
+        "transfer_amount_range": [0.8, 0.95],
+        "min_balance_to_bridge": 0.0015,
+        "bridge_method": "A",
+        "amount": 0.0005,
+        "concurrency": args.concurrency,
+        "max_per_proxy": 0,
+        "max_per_chain": 0,
+        "balance_prefetch": not args.no_prefetch,
+        "preflight_simulation": not args.no_preflight,
+        "signing_mode": args.signing_mode,
+        "proxy_policy": args.proxy_policy,
+        "metrics_file": os.path.join(directory, "metrics.prom"),
+        "metrics_port": 0,
+        "rate_limit_rps": args.rate_limit_rps,
+        "tx_replace_after_blocks": args.replace_after_blocks
+    }
+    if args.routes > 1:
+        # Встречный маршрут: оба направления в одном прогоне, клиенты сетей общие
+        settings["routes"] = [
+            {"from_network": FROM_NETWORK[0], "to_network": TO_NETWORK[0]},
+            {"from_network": TO_NETWORK[0], "to_network": FROM_NETWORK[0]}
+        ]
+    with open(paths["settings.json"], "w", encoding="utf-8") as file:
+        json.dump(settings, file)
+    return paths
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+    return {"count": len(values), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 4)}
+
+
+def _journal_metrics(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT profile_key, state, ts FROM transitions ORDER BY ts").fetchall()
+    finally:
+        conn.close()
+
+    transitions: dict[str, dict[str, float]] = {}
+    for profile_key, state, ts in rows:
+        transitions.setdefault(profile_key, {}).setdefault(state, ts)
+
+    phases = {}
+    for phase, start, end in PHASES:
+        phases[phase] = percentiles([states[end] - states[start] for states in transitions.values()
+                                     if start in states and end in states])
+
+    started = [states["started"] for states in transitions.values() if "started" in states]
+    finished = [ts for states in transitions.values() for state, ts in states.items() if state in FINISHED_STATES]
+    outcomes = {state: sum(1 for states in transitions.values() if state in states)
+                for state in ("confirmed", "filled", "skipped", "failed")}
+    duration = max(finished) - min(started) if started and finished else 0.0
+    return {"phases": phases, "outcomes": outcomes, "duration": duration}
+
+
+async def _fetch_stats(port: int) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/stats") as response:
+            return await response.json()
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    directory = tempfile.mkdtemp(prefix="relay-bench-")
+    port = _free_port()
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(target=_serve, daemon=True, args=(port, {
+        "block_time": args.block_time, "rpc_latency": args.rpc_latency,
+        "relay_latency": args.relay_latency, "fill_delay": args.fill_delay,
+        "degraded_latency": args.degraded_latency, "relay_rate_limit": args.relay_rate_limit,
+        "fee_spike": args.fee_spike, "fee_spike_duration": args.fee_spike_duration,
+        "bad_quotes": args.bad_quotes, "seed": args.seed, "preapproved": args.preapproved
+    }, ready))
+    server.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("Локальный сервер бенчмарка не запустился")
+        paths = _write_inputs(directory, args, port)
+
+        # Адрес Relay читается при импорте модулей, поэтому они импортируются только здесь
+        # Другое имя хоста, чтобы у API Relay был свой ограничитель частоты, отдельный от RPC
+        os.environ["RELAY_API_URL"] = f"http://localhost:{port}"
+        import main
+        from modules.status_tracker import status_tracker
+        from utils.address_cache import address_cache
+        from utils.journal import journal
+        from utils.logger import logger
+
+        if not args.verbose:
+            logger.setLevel(logging.WARNING)
+        journal.path = os.path.join(directory, "journal.sqlite3")
+        address_cache.path = os.path.join(directory, "addresses.sqlite3")
+        status_tracker.state_path = os.path.join(directory, "pending_intents.json")
+
+        started = time.perf_counter()
+        options = dict(settings_path=paths["settings.json"], networks_path=paths["networks_data.json"],
+                       private_keys_path=paths["private_keys.txt"], proxies_path=paths["proxies.txt"])
+        if args.workers:
+            from modules.sharding import run_sharded
+            await run_sharded(args.workers, shard_size=args.shard_size, shard_dir=directory, **options)
+        else:
+            await main.main(**options)
+        wall_time = time.perf_counter() - started
+        # До остановки сервера: его процесс тоже дочерний и в замер попасть не должен
+        children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        server_stats = await _fetch_stats(port)
+    finally:
+        server.terminate()
+        server.join(5)
+
+    metrics = _journal_metrics(journal.path)
+    rpc_calls = sum(chain["calls"] for chain in server_stats["rpc"].values())
+    rpc_requests = sum(chain["http_requests"] for chain in server_stats["rpc"].values())
+    completed = metrics["outcomes"]["confirmed"] + metrics["outcomes"]["skipped"]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": vars(args),
+        "profiles": args.profiles,
+        "outcomes": metrics["outcomes"],
+        "duration": round(metrics["duration"], 3),
+        "wall_time": round(wall_time, 3),
+        "profiles_per_sec": round(completed / metrics["duration"], 3) if metrics["duration"] else 0.0,
+        "phases": metrics["phases"],
+        "rpc": {
+            "calls": rpc_calls,
+            "http_requests": rpc_requests,
+            "calls_per_profile": round(rpc_calls / args.profiles, 2),
+            "http_requests_per_profile": round(rpc_requests / args.profiles, 2),
+            "by_chain": server_stats["rpc"]
+        },
+        "relay": server_stats["relay"],
+        # ru_maxrss в Linux — в килобайтах. С --workers и пулом подписи основная работа идёт в дочерних
+        # процессах; для них ru_maxrss — пик самого большого из завершившихся (воркера или процесса подписи)
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_children_mb": round(children_rss / 1024, 1)
+    }
+
+
+def print_summary(result: dict, previous: Optional[dict] = None):
+    def line(label: str, value: float, old: Optional[float], unit: str = ""):
+        text = f"{label:<28}{value:>12.3f}{unit}"
+        if old:
+            text += f"   ({(value - old) / old:+.1%} к {old:.3f})"
+        print(text)
+
+    prev_phases = (previous or {}).get("phases", {})
+    print(f"\nПрофилей: {result['profiles']}, исходы: {result['outcomes']}")
+    reverted = sum(chain.get("reverted", 0) for chain in result["rpc"]["by_chain"].values())
+    if result["relay"].get("bad_quotes") or reverted:
+        print(f"Битых квот: {result['relay'].get('bad_quotes', 0)}, откатилось транзакций в сети: {reverted}")
+    line("профилей/сек", result["profiles_per_sec"], (previous or {}).get("profiles_per_sec"))
+    line("RPC вызовов на профиль", result["rpc"]["calls_per_profile"],
+         (previous or {}).get("rpc", {}).get("calls_per_profile"))
+    line("HTTP к RPC на профиль", result["rpc"]["http_requests_per_profile"],
+         (previous or {}).get("rpc", {}).get("http_requests_per_profile"))
+    line("пиковый RSS", result["peak_rss_mb"], (previous or {}).get("peak_rss_mb"), " МБ")
+    line("пиковый RSS дочерних", result["peak_rss_children_mb"], (previous or {}).get("peak_rss_children_mb"), " МБ")
+    for phase, stats in result["phases"].items():
+        if stats.get("count"):
+            line(f"{phase} p50", stats["p50"], prev_phases.get(phase, {}).get("p50"), " сек")
+            line(f"{phase} p95", stats["p95"], prev_phases.get(phase, {}).get("p95"), " сек")
+            line(f"{phase} p99", stats["p99"], prev_phases.get(phase, {}).get("p99"), " сек")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк relay bridge на локальных серверах")
+    parser.add_argument("--profiles", type=int, default=100, help="число синтетических профилей")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--proxies", type=int, default=10, help="число различных прокси")
+    parser.add_argument("--rpc-latency", type=float, default=0.02, help="задержка ответа RPC, сек")
+    parser.add_argument("--rpc-endpoints", type=int, default=1, help="число RPC-эндпоинтов на сеть")
+    parser.add_argument("--degraded-latency", type=float, default=0.0,
+                        help="дополнительная задержка первого RPC-эндпоинта, сек")
+    parser.add_argument("--ws", action="store_true", help="указать ws_url сетей (WebSocket-транспорт без прокси)")
+    parser.add_argument("--relay-rate-limit", type=float, default=0.0,
+                        help="лимит API Relay, запросов/сек: сверх него ответ 429 с Retry-After (0 — без лимита)")
+    parser.add_argument("--rate-limit-rps", type=float, default=20,
+                        help="начальная частота запросов к хосту в ограничителе бота (0 — без ограничения)")
+    parser.add_argument("--fee-spike", type=float, default=1.0,
+                        help="во сколько раз base fee выше обычной в начале прогона (комиссия квоты устаревает)")
+    parser.add_argument("--fee-spike-duration", type=float, default=0.0, help="длительность скачка комиссий, сек")
+    parser.add_argument("--replace-after-blocks", type=int, default=5,
+                        help="замена зависшей транзакции через N блоков (0 — без замены)")
+    parser.add_argument("--routes", type=int, choices=(1, 2), default=1,
+                        help="число маршрутов: 2 — добавить встречный маршрут в той же паре сетей")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="шардированный прогон в N процессах-воркерах (0 — один процесс)")
+    parser.add_argument("--shard-size", type=int, default=25, help="профилей в шарде при --workers")
+    parser.add_argument("--relay-latency", type=float, default=0.05, help="задержка ответа API Relay, сек")
+    parser.add_argument("--block-time", type=float, default=1.0, help="время блока, сек")
+    parser.add_argument("--fill-delay", type=float, default=2.0, help="время исполнения интента, сек")
+    parser.add_argument("--signing-mode", choices=("inline", "thread", "process"), default="process")
+    parser.add_argument("--proxy-policy", choices=("strict", "fastest"), default="strict")
+    parser.add_argument("--no-prefetch", action="store_true", help="отключить предзагрузку балансов")
+    parser.add_argument("--bad-quotes", type=float, default=0.0,
+                        help="доля квот с calldata, на котором транзакция откатится")
+    parser.add_argument("--no-preflight", action="store_true", help="отключить пробный прогон транзакций")
+    parser.add_argument("--token", choices=("NATIVE", "USDC"), default="NATIVE",
+                        help="бриджить нативную монету или USDC (approve + депозит)")
+    parser.add_argument("--preapproved", type=float, default=0.0,
+                        help="доля кошельков с уже выданным бесконечным allowance (для --token USDC)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="путь к JSON с результатом (по умолчанию benchmark/results/)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--verbose", action="store_true", help="показывать логи бота")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+
+    result = asyncio.run(run_benchmark(args))
+
+    output = args.output or os.path.join("benchmark", "results", f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2, ensure_ascii=False)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+    print_summary(result, previous)
+    print(f"\nРезультат сохранён в {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+from typing import Any, Optional
+import asyncio
+import itertools
+
+import aiohttp
+
+from web3 import AsyncHTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from web3.types import RPCEndpoint, RPCResponse
+
+from client.rpc_pool import BROADCAST_METHODS, RpcPool, get_rpc_pool, is_rate_limited
+from client.ws_transport import WsConnection, WsUnavailable, get_ws_connection
+from utils.logger import logger
+from utils.metrics import metrics, proxy_label
+from utils.rate_limiter import rate_limiter
+from utils.session_pool import session_pool
+
+
+class RpcBatcher:
+    """Склеивает JSON-RPC вызовы к одному эндпоинту в batch-запросы.
+
+    Вызовы, пришедшие в течение ``window`` секунд (например, из одного ``asyncio.gather``),
+    отправляются одним HTTP-запросом с массивом. Если эндпоинт не поддерживает batch,
+    батчер запоминает это и дальше шлёт вызовы по одному.
+    """
+
+    def __init__(self, endpoint_uri: str, proxy: Optional[str] = None, window: float = 0.005,
+                 max_batch_size: int = 50, chain: int | str = ""):
+        self.endpoint_uri = endpoint_uri
+        self.proxy = proxy
+        self.chain = chain
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.supports_batch = True
+        self._ids = itertools.count(1)
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self.calls = 0
+        self.http_requests = 0
+        self.batches = 0
+
+    @property
+    def idle(self) -> bool:
+        return not self._pending and not self._tasks
+
+    async def request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params or [],
+            "id": next(self._ids)
+        }, future))
+        self.calls += 1
+        metrics.inc("rpc_calls_total", chain=self.chain, method=method)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        with metrics.timer("rpc_request_seconds", chain=self.chain, method=method) as timer:
+            response = await future
+            if isinstance(response, dict) and "error" in response:
+                timer.outcome = "error"
+            return response
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._send(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _post(self, payload: Any) -> tuple[int, Any]:
+        session = await session_pool.get(self.proxy)
+        self.http_requests += 1
+        proxy = proxy_label(self.proxy)
+        try:
+            with metrics.timer("http_request_seconds", target="rpc", chain=self.chain, proxy=proxy):
+                async with rate_limiter.request(
+                        session, "POST", self.endpoint_uri,
+                        data=FriendlyJsonSerde().json_encode(payload, cls=Web3JsonEncoder),
+                        headers={"Content-Type": "application/json"},
+                        proxy=session_pool.proxy_url(self.proxy)
+                ) as response:
+                    if response.status >= 500 or response.status == 429:
+                        response.raise_for_status()
+                    result = await response.json(content_type=None)
+            items = result if isinstance(result, list) else [result]
+            limiter = rate_limiter.get(self.endpoint_uri, session_pool.proxy_url(self.proxy))
+            if limiter is not None and any(is_rate_limited(item) for item in items):
+                # Некоторые провайдеры сообщают о лимите ошибкой JSON-RPC со статусом 200
+                limiter.record(limited=True)
+            return response.status, result
+        except (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError):
+            metrics.inc("proxy_errors_total", proxy=proxy)
+            raise
+
+    async def _send_single(self, request: dict, future: asyncio.Future):
+        try:
+            status, result = await self._post(request)
+            if status >= 400 and not isinstance(result, dict):
+                raise ValueError(f"RPC {self.endpoint_uri} ответил статусом {status}")
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    async def _send(self, pending: list[tuple[dict, asyncio.Future]]):
+        if len(pending) == 1 or not self.supports_batch:
+            await asyncio.gather(*(self._send_single(request, future) for request, future in pending))
+            return
+
+        try:
+            status, result = await self._post([request for request, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if status >= 400 or not isinstance(result, list):
+            # Эндпоинт не принимает массивы — переходим на одиночные запросы
+            self.supports_batch = False
+            metrics.inc("rpc_retries_total", len(pending), chain=self.chain, reason="batch_unsupported")
+            logger.warning(f"⚠️ RPC {self.endpoint_uri} не поддерживает batch-запросы, отправляем по одному\n")
+            await self._send(pending)
+            return
+
+        self.batches += 1
+        responses = {item.get("id"): item for item in result if isinstance(item, dict)}
+        missing = []
+        for request, future in pending:
+            response = responses.get(request["id"])
+            if response is None:
+                missing.append((request, future))
+            elif not future.done():
+                future.set_result(response)
+
+        if missing:
+            metrics.inc("rpc_retries_total", len(missing), chain=self.chain, reason="missing_response")
+            await asyncio.gather(*(self._send_single(request, future) for request, future in missing))
+
+
+_batchers: dict[tuple[str, Optional[str]], RpcBatcher] = {}
+# Счётчики освобождённых батчеров, чтобы итоговая статистика учитывала весь прогон
+_released_stats = {"calls": 0, "http_requests": 0, "batches": 0}
+
+
+def get_batcher(endpoint_uri: str, proxy: Optional[str] = None, chain: int | str = "") -> RpcBatcher:
+    """Возвращает общий батчер для пары (эндпоинт, прокси)."""
+    key = (endpoint_uri, proxy)
+    if key not in _batchers:
+        _batchers[key] = RpcBatcher(endpoint_uri, proxy, chain=chain)
+    return _batchers[key]
+
+
+def release_batcher(endpoint_uri: str, proxy: Optional[str] = None):
+    """Удаляет батчер пары (эндпоинт, прокси), если у него нет запросов в полёте."""
+    key = (endpoint_uri, proxy)
+    batcher = _batchers.get(key)
+    if batcher is None or not batcher.idle:
+        return
+    del _batchers[key]
+    for name in _released_stats:
+        _released_stats[name] += getattr(batcher, name)
+
+
+def log_batch_stats():
+    calls = _released_stats["calls"] + sum(batcher.calls for batcher in _batchers.values())
+    if not calls:
+        return
+    http_requests = _released_stats["http_requests"] + sum(batcher.http_requests for batcher in _batchers.values())
+    batches = _released_stats["batches"] + sum(batcher.batches for batcher in _batchers.values())
+    logger.info(
+        f"📦 JSON-RPC: вызовов {calls}, HTTP-запросов {http_requests}, batch-запросов {batches} "
+        f"(в среднем {calls / max(http_requests, 1):.2f} вызова на запрос)\n"
+    )
+
+
+class BatchingHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider, отправляющий запросы через общий :class:`RpcBatcher`.
+
+    Если у сети несколько эндпоинтов (``endpoints``), вызовы распределяются через
+    :class:`RpcPool`, а у каждого эндпоинта свой батчер. Если задан ``ws_url`` и запросы
+    идут без прокси, они мультиплексируются через общее WebSocket-соединение сети, а пока
+    оно недоступно — отправляются по HTTP.
+    """
+
+    def __init__(self, endpoint_uri: str, proxy: Optional[str] = None, chain: int | str = "",
+                 endpoints: Optional[list[str]] = None, ws_url: Optional[str] = None):
+        request_kwargs = {"proxy": session_pool.proxy_url(proxy)} if proxy else {}
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self.proxy = proxy
+        self.chain = chain
+        self.pool: Optional[RpcPool] = get_rpc_pool(chain, endpoints) if endpoints and len(endpoints) > 1 else None
+        # Общее соединение раскрыло бы узлу связь кошельков с разными прокси, поэтому только без прокси
+        self.ws: Optional[WsConnection] = get_ws_connection(ws_url, chain) if ws_url and not proxy else None
+
+    @property
+    def batcher(self) -> RpcBatcher:
+        # Батчер берётся из реестра на каждый запрос: простаивающий батчер может быть освобождён
+        return get_batcher(str(self.endpoint_uri), self.proxy, self.chain)
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        # Рассылка транзакции на несколько эндпоинтов остаётся за пулом HTTP
+        if self.ws is not None and self.ws.available and not (self.pool and method in BROADCAST_METHODS):
+            try:
+                return await self.ws.request(method, params)
+            except (WsUnavailable, asyncio.TimeoutError):
+                metrics.inc("ws_fallbacks_total", chain=self.chain)
+
+        if self.pool is None:
+            return await self.batcher.request(method, params)
+        return await self.pool.request(
+            method, lambda url: get_batcher(url, self.proxy, self.chain).request(method, params), self.proxy)
@@ -1,31 +1,60 @@
-from functools import wraps
-from aiohttp import ClientHttpProxyError
+from functools import lru_cache, wraps
+from aiohttp import ClientHttpProxyError, ClientProxyConnectionError
 from eth_account import Account
+from eth_account.signers.local import LocalAccount
+from eth_keys import keys
 from web3.middleware.geth_poa import async_geth_poa_middleware
-from web3.exceptions import TransactionNotFound
-from web3 import AsyncWeb3, AsyncHTTPProvider
+from web3 import AsyncWeb3
 from web3.contract import AsyncContract
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 from web3.types import TxParams
 from hexbytes import HexBytes
+from eth_utils import keccak
+from web3.exceptions import TransactionNotFound
+from client.batching import BatchingHTTPProvider, release_batcher
+from client.gas_oracle import get_gas_oracle
+from client.nonce_manager import get_nonce_manager, is_nonce_error, release_nonce_manager
+from client.receipt_watcher import get_receipt_watcher
+from client.replacement import PendingTx, replacer
+from client.signer import SignedTx, signer
 from client.networks import Network
+from utils.metrics import metrics, proxy_label
+from utils.proxy_pool import proxy_manager
+from utils.session_pool import session_pool
 import asyncio
 import logging
 import json
 
-with open("abi/erc20_abi.json", "r", encoding="utf-8") as file:
-    ERC20_ABI = json.load(file)
-
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
+
+PROXY_ERRORS = (ClientHttpProxyError, ClientProxyConnectionError)
+# Лимит газа approve, если узел не смог его оценить
+APPROVE_GAS_LIMIT = 100_000
+
+# Децималы токенов по (сеть, адрес): не меняются, запрашиваются один раз за прогон
+_token_decimals: dict[tuple[int, str], int] = {}
+
+
+@lru_cache(maxsize=None)
+def load_abi(name: str) -> list:
+    """Читает ABI из папки abi при первом обращении."""
+    with open(f"abi/{name}.json", "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def __getattr__(name: str):
+    # ERC20_ABI остаётся доступен как атрибут модуля, но читается с диска только по требованию
+    if name == "ERC20_ABI":
+        return load_abi("erc20_abi")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def retry_on_proxy_error(max_attempts: int = 3, fallback_no_proxy: bool = True):
-    """Декоратор для повторных попыток при ошибках прокси."""
+    """Декоратор для повторных попыток при ошибках прокси.
+
+    После ``max_attempts`` неудач делается последняя попытка через другой прокси,
+    если политика прокси допускает замену (см. ``Client._disable_proxy``).
+    """
 
     def decorator(func):
         @wraps(func)
@@ -35,18 +64,17 @@ def retry_on_proxy_error(max_attempts: int = 3, fallback_no_proxy: bool = True):
             while attempts < max_attempts:
                 try:
                     return await func(self, *args, **kwargs)
-                except ClientHttpProxyError as e:
+                except PROXY_ERRORS as e:
                     attempts += 1
                     last_error = e
                     logger.warning(f"🧹 Ошибка прокси (попытка {attempts}/{max_attempts}): {e}")
-                    if attempts == max_attempts and fallback_no_proxy:
-                        logger.info("Отключаем прокси для последней попытки")
-                        self._disable_proxy()
+                    if attempts == max_attempts and fallback_no_proxy and self._disable_proxy():
                         try:
                             return await func(self, *args, **kwargs)
-                        except ClientHttpProxyError as e:
+                        except PROXY_ERRORS as e:
                             last_error = e
-                    await asyncio.sleep(1)
+                    if attempts < max_attempts:
+                        await asyncio.sleep(1)
             raise ValueError(f"❌ Не удалось выполнить запрос после {max_attempts} попыток: {last_error}")
 
         return wrapper
@@ -54,19 +82,49 @@ def retry_on_proxy_error(max_attempts: int = 3, fallback_no_proxy: bool = True):
     return decorator
 
 
+def is_rejected(error: Exception) -> bool:
+    """Узел ответил на отправку ошибкой JSON-RPC, то есть транзакцию точно не принял.
+
+    Ошибки соединения, таймауты и 5xx так не считаются: запрос мог дойти до узла.
+    Ответ «уже известна» означает, что транзакция в мемпуле узла.
+    """
+    if not (isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict)):
+        return False
+    message = str(error.args[0].get("message", "")).lower()
+    return "already known" not in message and "known transaction" not in message
+
+
+def make_web3(rpc_url: str, network: Network, proxy: Optional[str] = None,
+              rpc_urls: Optional[list[str]] = None, ws_url: Optional[str] = None) -> AsyncWeb3:
+    """Создаёт AsyncWeb3 для сети: вызовы, сделанные одновременно, уходят одним batch-запросом.
+
+    При нескольких ``rpc_urls`` запросы распределяются между ними (см. ``RpcPool``),
+    с ``ws_url`` запросы без прокси идут через WebSocket сети (см. ``WsConnection``).
+    """
+    w3 = AsyncWeb3(BatchingHTTPProvider(rpc_url, proxy=proxy, chain=network.chain_id, endpoints=rpc_urls,
+                                        ws_url=ws_url))
+    # Применяем middleware для PoA-сетей
+    if network.is_poa:
+        w3.middleware_onion.clear()
+        w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+    return w3
+
+
 class Client:
     def __init__(self, from_address: str, chain_id: int, chain_id_to: int, rpc_url: str,
-                 private_key: str, explorer_url: str, token: str, amount: float | int, proxy: Optional[str] = None):
-        request_kwargs = {"proxy": f"http://{proxy}"} if proxy else {}
+                 private_key: str, explorer_url: str, token: str, amount: float | int, proxy: Optional[str] = None,
+                 address: Optional[str] = None, rpc_urls: Optional[list[str]] = None, ws_url: Optional[str] = None):
         self.explorer_url = explorer_url
         self.private_key = private_key
         self.from_address = from_address
-        self.account = Account.from_key(self.private_key)
+        self._signing_key: Optional[keys.PrivateKey] = None
         self.chain_id = chain_id
         self.chain_id_to = chain_id_to
         self.token = token
         self.amount = amount
         self.rpc_url = rpc_url
+        self.rpc_urls = rpc_urls or [rpc_url]
+        self.ws_url = ws_url
         self.proxy = proxy
 
         # Определяем сеть
@@ -78,48 +136,109 @@ class Client:
         self.chain_id = self.network.chain_id
 
         # Инициализация AsyncWeb3
-        self.w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url, request_kwargs=request_kwargs))
-        # Применяем middleware для PoA-сетей
-        if self.network.is_poa:
-            self.w3.middleware_onion.clear()
-            self.w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        self.w3 = make_web3(rpc_url, self.network, proxy, self.rpc_urls, ws_url)
+        session_pool.acquire(proxy)
+        # Данные о газе общие для всех клиентов сети и не привязаны к прокси кошелька
+        self.gas_oracle = get_gas_oracle(
+            self.chain_id, lambda: make_web3(rpc_url, self.network, rpc_urls=self.rpc_urls, ws_url=ws_url))
+        self.receipt_watcher = get_receipt_watcher(
+            self.chain_id, lambda: make_web3(rpc_url, self.network, rpc_urls=self.rpc_urls, ws_url=ws_url),
+            self.gas_oracle)
 
         self.eip_1559 = True
-        self.address = self.w3.to_checksum_address(
-            self.w3.eth.account.from_key(self.private_key).address)
+        # Адрес обычно уже вычислен заранее (кэш адресов), иначе ключ разбирается здесь один раз
+        self.address = (self.w3.to_checksum_address(address) if address
+                        else self.signing_key.public_key.to_checksum_address())
+        self.nonces = get_nonce_manager(self.chain_id, self.address, self.w3)
+        # Отправленные транзакции по хэшу: нужны, чтобы переподписать зависшую с тем же nonce
+        self._sent_txs: dict[HexBytes, PendingTx] = {}
+        # Хэш последней подтверждённой транзакции: после замены он отличается от отправленного
+        self.confirmed_tx_hash: Optional[str] = None
+        # Подписанная транзакция, отправка которой оборвалась: узел мог успеть её принять
+        self.unconfirmed_send_hash: Optional[str] = None
+        self.unconfirmed_send_raw: Optional[str] = None
+
+    @property
+    def signing_key(self) -> keys.PrivateKey:
+        # Вывод публичного ключа выполняется один раз на клиента, а не при каждой подписи
+        if self._signing_key is None:
+            self._signing_key = keys.PrivateKey(HexBytes(self.private_key))
+        return self._signing_key
+
+    @property
+    def account(self) -> LocalAccount:
+        return LocalAccount(self.signing_key, Account)
+
+    async def close(self):
+        """Освобождает ресурсы профиля: сессию прокси, батчер и менеджер nonce."""
+        release_nonce_manager(self.chain_id, self.address)
+        for endpoint in self.rpc_urls:
+            release_batcher(endpoint, self.proxy)
+        await session_pool.release(self.proxy)
+
+    def _disable_proxy(self) -> bool:
+        """Переключает клиента на другой здоровый прокси после серии ошибок.
+
+        При строгой привязке кошелёк↔прокси замены нет: возвращает ``False``.
+        """
+        replacement = proxy_manager.replacement(self.proxy)
+        if replacement is None:
+            logger.info(f"Прокси {proxy_label(self.proxy)} закреплён за кошельком, замена не выполняется")
+            return False
+
+        logger.info(f"🔀 Переключаемся с прокси {proxy_label(self.proxy)} на {proxy_label(replacement)}")
+        for endpoint in self.rpc_urls:
+            release_batcher(endpoint, self.proxy)
+        session_pool.acquire(replacement)
+        # Старую сессию освобождаем в фоне, чтобы не блокировать повтор запроса
+        asyncio.ensure_future(session_pool.release(self.proxy))
+        proxy_manager.release(self.proxy)
+        proxy_manager.acquire(replacement)
+        self.proxy = replacement
+        self.w3 = make_web3(self.rpc_url, self.network, replacement, self.rpc_urls, self.ws_url)
+        self.nonces.w3 = self.w3
+        return True
 
     async def set_amount(self, real_amount: int):
         self.amount = real_amount
 
     # Получение баланса нативного токена
+    @retry_on_proxy_error()
     async def get_native_balance(self) -> float:
         """Получает баланс нативного токена в ETH/BNB/MATIC и т.д."""
         balance_wei = await self.w3.eth.get_balance(self.address)
         return balance_wei
 
     # Получение баланса ERC20
+    @retry_on_proxy_error()
     async def get_erc20_balance(self, address: str) -> float | int:
 
         contract = self.w3.eth.contract(
-            address=self.w3.to_checksum_address(address), abi=ERC20_ABI)
+            address=self.w3.to_checksum_address(address), abi=load_abi("erc20_abi"))
         try:
             balance = await contract.functions.balanceOf(self.address).call()
             return balance
+        except PROXY_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка при получении баланса ERC20: {e}")
             return 0
 
-    async def get_allowance(self, token_address: str, owner: str, spender: str) -> int:
+    @retry_on_proxy_error()
+    async def get_allowance(self, token_address: str, owner: str, spender: str) -> Optional[int]:
+        """Allowance ``owner`` → ``spender``; ``None``, если запрос не удался."""
         try:
-            contract = await self.get_contract(token_address, ERC20_ABI)
+            contract = await self.get_contract(token_address, load_abi("erc20_abi"))
             allowance = await contract.functions.allowance(
                 self.w3.to_checksum_address(owner),
                 self.w3.to_checksum_address(spender)
             ).call()
             return allowance
+        except PROXY_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка при получении allowance: {e}")
-            return 0
+            return None
 
     # Создание объекта контракт для дальнейшего обращения к нему
     async def get_contract(self, contract_address: str, abi: list) -> AsyncContract:
@@ -129,26 +248,29 @@ class Client:
 
     # Получение суммы газа за транзакцию
     async def get_tx_fee(self) -> int:
+        estimated_gas = 70_000
         try:
-            fee_history = await self.w3.eth.fee_history(10, "latest", [50])
-            base_fee = fee_history['baseFeePerGas'][-1]
-            max_priority_fee = await self.w3.eth.max_priority_fee
-            estimated_gas = 70_000
-            max_fee_per_gas = (base_fee + max_priority_fee) * estimated_gas
-
-            return max_fee_per_gas
+            gas = await self.gas_oracle.get()
         except Exception as e:
-            logger.warning(f"Ошибка при расчёте комиссии, используем fallback: {e}")
-            fallback_gas_price = await self.w3.eth.gas_price
-            return fallback_gas_price * 70_000
+            logger.warning(f"Ошибка при получении данных о газе, используем fallback: {e}")
+            return await self.w3.eth.gas_price * estimated_gas
+
+        if not gas.is_eip_1559:
+            return gas.gas_price * estimated_gas
+        max_fee_per_gas = (gas.base_fee + gas.priority_fee) * estimated_gas
+        return max_fee_per_gas
+
+    async def token_decimals(self, token_address: str) -> int:
+        key = (self.chain_id, token_address.lower())
+        if key not in _token_decimals:
+            contract = await self.get_contract(token_address, load_abi("erc20_abi"))
+            _token_decimals[key] = await contract.functions.decimals().call()
+        return _token_decimals[key]
 
     # Преобразование в веи
+    @retry_on_proxy_error()
     async def to_wei_main(self, number: int | float, token_address: Optional[str] = None):
-        if token_address:
-            contract = await self.get_contract(token_address, ERC20_ABI)
-            decimals = await contract.functions.decimals().call()
-        else:
-            decimals = 18
+        decimals = await self.token_decimals(token_address) if token_address else 18
 
         unit_name = {
             6: "mwei",
@@ -161,12 +283,9 @@ class Client:
         return self.w3.to_wei(number, unit_name)
 
     # Преобразование из веи
+    @retry_on_proxy_error()
     async def from_wei_main(self, number: int | float, token_address: Optional[str] = None):
-        if token_address:
-            contract = await self.get_contract(token_address, ERC20_ABI)
-            decimals = await contract.functions.decimals().call()
-        else:
-            decimals = 18
+        decimals = await self.token_decimals(token_address) if token_address else 18
 
         unit_name = {
             6: "mwei",
@@ -179,48 +298,52 @@ class Client:
         return self.w3.from_wei(number, unit_name)
 
     # Approve
-    async def approve_usdc(self, usdc_address, spender, amount, eip_1559: bool):
-        contract = await self.get_contract(usdc_address, ERC20_ABI)
-        owner = self.address
-        nonce = await self.w3.eth.get_transaction_count(owner)
-        chain_id = await self.w3.eth.chain_id
-
-        tx_params = {
-            'from': owner,
-            'nonce': nonce,
-            'gas': 300_000,
-            'chainId': chain_id
+    async def approve_usdc(self, usdc_address, spender, amount, eip_1559: bool) -> Optional[str]:
+        """Отправляет approve и возвращает хэш (``None`` — не отправлен), не дожидаясь квитанции.
+
+        Газ оценивает узел, комиссия берётся из общего оракула газа сети, nonce — из менеджера
+        nonce, поэтому следующую транзакцию кошелька (бридж) можно отправить сразу за approve.
+        """
+        contract = await self.get_contract(usdc_address, load_abi("erc20_abi"))
+        transaction: TxParams = {
+            "chainId": self.chain_id,
+            "from": self.address,
+            "to": contract.address,
+            "value": 0,
+            "data": contract.encodeABI(fn_name="approve", args=[self.w3.to_checksum_address(spender), amount])
         }
 
+        # Оценка газа и данные о комиссии уходят в RPC одним batch-запросом
+        estimate, gas = await asyncio.gather(self.w3.eth.estimate_gas(transaction), self.gas_oracle.get(),
+                                             return_exceptions=True)
+        if isinstance(gas, BaseException):
+            raise gas
+        if isinstance(estimate, BaseException):
+            logger.warning(f"Не удалось оценить газ approve, используем {APPROVE_GAS_LIMIT}: {estimate}")
+            gas_limit = APPROVE_GAS_LIMIT
+        else:
+            gas_limit = int(estimate * 1.2)
+
         if eip_1559:
-            base_fee = await self.w3.eth.gas_price
+            base_fee = gas.gas_price
             max_priority_fee = int(base_fee * 0.1) or 1_000_000  # Минимальная чаевая
-            max_fee = int(base_fee * 1.5 + max_priority_fee)
-
-            tx_params.update({
-                'maxPriorityFeePerGas': max_priority_fee,
-                'maxFeePerGas': max_fee,
-                'type': '0x2'
+            transaction.update({
+                "maxPriorityFeePerGas": max_priority_fee,
+                "maxFeePerGas": int(base_fee * 1.5 + max_priority_fee),
+                "type": "0x2"
             })
         else:
-            tx_params['gasPrice'] = int(await self.w3.eth.gas_price * 1.25)
+            transaction["gasPrice"] = int(gas.gas_price * 1.25)
 
-        # Формирование транзакции approve
-        tx = await contract.functions.approve(spender, amount).build_transaction(tx_params)
-
-        # Подпись и отправка
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.private_key)
-        tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
-
-        return receipt
+        transaction["nonce"] = await self.nonces.next_nonce()
+        return await self.sign_and_send_tx(transaction, external_gas=gas_limit)
 
     # Подготовка транзакции
     async def prepare_tx(self, to_address: str, data: str, max_fee_per_gas, max_priority_fee_per_gas,
                          value: Union[int, float] = 0) -> TxParams:
         transaction: TxParams = {
-            "chainId": await self.w3.eth.chain_id,
-            "nonce": await self.w3.eth.get_transaction_count(self.address),
+            "chainId": self.chain_id,
+            "nonce": await self.nonces.next_nonce(),
             "from": self.address,
             "value": value,
             "data": data,
@@ -238,61 +361,144 @@ class Client:
                 "type": "0x2",
             })
         else:
-            transaction["gasPrice"] = int((await self.w3.eth.gas_price) * 1.25)
+            transaction["gasPrice"] = int((await self.gas_oracle.get()).gas_price * 1.25)
 
         return transaction
 
     # Подпись и отправка транзакции
     async def sign_and_send_tx(self, transaction: TxParams, without_gas: bool = False,
-                               external_gas: Optional[int] = None):
+                               external_gas: Optional[int] = None,
+                               on_signed: Optional[Callable[[str, str], None]] = None):
+        """Подписывает и отправляет транзакцию. ``on_signed(hash, raw)`` вызывается до отправки."""
+        nonce = transaction.get("nonce")
+        self.unconfirmed_send_hash = self.unconfirmed_send_raw = None
+        signed, sending = None, False
         try:
+            if nonce is None:
+                nonce = await self.nonces.next_nonce()
+                transaction['nonce'] = nonce
 
             if not without_gas:
                 if external_gas:
                     transaction["gas"] = int(external_gas)
                 else:
                     transaction["gas"] = int((await self.w3.eth.estimate_gas(transaction)) * 1.5)
-            nonce = await self.w3.eth.get_transaction_count(self.address)
-            transaction['nonce'] = nonce
-            signed = self.w3.eth.account.sign_transaction(transaction, self.private_key)
+            with metrics.phase("sign", self.chain_id):
+                signed = await signer.sign(self.signing_key, transaction)
             signed_raw_tx = signed.raw_transaction
             logger.info("✅ Транзакция подписана\n")
-
-            tx_hash_bytes = await self.w3.eth.send_raw_transaction(signed_raw_tx)
+            if on_signed is not None:
+                on_signed(self.w3.to_hex(signed.hash), self.w3.to_hex(signed_raw_tx))
+            sending = True
+
+            with metrics.phase("send", self.chain_id):
+                tx_hash_bytes = await self.w3.eth.send_raw_transaction(signed_raw_tx)
+            self.nonces.mark_sent(nonce)
+            self._sent_txs[HexBytes(tx_hash_bytes)] = replacer.track(transaction, tx_hash_bytes)
             tx_hash_hex = self.w3.to_hex(tx_hash_bytes)
             logger.info("✅ Транзакция отправлена: %s\n", tx_hash_hex)
 
             return tx_hash_hex
         except Exception as e:
             logger.error(f"❌ Ошибка при отправке транзакции: {e}")
+            if sending and not is_rejected(e):
+                # Транзакция ушла из процесса, и узел мог её принять: nonce остаётся за ней,
+                # а подписанная транзакция сохраняется для повторной отправки (см. ``rebroadcast``)
+                self.nonces.mark_sent(nonce)
+                self._sent_txs[HexBytes(signed.hash)] = replacer.track(transaction, signed.hash)
+                self.unconfirmed_send_hash = self.w3.to_hex(signed.hash)
+                self.unconfirmed_send_raw = self.w3.to_hex(signed.raw_transaction)
+                return None
+            await self._recover_nonce(nonce, e)
             return None
 
-    # Ожидание результата транзакции
-    async def wait_tx(self, tx_hash: Union[str, HexBytes], explorer_url: Optional[str] = None) -> bool:
-        total_time = 0
-        timeout = 120
-        poll_latency = 10
+    async def rebroadcast(self, raw_tx: str) -> Optional[bool]:
+        """Повторно отправляет подписанную транзакцию, о которой неизвестно, дошла ли она до узла.
+
+        ``True`` — узел принял её (или она уже в мемпуле либо в блоке), ``False`` — узел её
+        отклонил и в блоке её нет, ``None`` — ответа нет и исход по-прежнему неизвестен.
+        """
+        tx_hash = HexBytes(keccak(HexBytes(raw_tx)))
+        try:
+            await self.w3.eth.send_raw_transaction(raw_tx)
+            logger.info(f"✅ Транзакция {self.w3.to_hex(tx_hash)} отправлена повторно\n")
+            return True
+        except Exception as e:
+            if not is_rejected(e):
+                if isinstance(e, ValueError) and e.args and isinstance(e.args[0], dict):
+                    # «Уже известна»: транзакция в мемпуле узла
+                    return True
+                logger.warning(f"⚠️ Не удалось повторно отправить транзакцию {self.w3.to_hex(tx_hash)}: {e}")
+                return None
+            error = e
+
+        # Отказ с «nonce too low» бывает и тогда, когда транзакция уже в блоке
+        try:
+            await self.w3.eth.get_transaction_receipt(tx_hash)
+            return True
+        except TransactionNotFound:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось проверить транзакцию {self.w3.to_hex(tx_hash)}: {e}")
+            return None
+        logger.error(f"❌ Узел отклонил транзакцию {self.w3.to_hex(tx_hash)}: {error}")
+        try:
+            # Nonce отклонённой транзакции свободен (или занят другой): сверяем счётчик с сетью
+            await self.nonces.reconcile()
+        except Exception as e:
+            logger.warning(f"Не удалось сверить nonce с сетью: {e}")
+        return False
+
+    async def sign_transactions(self, transactions: list[TxParams]) -> list[SignedTx]:
+        """Подписывает несколько транзакций кошелька одним обращением к сервису подписи."""
+        return await signer.sign_batch(self.signing_key, transactions)
+
+    async def _recover_nonce(self, nonce: Optional[int], error: Exception):
+        """Возвращает неиспользованный nonce или сверяет счётчик с сетью при ошибке nonce."""
+        if nonce is None:
+            return
+        if not is_nonce_error(error):
+            self.nonces.release(nonce)
+            return
+        self.nonces.mark_sent(nonce)
+        try:
+            await self.nonces.reconcile()
+        except Exception as e:
+            logger.warning(f"Не удалось сверить nonce с сетью: {e}")
 
+    # Ожидание результата транзакции
+    async def wait_tx(self, tx_hash: Union[str, HexBytes], explorer_url: Optional[str] = None,
+                      timeout: float = 120, on_replaced: Optional[Callable[[str], None]] = None) -> Optional[bool]:
+        """Ждёт receipt; транзакция, отправленная этим клиентом, при зависании заменяется (см. ``TxReplacer``).
+
+        Возвращает ``True`` при успешном исполнении, ``False`` при откате в блоке и ``None``,
+        если receipt не получен (таймаут или ошибка): транзакция ещё может попасть в блок.
+        ``on_replaced(hash)`` вызывается для каждой отправленной замены.
+        """
         tx_hash_bytes = HexBytes(tx_hash)  # Приведение к HexBytes
+        pending = self._sent_txs.pop(tx_hash_bytes, None)
 
-        while True:
+        with metrics.phase("receipt", self.chain_id) as timer:
             try:
-                receipt = await self.w3.eth.get_transaction_receipt(tx_hash_bytes)
-                status = receipt.get("status")
-                if status == 1:
-                    logger.info(f"✅ Транзакция выполнена успешно: {self.explorer_url}tx/0x{tx_hash_bytes.hex()}\n")
-                    return True
-                elif status is None:
-                    await asyncio.sleep(poll_latency)
+                if pending is not None and replacer.enabled:
+                    receipt = await replacer.wait(self, pending, timeout, on_replaced)
+                    tx_hash_bytes = HexBytes(receipt["transactionHash"])
                 else:
-                    logger.error(f"❌ Транзакция не выполнена: {self.explorer_url}tx/0x{tx_hash_bytes.hex()}\n")
-                    return False
-            except TransactionNotFound:
-                if total_time > timeout:
-                    logger.warning(f"❌ Транзакция {tx_hash_bytes.hex()} не подтвердилась за 120 секунд")
-                    return False
-                total_time += poll_latency
-                await asyncio.sleep(poll_latency)
+                    receipt = await self.receipt_watcher.wait(tx_hash_bytes, timeout)
+            except asyncio.TimeoutError:
+                timer.outcome = "timeout"
+                logger.warning(f"❌ Транзакция {tx_hash_bytes.hex()} не подтвердилась за {timeout:g} секунд")
+                return None
             except Exception as e:
+                timer.outcome = "error"
                 logger.error(f"❌ Ошибка при получении receipt: {e}")
-                return False
+                return None
+            if receipt.get("status") != 1:
+                timer.outcome = "reverted"
+
+        if receipt.get("status") == 1:
+            self.confirmed_tx_hash = self.w3.to_hex(tx_hash_bytes)
+            logger.info(f"✅ Транзакция выполнена успешно: {self.explorer_url}tx/0x{tx_hash_bytes.hex()}\n")
+            return True
+        logger.error(f"❌ Транзакция не выполнена: {self.explorer_url}tx/0x{tx_hash_bytes.hex()}\n")
+        return False
@@ -0,0 +1,108 @@
+from typing import Callable, Optional
+import asyncio
+import time
+
+from web3 import AsyncWeb3
+
+from utils.logger import logger
+
+
+class GasData:
+    def __init__(self, base_fee: Optional[int], priority_fees: dict[int, int], max_priority_fee: Optional[int],
+                 gas_price: int, block_number: Optional[int] = None):
+        self.base_fee = base_fee
+        self.priority_fees = priority_fees
+        self.max_priority_fee = max_priority_fee
+        self.gas_price = gas_price
+        self.block_number = block_number
+        self.updated_at = time.monotonic()
+
+    @property
+    def priority_fee(self) -> int:
+        """Чаевые для расчёта комиссии: ответ ``eth_maxPriorityFeePerGas`` или медиана ``fee_history``."""
+        if self.max_priority_fee is not None:
+            return self.max_priority_fee
+        return self.priority_fees.get(50, 0)
+
+    @property
+    def is_eip_1559(self) -> bool:
+        return self.base_fee is not None
+
+
+class GasOracle:
+    """Общий на сеть источник данных о газе.
+
+    Данные обновляются не чаще одного раза за ``ttl`` секунд или при появлении нового
+    блока (``on_new_block``). Одновременные обращения ждут одно общее обновление,
+    поэтому все клиенты сети делят одни и те же RPC-запросы и одинаковые значения комиссии.
+    """
+
+    def __init__(self, w3: AsyncWeb3, chain_id: int, ttl: float = 15, percentiles: tuple[int, ...] = (25, 50, 75),
+                 blocks: int = 10):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.ttl = ttl
+        self.percentiles = percentiles
+        self.blocks = blocks
+        self._data: Optional[GasData] = None
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+        self.reads = 0
+
+    def _is_fresh(self) -> bool:
+        return self._data is not None and time.monotonic() - self._data.updated_at < self.ttl
+
+    def on_new_block(self, block_number: int):
+        """Помечает данные устаревшими, если они получены для более раннего блока."""
+        if self._data is not None and (self._data.block_number is None or block_number > self._data.block_number):
+            self._data.updated_at = float("-inf")
+
+    async def _fetch(self) -> GasData:
+        fee_history, max_priority_fee, gas_price = await asyncio.gather(
+            self.w3.eth.fee_history(self.blocks, "latest", list(self.percentiles)),
+            self.w3.eth.max_priority_fee,
+            self.w3.eth.gas_price,
+            return_exceptions=True
+        )
+        if isinstance(gas_price, Exception):
+            raise gas_price
+
+        if isinstance(fee_history, Exception):
+            logger.warning(f"Ошибка при получении fee_history, используем gas_price: {fee_history}")
+            return GasData(None, {}, None, gas_price)
+
+        rewards = fee_history.get("reward") or []
+        priority_fees = {}
+        for index, percentile in enumerate(self.percentiles):
+            values = [reward[index] for reward in rewards if len(reward) > index]
+            priority_fees[percentile] = sum(values) // len(values) if values else 0
+
+        block_number = fee_history["oldestBlock"] + len(fee_history["baseFeePerGas"]) - 2
+        return GasData(
+            base_fee=fee_history["baseFeePerGas"][-1],
+            priority_fees=priority_fees,
+            max_priority_fee=None if isinstance(max_priority_fee, Exception) else max_priority_fee,
+            gas_price=gas_price,
+            block_number=block_number
+        )
+
+    async def get(self) -> GasData:
+        self.reads += 1
+        if self._is_fresh():
+            return self._data
+
+        async with self._lock:
+            if not self._is_fresh():
+                self._data = await self._fetch()
+                self.refreshes += 1
+            return self._data
+
+
+_oracles: dict[int, GasOracle] = {}
+
+
+def get_gas_oracle(chain_id: int, w3_factory: Callable[[], AsyncWeb3]) -> GasOracle:
+    """Возвращает оракул сети; ``w3_factory`` вызывается только при первом обращении."""
+    if chain_id not in _oracles:
+        _oracles[chain_id] = GasOracle(w3_factory(), chain_id)
+    return _oracles[chain_id]
@@ -0,0 +1,117 @@
+from typing import Optional
+import asyncio
+import heapq
+
+from web3 import AsyncWeb3
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+NONCE_ERRORS = ("nonce too low", "nonce too high", "already known", "replacement transaction underpriced",
+                "invalid nonce", "known transaction")
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERRORS)
+
+
+class NonceManager:
+    """Локальный счётчик nonce для одного адреса в одной сети.
+
+    Nonce загружается из сети один раз (тег ``pending``), дальше выдаётся последовательно,
+    поэтому у кошелька может быть несколько транзакций в полёте (approve → bridge,
+    wrap → bridge). Nonce транзакции, которая так и не ушла в сеть, возвращается через
+    ``release`` и выдаётся повторно, чтобы не оставлять дыр. При ошибках nonce
+    ``reconcile`` сверяет счётчик с сетью.
+    """
+
+    def __init__(self, w3: AsyncWeb3, address: str, chain_id: int | str = ""):
+        self.w3 = w3
+        self.address = address
+        self.chain_id = chain_id
+        self._next: Optional[int] = None
+        self._released: list[int] = []
+        self._in_flight: set[int] = set()
+        self._lock = asyncio.Lock()
+
+    async def _fetch_pending(self) -> int:
+        with metrics.phase("nonce", self.chain_id):
+            return await self.w3.eth.get_transaction_count(self.address, "pending")
+
+    async def prefetch(self):
+        """Загружает nonce из сети заранее, не выдавая его (например, вместе с пробным прогоном)."""
+        async with self._lock:
+            if self._next is None:
+                self._next = await self._fetch_pending()
+
+    async def next_nonce(self) -> int:
+        async with self._lock:
+            if self._next is None:
+                self._next = await self._fetch_pending()
+
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                nonce = self._next
+                self._next += 1
+            self._in_flight.add(nonce)
+            return nonce
+
+    @property
+    def idle(self) -> bool:
+        """Нет выданных, но не отправленных nonce."""
+        return not self._in_flight and not self._released and not self._lock.locked()
+
+    def mark_sent(self, nonce: int):
+        """Транзакция с этим nonce принята узлом."""
+        self._in_flight.discard(nonce)
+
+    def release(self, nonce: int):
+        """Транзакция с этим nonce не была отправлена — nonce можно выдать снова."""
+        if nonce not in self._in_flight:
+            return
+        self._in_flight.discard(nonce)
+        if self._next is not None and nonce == self._next - 1:
+            self._next -= 1
+        else:
+            heapq.heappush(self._released, nonce)
+
+    async def reconcile(self) -> int:
+        """Сверяет локальный счётчик с nonce сети по тегу ``pending``."""
+        async with self._lock:
+            pending = await self._fetch_pending()
+            if self._next is None or pending > self._next:
+                # Транзакции были отправлены в обход менеджера
+                self._next = pending
+                self._released.clear()
+            elif not self._in_flight and pending < self._next:
+                # Выданные nonce так и не дошли до сети — закрываем дыру
+                self._next = pending
+                self._released.clear()
+            else:
+                self._released = [nonce for nonce in self._released if nonce >= pending]
+                heapq.heapify(self._released)
+            logger.info(f"🔄 Nonce {self.address} сверен с сетью: следующий {self._next}\n")
+            return self._next
+
+
+_managers: dict[tuple[int, str], NonceManager] = {}
+
+
+def get_nonce_manager(chain_id: int, address: str, w3: AsyncWeb3) -> NonceManager:
+    """Возвращает общий менеджер nonce для адреса в сети."""
+    key = (chain_id, address)
+    if key not in _managers:
+        _managers[key] = NonceManager(w3, address, chain_id)
+    return _managers[key]
+
+
+def release_nonce_manager(chain_id: int, address: str):
+    """Удаляет менеджер адреса, если у него нет незавершённых nonce.
+
+    При следующем обращении nonce будет заново загружен из сети.
+    """
+    manager = _managers.get((chain_id, address))
+    if manager is not None and manager.idle:
+        del _managers[(chain_id, address)]
@@ -0,0 +1,229 @@
+from typing import Callable, Optional
+import asyncio
+import time
+
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3._utils.method_formatters import receipt_formatter
+from web3.exceptions import TransactionNotFound
+from web3.types import RPCEndpoint, TxReceipt
+
+from client.gas_oracle import GasOracle
+from client.ws_transport import Subscription
+from utils.logger import logger
+
+
+class ReceiptWatcher:
+    """Общий на сеть наблюдатель за receipt'ами транзакций.
+
+    Следит за номером последнего блока и при каждом новом блоке одним batch-запросом
+    проверяет все ожидаемые хэши (или забирает receipt'ы блока через
+    ``eth_getBlockReceipts``, если узел его поддерживает и новых блоков меньше, чем
+    ожидаемых транзакций). Интервал опроса подстраивается под время блока сети.
+    Если у провайдера есть WebSocket сети, наблюдатель подписывается на ``newHeads``:
+    проверка запускается по уведомлению о блоке, а опрос остаётся страховкой на случай
+    пропущенных уведомлений и отключения WebSocket.
+
+    Запросы наблюдателя идут без прокси: RPC видит хэши транзакций всех кошельков сети
+    с одного IP (см. предупреждение в readme.txt).
+    """
+
+    def __init__(self, w3: AsyncWeb3, chain_id: int, gas_oracle: Optional[GasOracle] = None,
+                 min_interval: float = 0.25, max_interval: float = 10, default_block_time: float = 2):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.gas_oracle = gas_oracle
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.block_time = default_block_time
+        self.supports_block_receipts = True
+        self._pending: dict[HexBytes, asyncio.Future] = {}
+        # Хэши, которые ещё ни разу не проверялись: они могли попасть в уже обработанный блок
+        self._unchecked: set[HexBytes] = set()
+        self._last_block: Optional[int] = None
+        self._last_block_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ws = getattr(w3.provider, "ws", None)
+        self._heads: Optional[Subscription] = None
+        self._head: Optional[int] = None
+        self._head_event = asyncio.Event()
+
+    @property
+    def poll_interval(self) -> float:
+        return min(self.max_interval, max(self.min_interval, self.block_time / 2))
+
+    def watch(self, tx_hash: HexBytes | str) -> asyncio.Future:
+        tx_hash = HexBytes(tx_hash)
+        future = self._pending.get(tx_hash)
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._pending[tx_hash] = future
+            self._unchecked.add(tx_hash)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return future
+
+    async def wait(self, tx_hash: HexBytes | str, timeout: float = 120) -> TxReceipt:
+        """Ждёт receipt транзакции; по истечении ``timeout`` бросает ``asyncio.TimeoutError``."""
+        tx_hash = HexBytes(tx_hash)
+        future = self.watch(tx_hash)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if self._pending.get(tx_hash) is future:
+                del self._pending[tx_hash]
+                future.cancel()
+            raise
+
+    async def wait_any(self, hashes: list[HexBytes], timeout: float) -> tuple[HexBytes, TxReceipt]:
+        """Ждёт receipt любой из транзакций (например, цепочки замен с одним nonce).
+
+        По таймауту бросает ``asyncio.TimeoutError``, но хэши остаются под наблюдением,
+        пока их не снимут через ``unwatch``.
+        """
+        futures = {self.watch(tx_hash): HexBytes(tx_hash) for tx_hash in hashes}
+        done, _ = await asyncio.wait(futures, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            raise asyncio.TimeoutError
+        future = done.pop()
+        return futures[future], future.result()
+
+    def unwatch(self, hashes: list[HexBytes]):
+        for tx_hash in hashes:
+            future = self._pending.pop(HexBytes(tx_hash), None)
+            if future is not None and not future.done():
+                future.cancel()
+
+    def _resolve(self, tx_hash: HexBytes, receipt: TxReceipt):
+        future = self._pending.pop(tx_hash, None)
+        if future is not None and not future.done():
+            future.set_result(receipt)
+
+    def _on_head(self, header: dict):
+        number = int(header["number"], 16) if isinstance(header["number"], str) else header["number"]
+        if self._head is None or number > self._head:
+            self._head = number
+            if self.gas_oracle is not None:
+                self.gas_oracle.on_new_block(number)
+            self._head_event.set()
+
+    @property
+    def _heads_live(self) -> bool:
+        return (self._ws is not None and self._ws.available and self._heads is not None
+                and self._heads.server_id is not None)
+
+    async def _wait_next_block(self):
+        if not self._heads_live:
+            await asyncio.sleep(self.poll_interval)
+            return
+        try:
+            # Страховочный опрос, если уведомление о блоке потерялось
+            await asyncio.wait_for(self._head_event.wait(), min(self.max_interval, self.block_time * 2))
+        except asyncio.TimeoutError:
+            pass
+        self._head_event.clear()
+
+    def _update_block_time(self, block_number: int):
+        now = time.monotonic()
+        if self._last_block is not None and block_number > self._last_block:
+            observed = (now - self._last_block_at) / (block_number - self._last_block)
+            # Скользящее среднее, чтобы один медленный опрос не сбивал оценку
+            self.block_time = 0.7 * self.block_time + 0.3 * observed
+        self._last_block = block_number
+        self._last_block_at = now
+
+    async def _estimate_block_time(self):
+        try:
+            latest = await self.w3.eth.get_block("latest")
+            if latest["number"] < 20:
+                return
+            older = await self.w3.eth.get_block(latest["number"] - 20)
+            self.block_time = max(0.1, (latest["timestamp"] - older["timestamp"]) / 20)
+            self._last_block, self._last_block_at = latest["number"], time.monotonic()
+        except Exception as e:
+            logger.warning(f"Не удалось оценить время блока сети {self.chain_id}: {e}")
+
+    async def _check_block_receipts(self, blocks: range) -> bool:
+        responses = await asyncio.gather(*(
+            self.w3.provider.make_request(RPCEndpoint("eth_getBlockReceipts"), [hex(number)]) for number in blocks
+        ))
+        if any("error" in response for response in responses):
+            self.supports_block_receipts = False
+            return False
+        if any(response.get("result") is None for response in responses):
+            # Узел (или другой эндпоинт пула) ещё не импортировал блок: проверяем хэши по одному
+            return False
+
+        for response in responses:
+            for raw_receipt in response["result"]:
+                tx_hash = HexBytes(raw_receipt["transactionHash"])
+                if tx_hash in self._pending:
+                    self._resolve(tx_hash, receipt_formatter(raw_receipt))
+        return True
+
+    async def _check_receipts(self, hashes: list[HexBytes]):
+        results = await asyncio.gather(
+            *(self.w3.eth.get_transaction_receipt(tx_hash) for tx_hash in hashes), return_exceptions=True
+        )
+        for tx_hash, result in zip(hashes, results):
+            if isinstance(result, TransactionNotFound):
+                continue
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Ошибка при получении receipt {tx_hash.hex()}: {result}")
+                continue
+            if result.get("blockNumber") is not None:
+                self._resolve(tx_hash, result)
+
+    async def _run(self):
+        if self._ws is not None and self._heads is None:
+            # Подписка общая на соединение и живёт вместе с наблюдателем, переподписка — на стороне WsConnection
+            try:
+                self._heads = await self._ws.subscribe(["newHeads"], self._on_head)
+            except Exception as e:
+                # Без подписки новые блоки отслеживаются опросом
+                logger.warning(f"⚠️ Не удалось подписаться на newHeads сети {self.chain_id}: {e}")
+        if self._last_block is None:
+            await self._estimate_block_time()
+
+        while self._pending:
+            unchecked = set()
+            try:
+                if self._heads_live and self._head is not None and self._head >= (self._last_block or 0):
+                    block_number = self._head
+                else:
+                    block_number = await self.w3.eth.block_number
+                previous = self._last_block
+                new_blocks = range(0)
+                if previous is None or block_number > previous:
+                    self._update_block_time(block_number)
+                    if self.gas_oracle is not None:
+                        self.gas_oracle.on_new_block(block_number)
+                    if previous is not None:
+                        new_blocks = range(previous + 1, block_number + 1)
+
+                unchecked, self._unchecked = self._unchecked, set()
+                if new_blocks:
+                    if (self.supports_block_receipts and len(new_blocks) <= len(self._pending)
+                            and await self._check_block_receipts(new_blocks)):
+                        await self._check_receipts([h for h in unchecked if h in self._pending])
+                    else:
+                        await self._check_receipts(list(self._pending))
+                elif unchecked:
+                    await self._check_receipts([h for h in unchecked if h in self._pending])
+            except Exception as e:
+                self._unchecked |= unchecked
+                logger.warning(f"⚠️ Ошибка наблюдателя receipt'ов сети {self.chain_id}: {e}")
+
+            if self._pending:
+                await self._wait_next_block()
+
+
+_watchers: dict[int, ReceiptWatcher] = {}
+
+
+def get_receipt_watcher(chain_id: int, w3_factory: Callable[[], AsyncWeb3],
+                        gas_oracle: Optional[GasOracle] = None) -> ReceiptWatcher:
+    """Возвращает наблюдатель сети; ``w3_factory`` вызывается только при первом обращении."""
+    if chain_id not in _watchers:
+        _watchers[chain_id] = ReceiptWatcher(w3_factory(), chain_id, gas_oracle)
+    return _watchers[chain_id]
@@ -0,0 +1,169 @@
+from math import ceil
+from typing import TYPE_CHECKING, Callable, Optional
+import asyncio
+
+from hexbytes import HexBytes
+from web3.types import TxParams, TxReceipt
+
+from client.gas_oracle import GasData
+from client.nonce_manager import is_nonce_error
+from client.signer import signer
+from utils.logger import logger
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from client.client import Client
+
+# Узлы принимают замену с тем же nonce, только если обе комиссии выросли хотя бы на 10%
+# (geth ``txpool.pricebump``); берём с запасом
+REPLACEMENT_BUMP = 1.125
+
+
+class PendingTx:
+    """Отправленная транзакция и все её замены с тем же nonce."""
+    __slots__ = ("tx", "hashes", "max_fee_limit", "exhausted")
+
+    def __init__(self, tx: TxParams, tx_hash: HexBytes, max_fee_multiplier: float):
+        self.tx = dict(tx)
+        self.hashes = [HexBytes(tx_hash)]
+        self.exhausted = False
+        fee = tx.get("maxFeePerGas", tx.get("gasPrice", 0))
+        self.max_fee_limit = int(int(fee) * max_fee_multiplier)
+
+    @property
+    def replacements(self) -> int:
+        return len(self.hashes) - 1
+
+
+def bump_fees(tx: TxParams, gas: Optional[GasData] = None, bump: float = REPLACEMENT_BUMP) -> TxParams:
+    """Комиссии для замены: не меньше ``bump`` от прежних и не ниже текущего рынка."""
+    bumped = dict(tx)
+    if "maxFeePerGas" in tx:
+        priority = ceil(int(tx["maxPriorityFeePerGas"]) * bump)
+        max_fee = ceil(int(tx["maxFeePerGas"]) * bump)
+        if gas is not None and gas.is_eip_1559:
+            priority = max(priority, gas.priority_fee)
+            # Запас в 25% покрывает рост base fee в ближайших блоках (не больше 12.5% за блок)
+            max_fee = max(max_fee, ceil(gas.base_fee * 1.25) + priority)
+        bumped["maxPriorityFeePerGas"] = priority
+        bumped["maxFeePerGas"] = max(max_fee, priority)
+    else:
+        gas_price = ceil(int(tx["gasPrice"]) * bump)
+        if gas is not None:
+            gas_price = max(gas_price, gas.gas_price)
+        bumped["gasPrice"] = gas_price
+    return bumped
+
+
+def _fee(tx: TxParams) -> int:
+    return int(tx.get("maxFeePerGas", tx.get("gasPrice", 0)))
+
+
+class TxReplacer:
+    """Замена зависших транзакций тем же nonce с повышенной комиссией.
+
+    Если транзакция не попала в блок за ``after_blocks`` блоков, она переподписывается
+    с комиссиями, поднятыми по правилам замены (``bump_fees``), и отправляется снова.
+    Все хэши цепочки замен отслеживаются одновременно: ожидание завершается receipt'ом
+    той транзакции, которая попала в блок. Комиссия не поднимается выше
+    ``max_fee_multiplier`` от исходной, замен не больше ``max_replacements``.
+    """
+
+    def __init__(self, after_blocks: int = 5, max_replacements: int = 5, max_fee_multiplier: float = 3.0,
+                 min_wait: float = 5.0):
+        self.after_blocks = after_blocks
+        self.max_replacements = max_replacements
+        self.max_fee_multiplier = max_fee_multiplier
+        self.min_wait = min_wait
+        self.replacements = 0
+        self.mined_replacements = 0
+
+    def configure(self, after_blocks: int, max_replacements: int):
+        self.after_blocks = after_blocks
+        self.max_replacements = max_replacements
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_blocks > 0 and self.max_replacements > 0
+
+    def track(self, tx: TxParams, tx_hash: HexBytes | str) -> PendingTx:
+        return PendingTx(tx, HexBytes(tx_hash), self.max_fee_multiplier)
+
+    async def wait(self, client: "Client", pending: PendingTx, timeout: float,
+                   on_replaced: Optional[Callable[[str], None]] = None) -> TxReceipt:
+        """Ждёт receipt любой из транзакций цепочки, заменяя зависшую. По таймауту — ``asyncio.TimeoutError``."""
+        watcher = client.receipt_watcher
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                can_replace = (self.enabled and not pending.exhausted
+                               and pending.replacements < self.max_replacements)
+                window = remaining
+                if can_replace:
+                    window = min(remaining, max(self.min_wait, self.after_blocks * watcher.block_time))
+                try:
+                    tx_hash, receipt = await watcher.wait_any(pending.hashes, window)
+                except asyncio.TimeoutError:
+                    if window >= remaining:
+                        raise
+                    await self._replace(client, pending, on_replaced)
+                    continue
+
+                if tx_hash != pending.hashes[0]:
+                    self.mined_replacements += 1
+                return receipt
+        finally:
+            watcher.unwatch(pending.hashes)
+
+    async def _replace(self, client: "Client", pending: PendingTx, on_replaced: Optional[Callable[[str], None]]):
+        try:
+            gas = await client.gas_oracle.get()
+        except Exception as e:
+            logger.warning(f"Ошибка при получении данных о газе для замены транзакции: {e}")
+            gas = None
+
+        tx = bump_fees(pending.tx, gas)
+        if _fee(tx) > pending.max_fee_limit:
+            logger.warning(f"⛽ Замена {client.w3.to_hex(pending.hashes[-1])} не отправлена: комиссия превысила бы "
+                           f"{self.max_fee_multiplier:g}× от исходной\n")
+            # Больше не поднимаем комиссию: ждём уже отправленные варианты
+            pending.exhausted = True
+            return
+
+        signed = await signer.sign(client.signing_key, tx)
+        try:
+            with metrics.phase("replace", client.chain_id):
+                await client.w3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception as e:
+            if "underpriced" in str(e).lower():
+                # Узел требует большего повышения: следующая попытка поднимет комиссию от этой
+                pending.tx = tx
+            elif is_nonce_error(e):
+                # Одна из транзакций цепочки уже в блоке — наблюдатель receipt'ов её найдёт
+                logger.info(f"ℹ️ Nonce {tx['nonce']} уже использован, ждём receipt отправленной транзакции\n")
+                return
+            logger.warning(f"⚠️ Не удалось заменить транзакцию {client.w3.to_hex(pending.hashes[-1])}: {e}\n")
+            return
+
+        previous = pending.hashes[-1]
+        pending.tx = tx
+        pending.hashes.append(HexBytes(signed.hash))
+        self.replacements += 1
+        metrics.inc("tx_replacements_total", chain=client.chain_id)
+        logger.info(f"⛽ Транзакция {client.w3.to_hex(previous)} не попала в блок, "
+                    f"заменена на {client.w3.to_hex(signed.hash)} "
+                    f"(комиссия {_fee(tx)} wei/газ, замена {pending.replacements}/{self.max_replacements})\n")
+        if on_replaced is not None:
+            on_replaced(client.w3.to_hex(signed.hash))
+
+    def log_stats(self):
+        if self.replacements:
+            logger.info(f"⛽ Замен зависших транзакций: {self.replacements}, "
+                        f"из них попали в блок: {self.mined_replacements}\n")
+
+
+replacer = TxReplacer()
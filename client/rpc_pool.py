@@ -0,0 +1,278 @@
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import asyncio
+import time
+
+import aiohttp
+from web3.types import RPCEndpoint, RPCResponse
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+# Чтения, от задержки которых зависит длительность профиля: дублируются на второй эндпоинт
+HEDGED_METHODS = {"eth_getBalance", "eth_getTransactionReceipt", "eth_getBlockReceipts"}
+# Записи рассылаются сразу на несколько эндпоинтов, чтобы транзакция быстрее попала в мемпул
+BROADCAST_METHODS = {"eth_sendRawTransaction"}
+# Коды JSON-RPC, которыми провайдеры сообщают о превышении лимита запросов
+RATE_LIMIT_CODES = {-32005, -32029, -32090, 429}
+# Ошибки прокси не говорят ничего о самом эндпоинте: их обрабатывает retry_on_proxy_error
+PROXY_ERRORS = (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError)
+
+Send = Callable[[str], Awaitable[RPCResponse]]
+
+
+def rpc_endpoints(network: dict) -> list[str]:
+    """RPC сети из networks_data.json: основной ``rpc_url`` и затем запасные из ``rpc_urls``."""
+    urls = [network["rpc_url"]] if network.get("rpc_url") else []
+    for url in network.get("rpc_urls") or []:
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def is_rate_limited(response: RPCResponse) -> bool:
+    error = response.get("error") if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    return error.get("code") in RATE_LIMIT_CODES or "rate limit" in str(error.get("message", "")).lower()
+
+
+class RpcEndpointError(Exception):
+    """Эндпоинт ответил ограничением лимита; ``response`` — его ответ как есть."""
+
+    def __init__(self, url: str, response: RPCResponse):
+        super().__init__(f"RPC {url} ограничил запросы: {response.get('error')}")
+        self.response = response
+
+
+class EndpointStats:
+    __slots__ = ("url", "latency", "latencies", "failures", "cooldown_until", "requests", "errors")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RpcPool:
+    """Несколько RPC-эндпоинтов одной сети за одним провайдером.
+
+    Обычные вызовы идут на эндпоинт с наименьшей наблюдаемой задержкой и при ошибке,
+    таймауте или ограничении лимита переходят на следующий; отказавший эндпоинт
+    откладывается на ``cooldown`` секунд (с удвоением при повторных отказах).
+    Чтения из ``HEDGED_METHODS`` дублируются на второй эндпоинт, если первый не ответил
+    за ``hedge_quantile`` своих задержек. ``eth_sendRawTransaction`` рассылается сразу на
+    ``broadcast`` эндпоинтов; возвращается первый успешный ответ.
+
+    Пул общий для всех прокси сети, поэтому задержки и отказы эндпоинтов учитываются только
+    по запросам без прокси (газ, квитанции, предзагрузка): таймаут или обрыв через прокси,
+    как и лимит по IP прокси, ничего не говорят об эндпоинте. Такие запросы переходят на
+    следующий эндпоинт, но статистику не меняют.
+    """
+
+    def __init__(self, chain: int | str, endpoints: list[str], cooldown: float = 15, max_cooldown: float = 300,
+                 attempt_timeout: float = 10, hedge_quantile: float = 0.9, min_hedge_delay: float = 0.05,
+                 default_hedge_delay: float = 0.5, min_samples: int = 20, broadcast: int = 3, alpha: float = 0.2):
+        self.chain = chain
+        self.endpoints = list(endpoints)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.attempt_timeout = attempt_timeout
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.broadcast = broadcast
+        self.alpha = alpha
+        self._stats = {url: EndpointStats(url) for url in self.endpoints}
+        self._background: set[asyncio.Task] = set()
+
+    def ordered(self) -> list[str]:
+        """Эндпоинты в порядке предпочтения: доступные по задержке, затем отложенные."""
+        now = time.monotonic()
+        known = [stats.latency for stats in self._stats.values() if stats.latency is not None]
+        # Эндпоинт без замеров считаем не хуже лучшего, чтобы он получил свою долю запросов
+        default_latency = min(known) if known else 0.0
+
+        def key(url: str) -> tuple:
+            stats = self._stats[url]
+            latency = stats.latency if stats.latency is not None else default_latency
+            return stats.cooldown_until > now, latency
+
+        return sorted(self.endpoints, key=key)
+
+    def _record_success(self, url: str, latency: float):
+        stats = self._stats[url]
+        stats.requests += 1
+        stats.latencies.append(latency)
+        stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+        stats.failures = 0
+
+    def _record_failure(self, url: str, reason: str):
+        stats = self._stats[url]
+        stats.requests += 1
+        stats.errors += 1
+        stats.failures += 1
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** min(stats.failures - 1, 10))
+        if stats.cooldown_until <= time.monotonic():
+            logger.warning(f"⚠️ RPC {url} отложен на {cooldown:.0f} сек: {reason}\n")
+        stats.cooldown_until = time.monotonic() + cooldown
+        metrics.inc("rpc_endpoint_failures_total", chain=self.chain, endpoint=url)
+
+    def hedge_delay(self, url: str) -> float:
+        stats = self._stats[url]
+        if len(stats.latencies) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, stats.quantile(self.hedge_quantile))
+
+    async def _call(self, url: str, send: Send, direct: bool = True) -> RPCResponse:
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(send(url), self.attempt_timeout)
+        except PROXY_ERRORS:
+            raise
+        except asyncio.TimeoutError:
+            if direct:
+                self._record_failure(url, f"нет ответа за {self.attempt_timeout:.0f} сек")
+            raise
+        except Exception as e:
+            if direct:
+                self._record_failure(url, str(e) or type(e).__name__)
+            raise
+        if is_rate_limited(response):
+            if direct:
+                self._record_failure(url, "превышен лимит запросов")
+            raise RpcEndpointError(url, response)
+        if direct:
+            self._record_success(url, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _unwrap(error: BaseException) -> RPCResponse:
+        if isinstance(error, RpcEndpointError):
+            return error.response
+        raise error
+
+    async def _failover(self, method: RPCEndpoint, send: Send, endpoints: list[str],
+                        direct: bool = True) -> RPCResponse:
+        error: Optional[BaseException] = None
+        for index, url in enumerate(endpoints):
+            if index:
+                metrics.inc("rpc_failovers_total", chain=self.chain, method=method)
+            try:
+                return await self._call(url, send, direct)
+            except PROXY_ERRORS:
+                raise
+            except Exception as e:
+                error = e
+        return self._unwrap(error)
+
+    async def _hedged(self, method: RPCEndpoint, send: Send, direct: bool = True) -> RPCResponse:
+        endpoints = self.ordered()
+        first = asyncio.ensure_future(self._call(endpoints[0], send, direct))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(endpoints[0]))
+        if done:
+            try:
+                return first.result()
+            except PROXY_ERRORS:
+                raise
+            except Exception:
+                metrics.inc("rpc_failovers_total", chain=self.chain, method=method)
+                return await self._failover(method, send, endpoints[1:], direct)
+
+        metrics.inc("rpc_hedged_total", chain=self.chain, method=method)
+        second = asyncio.ensure_future(self._call(endpoints[1], send, direct))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            metrics.inc("rpc_hedge_wins_total", chain=self.chain, method=method)
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._unwrap(error)
+
+    async def _broadcast(self, method: RPCEndpoint, send: Send, direct: bool = True) -> RPCResponse:
+        endpoints = self.ordered()[:self.broadcast]
+        tasks = [asyncio.ensure_future(self._call(url, send, direct)) for url in endpoints]
+        metrics.inc("rpc_broadcasts_total", chain=self.chain, method=method)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and "error" not in task.result():
+                    # Остальные рассылки не отменяем: транзакция должна дойти до всех эндпоинтов
+                    for other in pending:
+                        self._background.add(other)
+                        other.add_done_callback(self._discard)
+                    return task.result()
+
+        # Успешных ответов нет — возвращаем ответ основного эндпоинта
+        primary = tasks[0]
+        if primary.exception() is not None:
+            return self._unwrap(primary.exception())
+        return primary.result()
+
+    def _discard(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled():
+            # Ошибка фоновой рассылки уже учтена в статистике эндпоинта
+            task.exception()
+
+    async def request(self, method: RPCEndpoint, send: Send, proxy: Optional[str] = None) -> RPCResponse:
+        """Выполняет вызов через пул; ``send(url)`` отправляет его на конкретный эндпоинт.
+
+        ``proxy`` — прокси, через который уходит запрос: такие запросы не меняют статистику эндпоинтов.
+        """
+        if len(self.endpoints) == 1:
+            return await send(self.endpoints[0])
+        direct = proxy is None
+        if method in BROADCAST_METHODS:
+            return await self._broadcast(method, send, direct)
+        if method in HEDGED_METHODS:
+            return await self._hedged(method, send, direct)
+        return await self._failover(method, send, self.ordered(), direct)
+
+    def log_stats(self):
+        rows = []
+        for url in self.endpoints:
+            stats = self._stats[url]
+            if not stats.requests:
+                continue
+            p50 = stats.quantile(0.5)
+            rows.append(f"    {url}: запросов {stats.requests}, ошибок {stats.errors}"
+                        + (f", p50 {p50:.3f} сек" if p50 is not None else ""))
+        if rows:
+            logger.info(f"🛰️ RPC сети {self.chain}:\n" + "\n".join(rows) + "\n")
+
+
+_pools: dict[tuple[int | str, tuple[str, ...]], RpcPool] = {}
+
+
+def get_rpc_pool(chain: int | str, endpoints: list[str]) -> RpcPool:
+    """Возвращает общий пул для набора эндпоинтов сети: статистика задержек копится по всем клиентам."""
+    key = (chain, tuple(endpoints))
+    if key not in _pools:
+        _pools[key] = RpcPool(chain, endpoints)
+    return _pools[key]
+
+
+def log_rpc_pool_stats():
+    for pool in _pools.values():
+        pool.log_stats()
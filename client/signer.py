@@ -0,0 +1,126 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import NamedTuple, Optional
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+
+from eth_account import Account
+from eth_keys import keys
+from hexbytes import HexBytes
+
+from utils.logger import logger
+from utils.metrics import Histogram
+
+SIGNING_MODES = ("inline", "thread", "process")
+# Подпись занимает доли миллисекунды — корзины мельче, чем у общих метрик
+SIGN_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, math.inf)
+
+
+class SignedTx(NamedTuple):
+    raw_transaction: HexBytes
+    hash: HexBytes
+
+
+@lru_cache(maxsize=1024)
+def _private_key(key_bytes: bytes) -> keys.PrivateKey:
+    # Ключ разбирается в рабочем процессе один раз и дальше переиспользуется
+    return keys.PrivateKey(key_bytes)
+
+
+def sign_transactions(key: bytes | keys.PrivateKey, transactions: list[dict]) -> list[SignedTx]:
+    """Подписывает транзакции одного кошелька. Выполняется в пуле или прямо в event loop."""
+    if isinstance(key, bytes):
+        key = _private_key(key)
+    signed = []
+    for transaction in transactions:
+        result = Account.sign_transaction(transaction, key)
+        signed.append(SignedTx(HexBytes(result.raw_transaction), HexBytes(result.hash)))
+    return signed
+
+
+class SigningService:
+    """Подпись транзакций вне event loop.
+
+    ECDSA-подпись и RLP-кодирование — чистая работа CPU, которая в режиме ``inline``
+    блокирует все остальные запросы в полёте. В режиме ``process`` подпись выполняется
+    в пуле процессов (ключ передаётся в процесс и разбирается там один раз), в режиме
+    ``thread`` — в пуле потоков, что имеет смысл только для бэкенда, отпускающего GIL
+    (coincurve). Несколько транзакций одного кошелька подписываются одним вызовом.
+    """
+
+    def __init__(self, mode: str = "process", workers: Optional[int] = None):
+        self.mode = mode
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[Executor] = None
+        self.latencies = Histogram(SIGN_LATENCY_BUCKETS)
+
+    def configure(self, mode: str):
+        if mode not in SIGNING_MODES:
+            raise ValueError(f"Неизвестный режим подписи: {mode}")
+        self.mode = mode
+
+    def start(self):
+        """Заранее запускает рабочие процессы, чтобы первая подпись не ждала их старта."""
+        executor = self._get_executor()
+        if isinstance(executor, ProcessPoolExecutor):
+            for _ in range(self.workers):
+                executor.submit(int)
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.mode == "inline":
+            return None
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn: форк процесса с работающим event loop и потоками небезопасен
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="signer")
+        return self._executor
+
+    async def sign_batch(self, key: keys.PrivateKey, transactions: list[dict]) -> list[SignedTx]:
+        started = time.perf_counter()
+        executor = self._get_executor()
+        if executor is None:
+            signed = sign_transactions(key, transactions)
+        else:
+            payload = key.to_bytes() if isinstance(executor, ProcessPoolExecutor) else key
+            try:
+                signed = await asyncio.get_running_loop().run_in_executor(
+                    executor, sign_transactions, payload, transactions)
+            except BrokenProcessPool as e:
+                if self._executor is executor:
+                    logger.warning(f"⚠️ Пул подписи недоступен ({e}), подписываем в основном процессе\n")
+                    self.mode, self._executor = "inline", None
+                signed = sign_transactions(key, transactions)
+
+        latency = (time.perf_counter() - started) / len(transactions)
+        for _ in transactions:
+            self.latencies.observe(latency)
+        return signed
+
+    async def sign(self, key: keys.PrivateKey, transaction: dict) -> SignedTx:
+        return (await self.sign_batch(key, [transaction]))[0]
+
+    def log_stats(self):
+        latencies = self.latencies
+        if not latencies.count:
+            return
+        logger.info(
+            f"✍️ Подписей: {latencies.count} (режим {self.mode}), задержка подписи: "
+            f"медиана {latencies.quantile(0.5) * 1000:.1f} мс, "
+            f"p95 {latencies.quantile(0.95) * 1000:.1f} мс, "
+            f"максимум {latencies.max * 1000:.1f} мс\n"
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+signer = SigningService()
@@ -0,0 +1,258 @@
+from typing import Any, Callable, Optional
+import asyncio
+import itertools
+import json
+
+import aiohttp
+
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from web3.types import RPCEndpoint, RPCResponse
+
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.session_pool import session_pool
+
+Listener = Callable[[Any], None]
+
+
+class WsUnavailable(ConnectionError):
+    """WebSocket сети не подключён: вызов нужно отправить по HTTP."""
+
+
+class Subscription:
+    """Подписка ``eth_subscribe`` с её обработчиками; переживает переподключения."""
+    __slots__ = ("params", "listeners", "server_id")
+
+    def __init__(self, params: list):
+        self.params = params
+        self.listeners: list[Listener] = []
+        self.server_id: Optional[str] = None
+
+
+class WsConnection:
+    """Постоянное WebSocket-соединение с узлом сети.
+
+    Все JSON-RPC вызовы сети идут через одно соединение и различаются по ``id``.
+    Подписки ``eth_subscribe`` с одинаковыми параметрами делят одну подписку на узле.
+    При обрыве соединение восстанавливается в фоне с экспоненциальной паузой, подписки
+    оформляются заново. Пока соединения нет, ``request`` бросает :class:`WsUnavailable`,
+    и провайдер отправляет вызов по HTTP.
+    """
+
+    def __init__(self, url: str, chain: int | str = "", connect_timeout: float = 10, request_timeout: float = 30,
+                 min_backoff: float = 1, max_backoff: float = 60, heartbeat: float = 20):
+        self.url = url
+        self.chain = chain
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.heartbeat = heartbeat
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._subscriptions: dict[str, Subscription] = {}
+        self._by_server_id: dict[str, Subscription] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._closed = False
+        self.requests = 0
+        self.notifications = 0
+        self.reconnects = 0
+
+    @property
+    def available(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closed = False
+            self._task = asyncio.ensure_future(self._run())
+
+    async def wait_connected(self, timeout: float) -> bool:
+        self.start()
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        backoff = self.min_backoff
+        while not self._closed:
+            try:
+                session = await session_pool.get(None)
+                self._ws = await asyncio.wait_for(
+                    session.ws_connect(self.url, heartbeat=self.heartbeat, max_msg_size=0), self.connect_timeout
+                )
+                self._connected.set()
+                backoff = self.min_backoff
+                logger.info(f"🔌 WebSocket сети {self.chain} подключён: {self.url}\n")
+                resubscribe = asyncio.ensure_future(self._resubscribe())
+                try:
+                    await self._read()
+                finally:
+                    resubscribe.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ WebSocket сети {self.chain} недоступен, запросы идут по HTTP: {e}\n")
+            finally:
+                self._disconnected()
+
+            if self._closed:
+                return
+            self.reconnects += 1
+            metrics.inc("ws_reconnects_total", chain=self.chain)
+            await asyncio.sleep(backoff)
+            backoff = min(self.max_backoff, backoff * 2)
+
+    def _disconnected(self):
+        self._connected.clear()
+        ws, self._ws = self._ws, None
+        if ws is not None and not ws.closed:
+            asyncio.ensure_future(ws.close())
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(WsUnavailable(f"WebSocket сети {self.chain} отключился"))
+        self._by_server_id.clear()
+        for subscription in self._subscriptions.values():
+            subscription.server_id = None
+
+    async def _read(self):
+        async for message in self._ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                if message.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSE):
+                    break
+                continue
+            payload = json.loads(message.data)
+            for item in payload if isinstance(payload, list) else [payload]:
+                self._dispatch(item)
+
+    def _dispatch(self, item: dict):
+        if item.get("method") == "eth_subscription":
+            params = item.get("params") or {}
+            subscription = self._by_server_id.get(params.get("subscription"))
+            if subscription is None:
+                return
+            self.notifications += 1
+            for listener in list(subscription.listeners):
+                try:
+                    listener(params.get("result"))
+                except Exception as e:
+                    logger.warning(f"⚠️ Ошибка обработчика подписки сети {self.chain}: {e}")
+            return
+
+        future = self._pending.pop(item.get("id"), None)
+        if future is not None and not future.done():
+            future.set_result(item)
+
+    async def request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if not self.available:
+            self.start()
+            raise WsUnavailable(f"WebSocket сети {self.chain} не подключён")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.requests += 1
+        metrics.inc("rpc_calls_total", chain=self.chain, method=method)
+        with metrics.timer("rpc_request_seconds", chain=self.chain, method=method) as timer:
+            try:
+                await self._ws.send_str(FriendlyJsonSerde().json_encode(
+                    {"jsonrpc": "2.0", "method": method, "params": params or [], "id": request_id},
+                    cls=Web3JsonEncoder
+                ))
+                response = await asyncio.wait_for(future, self.request_timeout)
+            except (ConnectionError, RuntimeError) as e:
+                raise WsUnavailable(str(e)) from e
+            finally:
+                self._pending.pop(request_id, None)
+            if "error" in response:
+                timer.outcome = "error"
+            return response
+
+    async def _send_subscribe(self, subscription: Subscription):
+        response = await self.request(RPCEndpoint("eth_subscribe"), subscription.params)
+        if "error" in response:
+            logger.warning(f"⚠️ Узел сети {self.chain} отклонил eth_subscribe {subscription.params}: "
+                           f"{response['error']}\n")
+            return
+        if not isinstance(response.get("result"), str):
+            logger.warning(f"⚠️ Неожиданный ответ на eth_subscribe сети {self.chain}: {response}\n")
+            return
+        subscription.server_id = response["result"]
+        self._by_server_id[subscription.server_id] = subscription
+
+    async def _resubscribe(self):
+        for subscription in list(self._subscriptions.values()):
+            if subscription.listeners:
+                try:
+                    await self._send_subscribe(subscription)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось возобновить подписку сети {self.chain}: {e}")
+
+    async def subscribe(self, params: list, listener: Listener) -> Subscription:
+        """Подписывает ``listener`` на ``eth_subscribe(*params)``; при переподключении подписка возобновится."""
+        key = json.dumps(params)
+        subscription = self._subscriptions.get(key)
+        if subscription is None:
+            subscription = self._subscriptions[key] = Subscription(params)
+        # Повторная подписка того же обработчика (например, после ошибки) его не дублирует
+        if listener not in subscription.listeners:
+            subscription.listeners.append(listener)
+        self.start()
+        if subscription.server_id is None and self.available:
+            try:
+                await self._send_subscribe(subscription)
+            except (WsUnavailable, asyncio.TimeoutError):
+                # Подписка оформится после переподключения
+                pass
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription, listener: Listener):
+        if listener in subscription.listeners:
+            subscription.listeners.remove(listener)
+        if subscription.listeners or subscription.server_id is None:
+            return
+        server_id, subscription.server_id = subscription.server_id, None
+        self._by_server_id.pop(server_id, None)
+        try:
+            await self.request(RPCEndpoint("eth_unsubscribe"), [server_id])
+        except (WsUnavailable, asyncio.TimeoutError):
+            pass
+
+    async def close(self):
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._ws is not None:
+            await self._ws.close()
+        self._disconnected()
+
+
+_connections: dict[str, WsConnection] = {}
+
+
+def get_ws_connection(url: str, chain: int | str = "") -> WsConnection:
+    """Общее на сеть WebSocket-соединение; подключение начинается в фоне при первом обращении."""
+    if url not in _connections:
+        _connections[url] = WsConnection(url, chain)
+        _connections[url].start()
+    return _connections[url]
+
+
+async def close_ws_connections():
+    for connection in _connections.values():
+        await connection.close()
+    _connections.clear()
+
+
+def log_ws_stats():
+    rows = [f"    {connection.chain}: вызовов {connection.requests}, уведомлений подписок {connection.notifications}, "
+            f"переподключений {connection.reconnects}"
+            for connection in _connections.values() if connection.requests or connection.notifications]
+    if rows:
+        logger.info("🔌 WebSocket:\n" + "\n".join(rows) + "\n")
@@ -1,4 +1,5 @@
 from decimal import Decimal, InvalidOperation
+from client.networks import Network
 import logging
 import json
 
@@ -7,9 +8,11 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigValidator:
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, networks_path: str = "constants/networks_data.json"):
         self.config_path = config_path
+        self.networks_path = networks_path
         self.config_data = self.load_config()
+        self.networks_data = self.load_networks()
 
     def load_config(self) -> dict:
         """Загружает конфигурационный файл"""
@@ -23,44 +26,44 @@ class ConfigValidator:
             logging.error(f"❗️ Ошибка разбора JSON в файле конфигурации {self.config_path}.")
             exit(1)
 
-    async def validate_config(self) -> dict:
-        """Валидация всех полей конфигурации"""
-
-        await self.validate_required_keys()
-
-        if "from_network" not in self.config_data:
-            logging.error("❗️ Ошибка: Отсутствует 'from_network' в конфигурации.")
-            exit(1)
-
-        if "amount" not in self.config_data:
-            logging.error("❗️ Ошибка: Отсутствует 'amount' в конфигурации.")
+    def load_networks(self) -> dict:
+        """Загружает данные сетей: список поддерживаемых сетей берётся из него"""
+        try:
+            with open(self.networks_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            logging.error(f"❗️ Файл сетей {self.networks_path} не найден.")
             exit(1)
-
-        if "to_network" not in self.config_data:
-            logging.error("❗️ Ошибка: Отсутствует 'to_network' в конфигурации.")
+        except json.JSONDecodeError:
+            logging.error(f"❗️ Ошибка разбора JSON в файле сетей {self.networks_path}.")
             exit(1)
 
-        if "token" not in self.config_data:
-            logging.error("❗️ Ошибка: Отсутствует 'token' в конфигурации.")
-            exit(1)
+    @property
+    def supported_networks(self) -> list[str]:
+        """Сети из networks_data.json, chain_id которых известен клиенту"""
+        known = {network.chain_id for network in Network}
+        return [name for name, data in self.networks_data.items() if data.get("chain_id") in known]
 
-        if self.config_data["from_network"] == self.config_data["to_network"]:
-            logging.error(
-                "❗️ Ошибка: Поля 'from_network' и 'to_network' имеют одинаковое значение, введите разные сети.")
-            exit(1)
+    async def validate_config(self) -> dict:
+        """Валидация всех полей конфигурации"""
 
-        await self.validate_from_network(self.config_data["from_network"])
-        await self.validate_to_network(self.config_data["to_network"])
+        await self.validate_required_keys()
+        await self.validate_routes()
         await self.validate_amount(self.config_data["amount"])
         await self.validate_token(self.config_data["token"])
+        await self.validate_scheduler()
+        await self.validate_flags()
+        await self.validate_signing()
+        await self.validate_metrics()
+        await self.validate_proxy_policy()
+        await self.validate_rate_limit()
+        await self.validate_replacement()
 
         return self.config_data
 
     async def validate_required_keys(self):
         required_keys = [
-            "from_network",
             "amount",
-            "to_network",
             "token",
             "delay_between_profiles_range",
             "transfer_amount_range",
@@ -68,11 +71,150 @@ class ConfigValidator:
             "bridge_method"
         ]
 
+        if not self.config_data.get("routes"):
+            # Без списка маршрутов пара сетей задаётся в корне настроек
+            required_keys += ["from_network", "to_network"]
+
         for key in required_keys:
             if key not in self.config_data:
                 logging.error(f"❗️ Ошибка: отсутствует обязательный ключ '{key}' в settings.json")
                 exit(1)
 
+    async def validate_route(self, route: dict, title: str) -> None:
+        """Валидация пары сетей и переопределённых параметров одного маршрута"""
+        for key in ("from_network", "to_network"):
+            if key not in route:
+                logging.error(f"❗️ Ошибка: Отсутствует '{key}' в {title}.")
+                exit(1)
+
+        if route["from_network"] == route["to_network"]:
+            logging.error(
+                f"❗️ Ошибка: Поля 'from_network' и 'to_network' в {title} имеют одинаковое значение, "
+                f"введите разные сети.")
+            exit(1)
+
+        await self.validate_from_network(route["from_network"])
+        await self.validate_to_network(route["to_network"])
+        if "amount" in route:
+            await self.validate_amount(route["amount"])
+        if "token" in route:
+            await self.validate_token(route["token"])
+        if route.get("token", self.config_data.get("token")) == "USDC":
+            for key in ("from_network", "to_network"):
+                if not self.networks_data[route[key]].get("usdc_address"):
+                    logging.error(f"❗️ Ошибка: для бриджа USDC в {title} у сети '{route[key]}' "
+                                  f"должен быть указан usdc_address в networks_data.json.")
+                    exit(1)
+        if "bridge_method" in route and route["bridge_method"] not in ("P", "PFL", "A"):
+            logging.error(f"❗️ Ошибка: 'bridge_method' в {title} должен быть одним из: P, PFL, A.")
+            exit(1)
+        amount_range = route.get("transfer_amount_range", [0, 1])
+        if not isinstance(amount_range, list) or len(amount_range) != 2:
+            logging.error(f"❗️ Ошибка: 'transfer_amount_range' в {title} должен быть списком из двух чисел.")
+            exit(1)
+
+    async def validate_routes(self) -> None:
+        """Валидация маршрутов: список ``routes`` или пара from_network/to_network в корне"""
+        routes = self.config_data.get("routes")
+        if not routes:
+            await self.validate_route(self.config_data, "конфигурации")
+            return
+
+        if not isinstance(routes, list) or not all(isinstance(route, dict) for route in routes):
+            logging.error("❗️ Ошибка: 'routes' должен быть списком объектов с 'from_network' и 'to_network'.")
+            exit(1)
+        names = set()
+        for index, route in enumerate(routes, 1):
+            await self.validate_route(route, f"маршруте #{index}")
+            name = route.get("name") or f"{route['from_network']}->{route['to_network']}"
+            if name in names or ":" in name:
+                logging.error(f"❗️ Ошибка: имя маршрута '{name}' повторяется или содержит ':'.")
+                exit(1)
+            names.add(name)
+
+    async def validate_scheduler(self) -> None:
+        """Валидация параметров планировщика (необязательные ключи)"""
+        defaults = {
+            "concurrency": 1,
+            "max_per_proxy": 1,
+            "max_per_chain": 0
+        }
+        for key, default in defaults.items():
+            value = self.config_data.setdefault(key, default)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                logging.error(f"❗️ Ошибка: '{key}' должен быть неотрицательным целым числом.")
+                exit(1)
+
+        if self.config_data["concurrency"] < 1:
+            logging.error("❗️ Ошибка: 'concurrency' должен быть не меньше 1.")
+            exit(1)
+
+    async def validate_flags(self) -> None:
+        """Валидация необязательных флагов true/false"""
+        defaults = {
+            "balance_prefetch": False,
+            "preflight_simulation": True
+        }
+        for key, default in defaults.items():
+            if not isinstance(self.config_data.setdefault(key, default), bool):
+                logging.error(f"❗️ Ошибка: '{key}' должен быть true или false.")
+                exit(1)
+
+        ttl = self.config_data.setdefault("balance_prefetch_ttl", 120)
+        if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl < 0:
+            logging.error("❗️ Ошибка: 'balance_prefetch_ttl' должен быть числом не меньше 0 (0 — без ограничения).")
+            exit(1)
+
+    async def validate_signing(self) -> None:
+        """Валидация режима подписи транзакций"""
+        modes = ["inline", "thread", "process"]
+        if self.config_data.setdefault("signing_mode", "process") not in modes:
+            logging.error(f"❗️ Ошибка: 'signing_mode' должен быть одним из: {', '.join(modes)}.")
+            exit(1)
+
+    async def validate_metrics(self) -> None:
+        """Валидация параметров экспорта метрик"""
+        metrics_file = self.config_data.setdefault("metrics_file", "data/metrics.prom")
+        if metrics_file is not None and not isinstance(metrics_file, str):
+            logging.error("❗️ Ошибка: 'metrics_file' должен быть путём к файлу или пустой строкой.")
+            exit(1)
+
+        metrics_port = self.config_data.setdefault("metrics_port", 0)
+        if not isinstance(metrics_port, int) or isinstance(metrics_port, bool) or not 0 <= metrics_port <= 65535:
+            logging.error("❗️ Ошибка: 'metrics_port' должен быть числом от 0 до 65535 (0 — отключено).")
+            exit(1)
+
+        metrics_host = self.config_data.setdefault("metrics_host", "127.0.0.1")
+        if not isinstance(metrics_host, str) or not metrics_host:
+            logging.error("❗️ Ошибка: 'metrics_host' должен быть адресом, например 127.0.0.1.")
+            exit(1)
+
+    async def validate_proxy_policy(self) -> None:
+        """Валидация политики выбора прокси"""
+        policies = ["strict", "fastest"]
+        if self.config_data.setdefault("proxy_policy", "strict") not in policies:
+            logging.error(f"❗️ Ошибка: 'proxy_policy' должен быть одним из: {', '.join(policies)}.")
+            exit(1)
+
+    async def validate_rate_limit(self) -> None:
+        """Валидация начальной частоты запросов к одному хосту"""
+        rate = self.config_data.setdefault("rate_limit_rps", 20)
+        if not isinstance(rate, (int, float)) or isinstance(rate, bool) or rate < 0:
+            logging.error("❗️ Ошибка: 'rate_limit_rps' должен быть числом не меньше 0 (0 — без ограничения).")
+            exit(1)
+
+    async def validate_replacement(self) -> None:
+        """Валидация параметров замены зависших транзакций"""
+        defaults = {
+            "tx_replace_after_blocks": 5,
+            "tx_max_replacements": 5
+        }
+        for key, default in defaults.items():
+            value = self.config_data.setdefault(key, default)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                logging.error(f"❗️ Ошибка: '{key}' должен быть целым числом не меньше 0 (0 — без замены).")
+                exit(1)
+
     @staticmethod
     async def validate_token(token: str) -> None:
         """Валидация названия токена"""
@@ -84,28 +226,18 @@ class ConfigValidator:
             logging.error("❗️ Ошибка: Неподдерживаемый токен! Введите один из поддерживаемых токенов.")
             exit(1)
 
-    @staticmethod
-    async def validate_from_network(network: str) -> None:
+    async def validate_from_network(self, network: str) -> None:
         """Валидация названия сети"""
-        networks = [
-            "Abstract",
-            "Arbitrum",
-            "Ronin"
-        ]
-        if network not in networks:
-            logging.error("❗️ Ошибка: Неподдерживаемая сеть отправления! Введите одну из поддерживаемых сетей.")
+        if network not in self.supported_networks:
+            logging.error("❗️ Ошибка: Неподдерживаемая сеть отправления! Введите одну из поддерживаемых сетей: "
+                          f"{', '.join(self.supported_networks)}.")
             exit(1)
 
-    @staticmethod
-    async def validate_to_network(network: str) -> None:
+    async def validate_to_network(self, network: str) -> None:
         """Валидация названия сети"""
-        networks = [
-            "Abstract",
-            "Arbitrum",
-            "Ronin"
-        ]
-        if network not in networks:
-            logging.error("❗️ Ошибка: Неподдерживаемая сеть получения! Введите одну из поддерживаемых сетей.")
+        if network not in self.supported_networks:
+            logging.error("❗️ Ошибка: Неподдерживаемая сеть получения! Введите одну из поддерживаемых сетей: "
+                          f"{', '.join(self.supported_networks)}.")
             exit(1)
 
     @staticmethod
@@ -1,26 +1,59 @@
-from typing import Sized
-from eth_utils import to_checksum_address
+from utils.startup import startup
+from typing import TYPE_CHECKING, Callable, Optional
 from config.configvalidator import ConfigValidator
-from utils.balance_checker import check_balance
-from client.client import Client
-from modules.bridge import Bridge
+from modules.quote_cache import quote_cache
+from modules.routes import Route, RouteJob, build_routes, iter_route_jobs, route_key, route_of
+from modules.scheduler import ProfileScheduler
+from utils.journal import COMPLETED_STATES, IN_FLIGHT_STATES, fill_state, journal, key_fingerprint
 from utils.logger import logger
+from utils.loop_monitor import loop_monitor
+from utils.metrics import metrics, proxy_label
+from utils.profiles import Profile, count_profiles, iter_profiles
+import argparse
 import asyncio
+import logging
 import random
-import json
+import weakref
 
+if TYPE_CHECKING:
+    from modules.sharding import ShardWorker
+    from utils.balance_prefetch import BalanceSnapshot
 
-def load_profiles(private_keys_path: str, proxies_path: str) -> list[dict]:
-    with open(private_keys_path, "r", encoding="utf-8") as pk_file:
-        private_keys = [line.strip() for line in pk_file if line.strip()]
+# Тяжёлые модули (web3, eth_account, aiohttp) загружаются только после проверки конфигурации
+RUNTIME_MODULES = (
+    "aiohttp",
+    "web3",
+    "eth_account",
+    "utils.session_pool",
+    "utils.rate_limiter",
+    "utils.proxy_pool",
+    "client.signer",
+    "client.replacement",
+    "client.client",
+    "utils.address_cache",
+    "utils.balance_checker",
+    "utils.balance_prefetch",
+    "utils.allowance_cache",
+    "modules.status_tracker",
+    "modules.preflight",
+    "modules.bridge",
+)
 
-    with open(proxies_path, "r", encoding="utf-8") as proxy_file:
-        proxies = [line.strip() for line in proxy_file if line.strip()]
 
-    if len(private_keys) != len(proxies):
-        raise ValueError("Количество приватных ключей и прокси не совпадает!")
+SETTINGS_PATH = "config/settings.json"
+NETWORKS_PATH = "constants/networks_data.json"
+PRIVATE_KEYS_PATH = "config/private_keys.txt"
+PROXIES_PATH = "config/proxies.txt"
 
-    return [{"private_key": pk, "proxy": proxy} for pk, proxy in zip(private_keys, proxies)]
+# Маршруты одного кошелька из одной сети не должны тратить баланс одновременно
+_wallet_locks: "weakref.WeakValueDictionary[tuple[str, int], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def wallet_lock(profile_key: str, chain_id: int) -> asyncio.Lock:
+    lock = _wallet_locks.get((profile_key, chain_id))
+    if lock is None:
+        lock = _wallet_locks[(profile_key, chain_id)] = asyncio.Lock()
+    return lock
 
 
 async def get_random_float(min_value: float, max_value: float, precision: int = 3) -> float:
@@ -28,8 +61,56 @@ async def get_random_float(min_value: float, max_value: float, precision: int =
     return round(random.uniform(min_value, max_value), precision)
 
 
-async def run_profile(profiles: Sized, i: int, profile: dict, settings: dict, from_network: dict, to_network: dict):
+async def run_profile(total: int, i: int, profile: Profile, route: Route, routes: list[Route],
+                      snapshot: Optional["BalanceSnapshot"] = None,
+                      lease_check: Optional[Callable[[], bool]] = None) -> bool:
+    from utils.address_cache import address_cache
+
+    wallet_key = key_fingerprint(profile.private_key)
+    async with wallet_lock(wallet_key, route.from_chain):
+        try:
+            return await _run_route(total, i, profile, route, routes, snapshot, lease_check)
+        finally:
+            address = address_cache.get(wallet_key)
+            if snapshot is not None and address and len(routes) > 1:
+                # Следующий маршрут из этой сети должен увидеть баланс после бриджа, а не из снимка
+                snapshot.forget(address)
+
+
+async def _run_route(total: int, i: int, profile: Profile, route: Route, routes: list[Route],
+                     snapshot: Optional["BalanceSnapshot"] = None,
+                     lease_check: Optional[Callable[[], bool]] = None) -> bool:
+    from eth_utils import to_checksum_address
+    from client.client import Client
+    from client.rpc_pool import rpc_endpoints
+    from modules.bridge import Bridge
+    from utils.address_cache import address_cache
+    from utils.balance_checker import check_balance
+    from utils.proxy_pool import proxy_manager
+    from utils.rate_limiter import set_owner
+
+    client = None
+    bridge = None
+    proxy = None
+    settings, from_network, to_network = route.settings, route.from_data, route.to_data
+    wallet_key = key_fingerprint(profile.private_key)
+    profile_key = route_key(wallet_key, route, routes)
+    # Запросы профиля получают свою очередь в ограничителе частоты
+    set_owner(wallet_key)
+    state = journal.get(profile_key)
+    if state and state["state"] in COMPLETED_STATES:
+        logger.info(f"⏭️ Профиль #{i} уже обработан в этом прогоне ({state['state']}), пропускаем\n")
+        return True
+    if not state or state["state"] not in IN_FLIGHT_STATES:
+        journal.record(profile_key, "started")
     try:
+        proxy = proxy_manager.acquire(profile.proxy)
+        if not proxy_manager.available(proxy):
+            # Прокси выключен до следующей пробы: не ждём таймаутов на каждом запросе профиля
+            logger.error(f"❌ Профиль #{i} пропущен — прокси {proxy_label(proxy)} недоступен\n")
+            journal.record(profile_key, "failed", error="proxy unavailable")
+            return False
+
         from_address = None
         receiver_address = None
         if settings["token"] == "ETH":
@@ -37,74 +118,309 @@ async def run_profile(profiles: Sized, i: int, profile: dict, settings: dict, fr
             receiver_address = to_checksum_address(from_network["receiver"])
 
         client = Client(
-            proxy=profile["proxy"],
+            proxy=proxy,
             rpc_url=from_network["rpc_url"],
+            rpc_urls=rpc_endpoints(from_network),
+            ws_url=from_network.get("ws_url"),
             chain_id=from_network["chain_id"],
             chain_id_to=to_network["chain_id"],
-            private_key=profile["private_key"],
+            private_key=profile.private_key,
             from_address=from_address,
             amount=settings["amount"],
             token=settings["token"],
-            explorer_url=from_network["explorer_url"]
+            explorer_url=from_network["explorer_url"],
+            address=address_cache.get(wallet_key)
         )
-        logger.info(f"➡️ Запуск профиля {i}/{len(profiles)}: {client.address}...\n")
+        logger.info(f"➡️ Запуск профиля {i}/{total}: {client.address}"
+                    + (f" ({route.name})" if len(routes) > 1 else "") + "...\n")
+        bridge = Bridge(client, from_network, to_network, settings, receiver_address, profile_key, lease_check)
+
+        if state and state["state"] in IN_FLIGHT_STATES and state.get("tx_hash"):
+            # Транзакция уже подписана или отправлена до перезапуска — только дожидаемся её
+            logger.info(f"🔁 Профиль #{i}: продолжаем с транзакции {state['tx_hash']}\n")
+            raw_tx = state.get("raw_tx") if state["state"] == "signed" else None
+            if raw_tx is not None and await bridge.resend(state["tx_hash"], raw_tx, state.get("request_id")) is False:
+                # Подписанная транзакция до узла так и не дошла: бридж выполнится при следующем --resume
+                return False
+            await bridge.track_bridge(state["tx_hash"], state.get("request_id"), state.get("sent_at") or 0, raw_tx)
+            return True
+
         bridge_method = settings.get("bridge_method")
         amount = settings.get("amount")
         percent_min, percent_max = settings.get("transfer_amount_range")
         percentage = await get_random_float(percent_min, percent_max)
-        min_amount = await client.to_wei_main(settings["min_balance_to_bridge"])
+        # Для USDC суммы и баланс считаются в единицах токена, для нативной монеты — в wei
+        token_address = bridge.token_address
+        min_amount = await client.to_wei_main(settings["min_balance_to_bridge"], token_address)
 
-        native_balance = await check_balance(client, settings)
-        if native_balance < min_amount:
+        async def bridge_amount(balance: int) -> int:
+            if bridge_method == "P":
+                return int(balance * percentage)
+            elif bridge_method == "PFL":
+                return int((balance - min_amount) * percentage)
+            return int(await client.to_wei_main(amount, token_address))
+
+        # Если баланс уже известен из снимка (или сумма фиксирована), квота запрашивается
+        # параллельно с проверкой баланса и газа
+        balance_hint = None
+        if snapshot is not None and snapshot.chain_id == client.chain_id:
+            balance_hint = (snapshot.get_native(client.address) if token_address is None
+                            else snapshot.get_erc20(token_address, client.address))
+        if balance_hint is not None and balance_hint >= min_amount:
+            bridge.prefetch_quote(await bridge_amount(balance_hint))
+        elif balance_hint is None and bridge_method not in ("P", "PFL"):
+            bridge.prefetch_quote(await bridge_amount(0))
+
+        with metrics.phase("balance", client.chain_id):
+            balance = await check_balance(client, settings, from_network, snapshot=snapshot)
+        journal.record(profile_key, "balance_checked", address=client.address)
+        if balance < min_amount:
             logger.info(
-                f"⚠️ Профиль #{i} пропущен — баланс ниже минимума ({native_balance} < {min_amount} wei)\n"
+                f"⚠️ Профиль #{i} пропущен — баланс ниже минимума ({balance} < {min_amount} wei)\n"
             )
-            return
-        if bridge_method == "P":
-            real_amount = int(native_balance * percentage)
-        elif bridge_method == "PFL":
-            real_amount = int((native_balance - min_amount) * percentage)
-        else:
-            real_amount = int(await client.to_wei_main(amount))
+            journal.record(profile_key, "skipped", reason="balance")
+            return True
+        real_amount = await bridge_amount(balance)
+
+        relayer_fee = bridge.cached_relayer_fee(real_amount)
+        if relayer_fee is not None and relayer_fee >= real_amount:
+            logger.info(
+                f"⚠️ Профиль #{i} пропущен — сумма не покрывает комиссию релейера ({real_amount} <= {relayer_fee} wei)\n"
+            )
+            journal.record(profile_key, "skipped", reason="relayer_fee")
+            return True
 
         await client.set_amount(real_amount)
+        if client.amount > balance:
+            # Фиксированная сумма (метод A) может превышать баланс кошелька
+            logger.info(
+                f"⚠️ Профиль #{i} пропущен — сумма бриджа больше баланса ({client.amount} > {balance} wei)\n"
+            )
+            journal.record(profile_key, "skipped", reason="balance")
+            return True
 
         logger.info("⚙️ Собираем и подписываем транзакцию...\n")
-        bridge = Bridge(client, from_network, to_network, settings, receiver_address)
         await bridge.execute_bridge()
+        return True
 
     except Exception as e:
         logger.error(f"❌ Ошибка в профиле #{i}: {e}\n")
+        journal.record(profile_key, "failed", error=str(e))
+        return False
+    finally:
+        if bridge is not None:
+            bridge.cancel_prefetch()
+        # Клиент живёт только пока профиль активен: пик памяти определяется concurrency
+        if client is not None:
+            proxy = client.proxy
+            await client.close()
+        proxy_manager.release(proxy)
+
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Relay bridge")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить последний прогон: пропустить завершённые профили и дождаться отправленных")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="вывести время запуска с разбивкой по импортам")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="число процессов-воркеров шардированного прогона (0 — один процесс, как раньше)")
+    parser.add_argument("--shard-size", type=int, default=50, help="профилей в одном шарде")
+    parser.add_argument("--shard-dir", default="data",
+                        help="каталог очереди шардов, журнала и кэша адресов (для нескольких хостов — общий диск)")
+    parser.add_argument("--join", action="store_true",
+                        help="подключить воркеры этого хоста к уже идущему шардированному прогону в --shard-dir")
+    return parser.parse_args()
 
-async def main():
+
+async def main(resume: bool = False, startup_report: bool = False, settings_path: str = SETTINGS_PATH,
+               networks_path: str = NETWORKS_PATH, private_keys_path: str = PRIVATE_KEYS_PATH,
+               proxies_path: str = PROXIES_PATH, shard_worker: Optional["ShardWorker"] = None):
+    runtime_loaded = False
     try:
         logger.info("🚀 Запуск скрипта...\n")
-        validator = ConfigValidator("config/settings.json")
-        settings = await validator.validate_config()
+        with startup.phase("config"):
+            validator = ConfigValidator(settings_path, networks_path)
+            settings = await validator.validate_config()
+            networks_data = validator.networks_data
+
+        startup.import_modules(*RUNTIME_MODULES)
+        runtime_loaded = True
+        if startup_report:
+            startup.log()
+
+        from client.replacement import replacer
+        from client.signer import signer
+        from modules.preflight import preflight
+        from modules.status_tracker import status_tracker
+        from utils.address_cache import address_cache
+        from utils.allowance_cache import allowance_cache
+        from utils.balance_prefetch import BalanceSnapshot, prefetch_balances
+        from utils.proxy_pool import proxy_manager
+        from utils.rate_limiter import rate_limiter
+
+        if shard_worker is not None:
+            shard_worker.configure()
+
+        routes = build_routes(settings, networks_data)
+        if len(routes) > 1:
+            logger.info(f"🗺️ Маршрутов в прогоне: {len(routes)} ({', '.join(route.name for route in routes)})\n")
+
+        # 📌 Подпись транзакций вне event loop и замер его задержек
+        signer.configure(settings["signing_mode"])
+        signer.start()
+        replacer.configure(settings["tx_replace_after_blocks"], settings["tx_max_replacements"])
+        preflight.configure(settings["preflight_simulation"])
+        loop_monitor.start()
+        if shard_worker is None:
+            # Воркер шардированного прогона отдаёт метрики координатору, тот экспортирует общие
+            await metrics.start(settings["metrics_file"], settings["metrics_port"], host=settings["metrics_host"])
+
+        # 📌 Ограничение частоты запросов к каждому хосту (RPC, API Relay); воркеры хоста делят лимит
+        rate_limiter.configure(settings["rate_limit_rps"] / (shard_worker.workers if shard_worker else 1))
+
+        # 📌 Здоровье прокси: выключатель для отказавших и фоновые пробы
+        proxy_manager.configure(settings["proxy_policy"], probe_url=routes[0].from_data["rpc_url"])
+        if settings["proxy_policy"] == "fastest":
+            proxy_manager.register(profile.proxy for profile in iter_profiles(private_keys_path, proxies_path)
+                                   if profile.proxy)
+        proxy_manager.start()
+
+        # 📌 Журнал прогона и незавершённые бриджи прошлого запуска
+        journal.open(resume=resume or shard_worker is not None)
+        if shard_worker is not None:
+            shard_worker.open()
+        status_tracker.add_listener(
+            lambda event: journal.record(event.profile_key, fill_state(event.status), fill_status=event.status)
+        )
+        status_tracker.add_listener(
+            lambda event: metrics.observe("phase_seconds", event.latency, phase="fill",
+                                          chain=route_of(event.profile_key, routes).to_chain,
+                                          outcome="ok" if event.status == "success" else event.status)
+        )
+        status_tracker.resume()
+
+        # 📌 Проверка профилей: файлы читаются потоково и целиком в память не загружаются
+        profiles = count_profiles(private_keys_path, proxies_path)
+        total = profiles * len(routes)
+        logger.info(f"🔐 Загружено {profiles} профилей.\n")
 
-        with open("constants/networks_data.json", "r", encoding="utf-8") as file:
-            networks_data = json.load(file)
+        # 📌 Адреса кошельков: вычисляются один раз в пуле процессов и кэшируются по отпечатку ключа
+        address_cache.open()
+        await address_cache.derive(iter_profiles(private_keys_path, proxies_path))
 
-        from_network = networks_data[settings["from_network"]]
-        to_network = networks_data[settings["to_network"]]
+        # 📌 Предзагрузка балансов всех кошельков через Multicall3 (по желанию), один снимок на сеть отправления
+        snapshots = {}
+        if settings.get("balance_prefetch", False) and total:
+            sources = {}
+            for chain_id in dict.fromkeys(route.from_chain for route in routes):
+                chain_routes = [route for route in routes if route.from_chain == chain_id]
+                from_network = chain_routes[0].from_data
+                usdc = any(route.settings["token"] == "USDC" for route in chain_routes)
+                sources[chain_id] = (from_network, from_network.get("usdc_address") if usdc else None)
 
-        # 📌 Загрузка профилей
-        profiles = load_profiles("config/private_keys.txt", "config/proxies.txt")
-        logger.info(f"🔐 Загружено {len(profiles)} профилей.\n")
+            if shard_worker is None:
+                addresses = address_cache.addresses(iter_profiles(private_keys_path, proxies_path))
+                for chain_id, (from_network, token_address) in sources.items():
+                    snapshots[chain_id] = await prefetch_balances(from_network, addresses, token_address,
+                                                                  ttl=settings["balance_prefetch_ttl"])
+                    if token_address:
+                        # Allowance этих адресов загрузится так же пачкой, когда квота назовёт spender
+                        allowance_cache.register(from_network, addresses)
+            else:
+                # Воркер заранее не знает свои шарды: балансы шарда загружаются в фоне, как только он забран
+                snapshots = {chain_id: BalanceSnapshot(chain_id, token_address, settings["balance_prefetch_ttl"])
+                             for chain_id, (_, token_address) in sources.items()}
 
-        for i, profile in enumerate(profiles, 1):
-            await run_profile(profiles, i, profile, settings, from_network, to_network)
+                def prefetch_shard(_, profiles: list[Profile]):
+                    addresses = address_cache.addresses(profiles)
+                    for chain_id, (from_network, token_address) in sources.items():
+                        shard_worker.spawn(prefetch_balances(from_network, addresses, token_address,
+                                                             snapshot=snapshots[chain_id]))
+                        if token_address:
+                            allowance_cache.register(from_network, addresses)
 
-            if i < len(profiles):
-                delay_min, delay_max = settings.get("delay_between_profiles_range", [5, 10])
-                delay = random.randint(delay_min, delay_max)
-                logger.info(f"⏳ Ожидание {delay:.2f} сек перед следующим профилем...\n")
-                await asyncio.sleep(delay)
+                shard_worker.add_claim_listener(prefetch_shard)
+
+        # 📌 Планировщик: при concurrency = 1 поведение совпадает с последовательным запуском.
+        # Задания профилей по разным маршрутам чередуются, клиенты сетей общие для всех маршрутов
+        scheduler = ProfileScheduler.from_settings(settings)
+        if shard_worker is None:
+            jobs = iter_route_jobs(iter_profiles(private_keys_path, proxies_path), routes)
+        else:
+            # Шарды забираются из общей очереди по мере того, как полосам нужна работа
+            shard_worker.scheduler = scheduler
+            jobs = shard_worker.jobs(routes)
+
+        async def handle(i: int, job: RouteJob) -> bool:
+            lease_check = (lambda: shard_worker.owns(job)) if shard_worker is not None else None
+            try:
+                return await run_profile(total, i, job.profile, job.route, routes, snapshots.get(job.route.from_chain),
+                                         lease_check)
+            finally:
+                if shard_worker is not None:
+                    shard_worker.done(job)
+
+        await scheduler.run(jobs, handle, chain_key=lambda job: job.route.from_chain, proxy_key=lambda job: job.proxy)
+        await status_tracker.wait_all(timeout=status_tracker.timeout)
+        status_tracker.log_stats()
 
     except Exception as e:
         logger.error(f"❗️Произошла ошибка в основном пути: {e}")
+    finally:
+        loop_monitor.stop()
+        quote_cache.log_stats()
+        if runtime_loaded:
+            from client.batching import log_batch_stats
+            from client.replacement import replacer
+            from client.rpc_pool import log_rpc_pool_stats
+            from client.signer import signer
+            from client.ws_transport import close_ws_connections, log_ws_stats
+            from modules.preflight import preflight
+            from utils.address_cache import address_cache
+            from utils.allowance_cache import allowance_cache
+            from utils.proxy_pool import proxy_manager
+            from utils.rate_limiter import rate_limiter
+            from utils.session_pool import session_pool
+
+            signer.log_stats()
+            signer.close()
+            replacer.log_stats()
+            preflight.log_stats()
+            allowance_cache.log_stats()
+            loop_monitor.log_stats()
+            metrics.log_summary()
+            address_cache.close()
+            proxy_manager.log_stats()
+            await proxy_manager.close()
+            session_pool.log_stats()
+            log_batch_stats()
+            log_rpc_pool_stats()
+            log_ws_stats()
+            rate_limiter.log_stats()
+            await close_ws_connections()
+            await session_pool.close()
+        # Журнал сбрасывается до возврата шардов в очередь: забравший шард воркер должен прочитать свежие состояния
+        await journal.close()
+        if shard_worker is not None:
+            await shard_worker.close()
+        await metrics.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    args = parse_args()
+    if args.workers or args.join:
+        from modules.sharding import run_sharded
+
+        asyncio.run(run_sharded(
+            args.workers or 1, shard_size=args.shard_size, shard_dir=args.shard_dir, resume=args.resume,
+            join=args.join, startup_report=args.startup_report, settings_path=SETTINGS_PATH,
+            networks_path=NETWORKS_PATH, private_keys_path=PRIVATE_KEYS_PATH, proxies_path=PROXIES_PATH
+        ))
+    else:
+        asyncio.run(main(resume=args.resume, startup_report=args.startup_report))
@@ -1,86 +1,262 @@
+from typing import TYPE_CHECKING, Callable, Optional
+import asyncio
+import time
+
 import aiohttp
 from eth_utils import to_checksum_address
 
-from client.client import Client
+from client.client import retry_on_proxy_error
+from modules.preflight import DOOMED, REQUOTABLE, preflight
+from modules.quote_cache import quote_cache
+from modules.status_tracker import RELAY_API_URL, fetch_intent_status, status_tracker
+from utils.allowance_cache import allowance_cache
+from utils.journal import journal
 from utils.logger import logger
+from utils.metrics import metrics, proxy_label
+from utils.rate_limiter import rate_limiter
+from utils.session_pool import session_pool
+
+if TYPE_CHECKING:
+    from client.client import Client
+
+NATIVE_CURRENCY = "0x0000000000000000000000000000000000000000"
+# approve(address,uint256)
+APPROVE_SELECTOR = "0x095ea7b3"
 
 
 class Bridge:
-    def __init__(self, client: Client, from_network: dict, to_network: dict, settings: dict, receiver_address: str):
+    def __init__(self, client: "Client", from_network: dict, to_network: dict, settings: dict, receiver_address: str,
+                 profile_key: Optional[str] = None, lease_check: Optional[Callable[[], bool]] = None):
         self.client = client
+        self.profile_key = profile_key
+        # В шардированном прогоне: принадлежит ли кошелёк ещё этому воркеру (проверяется перед отправкой)
+        self.lease_check = lease_check
         self.receiver_address = receiver_address
         self.from_network = from_network
         self.to_network = to_network
         self.settings = settings
         self.pool_contract = None
+        # Для USDC бриджится токен: квота в адресах токена, депозиту нужен approve
+        self.token_address: Optional[str] = from_network["usdc_address"] if settings.get("token") == "USDC" else None
+        self._quote_task: Optional[asyncio.Task] = None
+        self._quote_amount: Optional[int] = None
+        self._quote_started: Optional[float] = None
+        self._quote_done_at: Optional[float] = None
 
-    async def get_quote(self):
-        try:
-            url = "https://api.relay.link/quote"
+    @property
+    def currencies(self) -> tuple[str, str]:
+        """Валюты квоты в сети отправления и в сети назначения."""
+        if self.token_address is None:
+            return NATIVE_CURRENCY, NATIVE_CURRENCY
+        return self.token_address, self.to_network["usdc_address"]
 
-            payload = {
-                "useReceiver": True,
-                "user": self.client.address,
-                "originChainId": self.client.chain_id,
-                "destinationChainId": self.client.chain_id_to,
-                "originCurrency": "0x0000000000000000000000000000000000000000",
-                "destinationCurrency": "0x0000000000000000000000000000000000000000",
-                "amount": str(self.client.amount),
-                "tradeType": "EXACT_INPUT"
-            }
+    def _cache_key(self, amount: int) -> tuple:
+        return quote_cache.key(self.client.chain_id, self.client.chain_id_to, self.currencies[0], amount)
+
+    @staticmethod
+    def _deposit_step(quote: dict) -> dict:
+        """Шаг квоты с транзакцией бриджа. Шаг approve бот не отправляет, а решает сам по таблице allowance."""
+        steps = [step for step in quote["steps"] if step.get("id") != "approve"]
+        return steps[0] if steps else quote["steps"][-1]
+
+    def _spender(self, quote: dict) -> str:
+        """Адрес, которому нужен allowance: из шага approve квоты, иначе получатель депозита."""
+        for step in quote["steps"]:
+            data = step["items"][0]["data"].get("data", "") if step.get("id") == "approve" else ""
+            if data.startswith(APPROVE_SELECTOR):
+                return to_checksum_address("0x" + data[34:74])
+        return to_checksum_address(self._deposit_step(quote)["items"][0]["data"]["to"])
 
-            headers = {"Content-Type": "application/json"}
+    def _disable_proxy(self) -> bool:
+        return self.client._disable_proxy()
 
-            proxy = f"http://{self.client.proxy}"
+    @retry_on_proxy_error()
+    async def _request_quote(self, payload: dict) -> dict:
+        url = f"{RELAY_API_URL}/quote"
+        headers = {"Content-Type": "application/json"}
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=headers, proxy=proxy) as response:
+        proxy = session_pool.proxy_url(self.client.proxy)
+
+        session = await session_pool.get(self.client.proxy)
+        with metrics.phase("quote", self.client.chain_id), \
+                metrics.timer("http_request_seconds", target="relay", proxy=proxy_label(self.client.proxy)):
+            try:
+                async with rate_limiter.request(session, "POST", url, json=payload, headers=headers,
+                                                proxy=proxy) as response:
                     if response.status != 200:
                         text = await response.text()
                         raise logger.error(f"❌ Ошибка запроса: статус {response.status}, ответ: {text}\n")
                     try:
-                        result = await response.json()
+                        return await response.json()
                     except aiohttp.ContentTypeError:
                         text = await response.text()
                         raise logger.error(f"❌ Некорректный JSON в ответе: {text}\n")
+            except (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError):
+                metrics.inc("proxy_errors_total", proxy=proxy_label(self.client.proxy))
+                raise
+
+    async def get_quote(self, amount: Optional[int] = None):
+        amount = self.client.amount if amount is None else amount
+        try:
+            started = time.monotonic()
+
+            payload = {
+                "useReceiver": True,
+                "user": self.client.address,
+                "originChainId": self.client.chain_id,
+                "destinationChainId": self.client.chain_id_to,
+                "originCurrency": self.currencies[0],
+                "destinationCurrency": self.currencies[1],
+                "amount": str(amount),
+                "tradeType": "EXACT_INPUT"
+            }
 
-                    return result
+            result = await self._request_quote(payload)
+            quote_cache.record_quote(time.monotonic() - started)
+            quote_cache.put(self._cache_key(amount), result)
+            return result
         except Exception as e:
             logger.error(f"❌ Ошибка при получении квоты: {e}")
 
-    async def get_status(self, data):
-        try:
-            url = "https://api.relay.link/intents/status/v2"
-            querystring = {"requestId": data}
-            proxy = f"http://{self.client.proxy}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=querystring, proxy=proxy) as response:
-                    if response.status != 200:
-                        text = await response.text()
-                        logger.error(f"❌ Ошибка запроса: статус {response.status}, ответ: {text}\n")
-                        return {}
+    def prefetch_quote(self, amount: int):
+        """Запускает запрос квоты в фоне, пока профиль проверяет баланс и газ."""
+        self._quote_amount = amount
+        self._quote_started = time.monotonic()
+        self._quote_done_at = None
+        self._quote_task = asyncio.ensure_future(self.get_quote(amount))
+        self._quote_task.add_done_callback(lambda _: setattr(self, "_quote_done_at", time.monotonic()))
 
-                    try:
-                        result = await response.json()
-                        logger.info(f"✅ Операция успешно завершена,"
-                                    f" проверьте поступления средств в сети назначения...")
-                        return result
+    def cancel_prefetch(self):
+        if self._quote_task is not None:
+            self._quote_task.cancel()
+            self._quote_task = None
 
-                    except aiohttp.ContentTypeError:
-                        text = await response.text()
-                        logger.error(f"❌ Некорректный JSON в ответе: {text}\n")
-                        return {}
+    async def _take_quote(self):
+        """Возвращает предзагруженную квоту, если она запрошена для текущей суммы, иначе запрашивает новую."""
+        task, self._quote_task = self._quote_task, None
+        if task is None:
+            return await self.get_quote()
+        if self._quote_amount != self.client.amount:
+            task.cancel()
+            return await self.get_quote()
+
+        needed_at = time.monotonic()
+        quote = await task
+        if quote is None:
+            # Предзагрузка упала на временной ошибке Relay или прокси: пробуем ещё раз сейчас
+            return await self.get_quote()
+        finished_at = self._quote_done_at or time.monotonic()
+        quote_cache.record_prefetch(min(needed_at, finished_at) - self._quote_started)
+        return quote
+
+    def cached_relayer_fee(self, amount: int) -> Optional[int]:
+        """Комиссия релейера из недавней квоты с похожей суммой, если она есть в кэше.
+
+        Комиссия в другой валюте (например, в нативной монете при бридже USDC) с суммой не сравнима.
+        """
+        metadata = quote_cache.get(self._cache_key(amount))
+        try:
+            fee = metadata["fees"]["relayer"]
+            currency = fee.get("currency", {}).get("address", NATIVE_CURRENCY)
+            if currency.lower() != self.currencies[0].lower():
+                return None
+            return int(fee["amount"])
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return None
+
+    async def get_status(self, request_id: str) -> dict:
+        try:
+            result = await fetch_intent_status(request_id, self.client.proxy)
+            if result:
+                logger.info(f"ℹ️ Статус бриджа {request_id}: {result.get('status')}\n")
+            return result
         except Exception as e:
             logger.error(f"❌ Ошибка при выполнении status-запроса: {e}")
             return {}
 
+    async def _preflight(self, quote: dict) -> Optional[dict]:
+        """Пробный прогон транзакции квоты; при откате квота запрашивается заново.
+
+        Возвращает квоту, которую можно отправлять, или ``None``, если транзакция обречена.
+        """
+        for attempt in range(preflight.max_requotes + 1):
+            tx_data = self._deposit_step(quote)["items"][0]["data"]
+            outcome = await preflight.simulate(self.client, tx_data)
+            if outcome not in DOOMED:
+                return quote
+            if outcome not in REQUOTABLE or attempt == preflight.max_requotes:
+                break
+            preflight.record_requote(self.client.chain_id)
+            logger.info("🔁 Транзакция квоты не прошла пробный прогон, запрашиваем квоту заново\n")
+            requoted = await self.get_quote()
+            if not requoted or not requoted.get("steps"):
+                break
+            quote = requoted
+
+        preflight.record_dropped()
+        journal.record(self.profile_key, "failed", error=f"simulation: {outcome}")
+        logger.error(f"❌ Транзакция не прошла пробный прогон ({outcome}), бридж не отправлен\n")
+        return None
+
+    async def _needs_approve(self, spender: str) -> bool:
+        allowance = await allowance_cache.get(self.client, self.token_address, spender)
+        if allowance is None:
+            # Allowance неизвестен: approve надёжнее, чем бридж, который откатится без него
+            return True
+        if allowance >= self.client.amount:
+            allowance_cache.record_skip()
+            logger.info(f"ℹ️ Allowance {allowance} покрывает сумму бриджа, approve не нужен\n")
+            return False
+        return True
+
+    def _lease_lost(self) -> bool:
+        if self.lease_check is None or self.lease_check():
+            return False
+        # Журнал не трогаем: состояние профиля теперь ведёт воркер, забравший шард
+        logger.error("❌ Аренда шарда истекла, транзакция не отправлена: кошелёк обработает другой воркер\n")
+        return True
+
     async def execute_bridge(self):
 
         try:
-            quote = await self.get_quote()
-            step = quote["steps"][0]
+            quote = await self._take_quote()
+            if not quote or not quote.get("steps"):
+                # Квота не получена (лимит запросов, ошибка API) — профиль завершается без отправки
+                journal.record(self.profile_key, "failed", error="quote")
+                logger.error("❌ Квота не получена, бридж не выполнен\n")
+                return
+            spender, approve = None, False
+            if self.token_address is not None:
+                # Allowance берётся из таблицы прогона; nonce загружается тем же batch-запросом
+                spender = self._spender(quote)
+                approve, _ = await asyncio.gather(self._needs_approve(spender), self.client.nonces.prefetch())
+            if preflight.enabled and not approve:
+                # Обречённая транзакция отсеивается до подписи: nonce и газ не тратятся.
+                # Nonce загружается тем же batch-запросом, что и пробный прогон.
+                # Депозит, которому нужен ещё не отправленный approve, проверить так нельзя
+                quote, _ = await asyncio.gather(self._preflight(quote), self.client.nonces.prefetch())
+                if quote is None:
+                    return
+            step = self._deposit_step(quote)
+            request_id = step.get("requestId")
             item = step["items"][0]
             tx_data = item["data"]
+            journal.record(self.profile_key, "quoted", request_id=request_id)
+
+            approve_hash = None
+            if self._lease_lost():
+                return
+            if approve:
+                # approve и бридж уходят подряд с последовательными nonce, без ожидания между ними:
+                # обе транзакции попадают в один блок, и бридж ждёт одно подтверждение, а не два
+                approve_hash = await self.client.approve_usdc(self.token_address, spender, self.client.amount,
+                                                              self.client.eip_1559)
+                if approve_hash is None:
+                    journal.record(self.profile_key, "failed", error="approve")
+                    return
+                allowance_cache.record_approval(self.client, self.token_address, spender, self.client.amount)
+                if self._lease_lost():
+                    return
 
             tx = await self.client.prepare_tx(
                 to_address=to_checksum_address(tx_data["to"]),
@@ -90,10 +266,91 @@ class Bridge:
                 max_priority_fee_per_gas=int(tx_data["maxPriorityFeePerGas"])
             )
 
-            tx_hash = await self.client.sign_and_send_tx(transaction=tx, external_gas=int(tx_data["gas"]))
-            await self.client.wait_tx(tx_hash)
-            await self.get_status(tx_data["data"])
+            tx_hash = await self.client.sign_and_send_tx(
+                transaction=tx, external_gas=int(tx_data["gas"]),
+                on_signed=lambda signed_hash, raw_tx: journal.record(
+                    self.profile_key, "signed", durable=True, tx_hash=signed_hash, sent_at=time.time(), raw_tx=raw_tx)
+            )
+            sent_at = time.time()
+            raw_tx = None
+            if tx_hash is None:
+                tx_hash, raw_tx = self.client.unconfirmed_send_hash, self.client.unconfirmed_send_raw
+                if tx_hash is None:
+                    journal.record(self.profile_key, "failed", error="send")
+                    return
+                # Узел мог принять транзакцию до обрыва: профиль остаётся в signed, повторять бридж нельзя.
+                # Если квитанции не будет, та же подписанная транзакция отправляется ещё раз
+                logger.warning(f"⚠️ Неизвестно, принята ли транзакция {tx_hash}, ожидаем её квитанцию\n")
+            else:
+                journal.record(self.profile_key, "sent", tx_hash=tx_hash, sent_at=sent_at)
+            if request_id:
+                # Интент сохраняется сразу: при таймауте или падении до квитанции его не потерять
+                status_tracker.register(request_id, self.client.proxy, tx_hash, sent_at, self.profile_key)
+            if approve_hash is None:
+                confirmed = await self.track_bridge(tx_hash, request_id, sent_at, raw_tx)
+            else:
+                approved, confirmed = await asyncio.gather(self.client.wait_tx(approve_hash),
+                                                           self.track_bridge(tx_hash, request_id, sent_at, raw_tx))
+                if not approved:
+                    allowance_cache.forget(self.client, self.token_address, spender)
+            if confirmed:
+                preflight.record_confirmation(time.time() - sent_at)
+                if spender is not None:
+                    allowance_cache.record_spent(self.client, self.token_address, spender, self.client.amount)
 
             return
         except Exception as e:
+            journal.record(self.profile_key, "failed", error=str(e))
             logger.error(f"{e}")
+
+    async def resend(self, tx_hash: str, raw_tx: str, request_id: Optional[str]) -> Optional[bool]:
+        """Повторно отправляет подписанную транзакцию бриджа, исход отправки которой неизвестен.
+
+        Отклонённая узлом транзакция в блок уже не попадёт: профиль помечается failed,
+        и --resume выполнит бридж заново.
+        """
+        accepted = await self.client.rebroadcast(raw_tx)
+        if accepted:
+            journal.record(self.profile_key, "sent", durable=True, tx_hash=tx_hash)
+        elif accepted is False:
+            journal.record(self.profile_key, "failed", error="dropped")
+            if request_id:
+                await status_tracker.discard(request_id)
+        return accepted
+
+    async def track_bridge(self, tx_hash: str, request_id: Optional[str], sent_at: float,
+                           raw_tx: Optional[str] = None) -> bool:
+        """Ждёт подтверждения транзакции в сети отправления и ставит интент на отслеживание.
+
+        ``raw_tx`` — подписанная транзакция, отправка которой оборвалась: без квитанции она отправляется ещё раз.
+        """
+        replaced = False
+
+        def on_replaced(new_hash: str):
+            nonlocal replaced
+            replaced = True
+            # Журнал хранит последний отправленный вариант, чтобы --resume ждал актуальный хэш
+            journal.record(self.profile_key, "sent", durable=True, tx_hash=new_hash)
+
+        outcome = await self.client.wait_tx(tx_hash, on_replaced=on_replaced)
+        # После замены с тем же nonce исходную транзакцию узел отклонит, хотя бридж ещё в пути
+        if outcome is None and raw_tx is not None and not replaced and await self.resend(tx_hash, raw_tx, request_id):
+            outcome = await self.client.wait_tx(tx_hash, on_replaced=on_replaced)
+        if outcome is None:
+            # Состояние остаётся sent (или signed): транзакция могла всё ещё попасть в блок, повторять бридж нельзя
+            return False
+        if not outcome:
+            # Транзакция откатилась в блоке: средства не ушли, --resume повторит профиль
+            journal.record(self.profile_key, "failed", error="reverted")
+            if request_id:
+                await status_tracker.discard(request_id)
+            return False
+
+        tx_hash = self.client.confirmed_tx_hash or tx_hash
+        journal.record(self.profile_key, "confirmed", tx_hash=tx_hash)
+        if request_id:
+            # Исполнение в сети назначения отслеживается в фоне, профиль не ждёт его
+            status_tracker.track(request_id, self.client.proxy, tx_hash, sent_at, self.profile_key)
+            logger.info(f"✅ Операция успешно завершена, исполнение бриджа {request_id} "
+                        f"в сети назначения отслеживается...\n")
+        return True
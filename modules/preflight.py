@@ -0,0 +1,139 @@
+from collections import defaultdict
+from typing import TYPE_CHECKING
+import asyncio
+
+from eth_utils import to_checksum_address
+from web3.exceptions import ContractLogicError
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from client.client import Client
+
+# Исходы пробного прогона, после которых отправлять транзакцию бессмысленно
+DOOMED = ("revert", "out_of_gas", "funds")
+# Откат или нехватку газа может исправить свежая квота, нехватку баланса — нет
+REQUOTABLE = ("revert", "out_of_gas")
+
+
+def classify_error(error: BaseException) -> str:
+    """Исход пробного прогона по ошибке ``eth_call``/``eth_estimateGas``.
+
+    ``unavailable`` — узел не ответил (сеть, прокси, таймаут): о транзакции ничего не известно.
+    """
+    if not isinstance(error, ContractLogicError) and not (
+            isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict)):
+        return "unavailable"
+    message = str(error).lower()
+    if "insufficient funds" in message:
+        return "funds"
+    if "out of gas" in message or "gas required exceeds" in message or "intrinsic gas too low" in message:
+        return "out_of_gas"
+    if "revert" in message:
+        return "revert"
+    return "error"
+
+
+class Preflight:
+    """Пробный прогон транзакций бриджа до подписи.
+
+    Для транзакции из квоты одновременно отправляются ``eth_call`` (с лимитом газа квоты)
+    и ``eth_estimateGas``; батчер склеивает их в один batch-запрос. Если транзакция
+    откатится, не уложится в лимит газа или баланса не хватит на value и комиссию, она не
+    подписывается и не отправляется, а nonce не расходуется. Учитывается газ, который
+    сожгли бы такие транзакции, и время, которое ушло бы на ожидание их квитанций.
+    """
+
+    def __init__(self, enabled: bool = True, max_requotes: int = 1):
+        self.enabled = enabled
+        self.max_requotes = max_requotes
+        self.simulated = 0
+        self.requoted = 0
+        self.dropped = 0
+        self.outcomes: dict[str, int] = defaultdict(int)
+        # Газ и комиссия (верхняя оценка, wei) отсеянных транзакций по сетям
+        self.saved_gas: dict[int, int] = defaultdict(int)
+        self.saved_fee: dict[int, int] = defaultdict(int)
+        self.confirmations = 0
+        self.confirmation_time = 0.0
+
+    def configure(self, enabled: bool):
+        self.enabled = enabled
+
+    async def simulate(self, client: "Client", tx_data: dict) -> str:
+        """Исход пробного прогона транзакции квоты: ``ok``, ``revert``, ``out_of_gas``, ``funds``,
+        ``error`` или ``unavailable``."""
+        gas_limit = int(tx_data["gas"])
+        transaction = {
+            "from": client.address,
+            "to": to_checksum_address(tx_data["to"]),
+            "value": int(tx_data["value"]),
+            "data": tx_data["data"]
+        }
+        if client.eip_1559:
+            # С комиссией квоты узел проверит, хватит ли баланса на value и газ
+            transaction["maxFeePerGas"] = int(tx_data["maxFeePerGas"])
+            transaction["maxPriorityFeePerGas"] = int(tx_data["maxPriorityFeePerGas"])
+
+        self.simulated += 1
+        with metrics.phase("simulate", client.chain_id) as timer:
+            call, estimate = await asyncio.gather(
+                client.w3.eth.call(dict(transaction, gas=gas_limit)),
+                client.w3.eth.estimate_gas(transaction),
+                return_exceptions=True
+            )
+            error = next((result for result in (call, estimate) if isinstance(result, BaseException)), None)
+            if isinstance(error, asyncio.CancelledError):
+                raise error
+            if error is not None:
+                outcome = classify_error(error)
+            elif estimate > gas_limit:
+                outcome = "out_of_gas"
+            else:
+                outcome = "ok"
+            timer.outcome = outcome
+
+        self.outcomes[outcome] += 1
+        metrics.inc("preflight_total", chain=client.chain_id, outcome=outcome)
+        if outcome in DOOMED:
+            self.saved_gas[client.chain_id] += gas_limit
+            self.saved_fee[client.chain_id] += gas_limit * int(tx_data.get("maxFeePerGas") or 0)
+            metrics.inc("preflight_saved_gas_total", gas_limit, chain=client.chain_id)
+            detail = error if error is not None else f"нужно {estimate} газа при лимите квоты {gas_limit}"
+            logger.warning(f"⚠️ Пробный прогон транзакции {client.address}: {outcome} ({detail})\n")
+        elif outcome != "ok":
+            logger.warning(f"⚠️ Пробный прогон транзакции {client.address} не удался, отправляем без него: {error}\n")
+        return outcome
+
+    def record_requote(self, chain_id: int):
+        self.requoted += 1
+        metrics.inc("preflight_requotes_total", chain=chain_id)
+
+    def record_dropped(self):
+        """Профиль завершён без отправки: и свежая квота не прошла пробный прогон."""
+        self.dropped += 1
+
+    def record_confirmation(self, seconds: float):
+        """Время от отправки до подтверждения транзакции — столько ждал бы квитанции и отсеянный вариант."""
+        self.confirmations += 1
+        self.confirmation_time += seconds
+
+    def log_stats(self):
+        if not self.simulated:
+            return
+        outcomes = ", ".join(f"{outcome} {count}" for outcome, count in sorted(self.outcomes.items()))
+        line = (f"🧪 Пробный прогон: транзакций {self.simulated} ({outcomes}), перезапрошено квот {self.requoted}, "
+                f"профилей без отправки {self.dropped}")
+        doomed = sum(self.outcomes[outcome] for outcome in DOOMED)
+        if doomed:
+            gas = ", ".join(f"{chain_id}: {gas} газа (до {self.saved_fee[chain_id] / 10 ** 18:.6f})"
+                            for chain_id, gas in self.saved_gas.items())
+            line += f"; не отправлено обречённых транзакций {doomed}, сэкономлено {gas}"
+            if self.confirmations:
+                saved = doomed * self.confirmation_time / self.confirmations
+                line += f" и ~{saved:.1f} сек ожидания квитанций"
+        logger.info(line + "\n")
+
+
+preflight = Preflight()
@@ -0,0 +1,72 @@
+from typing import Optional
+import time
+
+from utils.logger import logger
+
+
+class QuoteCache:
+    """Кэш метаданных квот Relay с коротким TTL.
+
+    Ключ — (сеть отправления, сеть назначения, валюта, корзина суммы). Хранятся только
+    комиссии и параметры маршрута: calldata квоты привязана к пользователю и всегда
+    запрашивается заново.
+    """
+
+    def __init__(self, ttl: float = 30, significant_digits: int = 2):
+        self.ttl = ttl
+        self.significant_digits = significant_digits
+        self._items: dict[tuple, tuple[float, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.quotes = 0
+        self.quote_latency = 0.0
+        self.prefetched = 0
+        self.latency_saved = 0.0
+
+    def amount_bucket(self, amount: int) -> int:
+        """Округляет сумму вниз до ``significant_digits`` значащих цифр."""
+        amount = int(amount)
+        scale = 10 ** max(0, len(str(amount)) - self.significant_digits)
+        return amount // scale * scale
+
+    def key(self, origin_chain_id: int, destination_chain_id: int, currency: str, amount: int) -> tuple:
+        return origin_chain_id, destination_chain_id, currency.lower(), self.amount_bucket(amount)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        item = self._items.get(key)
+        if item is None or time.monotonic() - item[0] > self.ttl:
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: tuple, quote: dict):
+        metadata = {name: quote[name] for name in ("fees", "details") if name in quote}
+        if metadata:
+            self._items[key] = (time.monotonic(), metadata)
+
+    def record_quote(self, latency: float):
+        self.quotes += 1
+        self.quote_latency += latency
+
+    def record_prefetch(self, saved: float):
+        self.prefetched += 1
+        self.latency_saved += saved
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def log_stats(self):
+        if not self.quotes:
+            return
+        logger.info(
+            f"🧾 Квоты: запросов {self.quotes}, средняя задержка {self.quote_latency / self.quotes:.2f} сек, "
+            f"попаданий в кэш {self.hits}/{self.hits + self.misses} ({self.hit_rate:.1%}), "
+            f"предзагружено {self.prefetched}, сэкономлено {self.latency_saved:.1f} сек\n"
+        )
+
+
+quote_cache = QuoteCache()
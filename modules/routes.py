@@ -0,0 +1,87 @@
+from typing import Iterable, Iterator, Optional
+
+from utils.profiles import Profile
+
+# Параметры, которые маршрут может переопределить; по умолчанию берутся из корня settings.json
+ROUTE_SETTINGS = ("bridge_method", "amount", "transfer_amount_range", "min_balance_to_bridge", "token")
+
+
+class Route:
+    """Направление бриджа (сеть отправления → сеть назначения) со своими параметрами суммы."""
+    __slots__ = ("name", "from_network", "to_network", "settings", "from_data", "to_data")
+
+    def __init__(self, from_network: str, to_network: str, settings: dict, networks_data: dict,
+                 name: Optional[str] = None):
+        self.name = name or f"{from_network}->{to_network}"
+        self.from_network = from_network
+        self.to_network = to_network
+        self.settings = settings
+        self.from_data = networks_data[from_network]
+        self.to_data = networks_data[to_network]
+
+    @property
+    def from_chain(self) -> int:
+        return self.from_data["chain_id"]
+
+    @property
+    def to_chain(self) -> int:
+        return self.to_data["chain_id"]
+
+    def __repr__(self) -> str:
+        return f"Route({self.name})"
+
+
+class RouteJob:
+    """Одна единица работы планировщика: профиль на конкретном маршруте."""
+    __slots__ = ("profile", "route")
+
+    def __init__(self, profile: Profile, route: Route):
+        self.profile = profile
+        self.route = route
+
+    @property
+    def proxy(self) -> Optional[str]:
+        return self.profile.proxy
+
+
+def build_routes(settings: dict, networks_data: dict) -> list[Route]:
+    """Маршруты прогона: список ``routes`` из настроек или одна пара ``from_network``/``to_network``."""
+    if not settings.get("routes"):
+        return [Route(settings["from_network"], settings["to_network"], settings, networks_data)]
+
+    routes = []
+    for item in settings["routes"]:
+        route_settings = dict(settings)
+        route_settings.update({key: item[key] for key in ROUTE_SETTINGS if key in item})
+        route_settings["from_network"] = item["from_network"]
+        route_settings["to_network"] = item["to_network"]
+        routes.append(Route(item["from_network"], item["to_network"], route_settings, networks_data, item.get("name")))
+    return routes
+
+
+def route_key(profile_key: str, route: Route, routes: list[Route]) -> str:
+    """Ключ профиля в журнале. С одним маршрутом он совпадает с отпечатком ключа, как раньше."""
+    if len(routes) == 1:
+        return profile_key
+    return f"{profile_key}:{route.name}"
+
+
+def route_of(key: Optional[str], routes: list[Route]) -> Route:
+    """Маршрут по ключу журнала (см. ``route_key``)."""
+    name = (key or "").partition(":")[2]
+    for route in routes:
+        if route.name == name:
+            return route
+    return routes[0]
+
+
+def iter_route_jobs(profiles: Iterable[Profile], routes: list[Route]) -> Iterator[RouteJob]:
+    """Профили × маршруты с чередованием.
+
+    Каждый следующий профиль начинает со следующего маршрута, поэтому соседние задания
+    (которые полосы планировщика берут одновременно) распределены по всем сетям.
+    """
+    for index, profile in enumerate(profiles):
+        offset = index % len(routes)
+        for route in routes[offset:] + routes[:offset]:
+            yield RouteJob(profile, route)
@@ -0,0 +1,140 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable, Iterator, Optional
+import asyncio
+import random
+import time
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class SchedulerStats:
+    def __init__(self):
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Пропускная способность в профилях в минуту."""
+        elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.0
+        return (self.succeeded + self.failed) / elapsed * 60
+
+
+class ProfileScheduler:
+    """Конкурентный планировщик профилей.
+
+    Профили обрабатываются в ``concurrency`` параллельных полосах. Внутри каждой полосы
+    сохраняется прежняя семантика ``delay_between_profiles_range``: перед каждым следующим
+    профилем полоса ждёт случайную задержку. Дополнительно ограничивается число
+    одновременных профилей на один прокси и на одну сеть.
+    """
+
+    def __init__(self, concurrency: int = 1, max_per_proxy: int = 1, max_per_chain: int = 0,
+                 delay_range: Iterable[int | float] = (5, 10)):
+        self.concurrency = max(1, int(concurrency))
+        self.max_per_proxy = int(max_per_proxy)
+        self.max_per_chain = int(max_per_chain)
+        self.delay_min, self.delay_max = delay_range
+        # Семафор прокси живёт, пока его используют профили: число записей не растёт с числом прокси
+        self._proxy_limits: dict[Hashable, asyncio.Semaphore] = {}
+        self._proxy_users: dict[Hashable, int] = {}
+        self._chain_limits: dict[Hashable, asyncio.Semaphore] = defaultdict(self._chain_semaphore)
+        self.stats = SchedulerStats()
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "ProfileScheduler":
+        return cls(
+            concurrency=settings.get("concurrency", 1),
+            max_per_proxy=settings.get("max_per_proxy", 1),
+            max_per_chain=settings.get("max_per_chain", 0),
+            delay_range=settings.get("delay_between_profiles_range", [5, 10])
+        )
+
+    def _proxy_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_per_proxy if self.max_per_proxy > 0 else self.concurrency)
+
+    def _chain_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_per_chain if self.max_per_chain > 0 else self.concurrency)
+
+    @asynccontextmanager
+    async def _proxy_slot(self, key: Hashable) -> AsyncIterator[None]:
+        semaphore = self._proxy_limits.get(key)
+        if semaphore is None:
+            semaphore = self._proxy_limits[key] = self._proxy_semaphore()
+        self._proxy_users[key] = self._proxy_users.get(key, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._proxy_users[key] -= 1
+            if not self._proxy_users[key]:
+                del self._proxy_users[key]
+                del self._proxy_limits[key]
+
+    async def _sleep_between_profiles(self):
+        delay = random.randint(int(self.delay_min), int(self.delay_max))
+        logger.info(f"⏳ Ожидание {delay:.2f} сек перед следующим профилем...\n")
+        await asyncio.sleep(delay)
+
+    async def _lane(self, lane: int, jobs: Iterator[tuple[int, Any]],
+                    handler: Callable[[int, Any], Awaitable[Any]],
+                    chain_key: Callable[[Any], Hashable], proxy_key: Callable[[Any], Hashable]):
+        first = True
+        for i, profile in jobs:
+            if first:
+                first = False
+                # Джиттер старта, чтобы полосы не стартовали одновременно
+                if lane > 0 and self.delay_min > 0:
+                    await asyncio.sleep(random.uniform(0, self.delay_min))
+            else:
+                await self._sleep_between_profiles()
+
+            self.stats.started += 1
+            async with self._proxy_slot(proxy_key(profile)), self._chain_limits[chain_key(profile)]:
+                try:
+                    result = await handler(i, profile)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка в профиле #{i}: {e}\n")
+                    result = False
+
+            if result is False:
+                self.stats.failed += 1
+            else:
+                self.stats.succeeded += 1
+            metrics.inc("profiles_total", outcome="failed" if result is False else "ok")
+
+    async def run(self, profiles: Iterable[Any], handler: Callable[[int, Any], Awaitable[Any]],
+                  chain_key: Optional[Callable[[Any], Hashable]] = None,
+                  proxy_key: Optional[Callable[[Any], Hashable]] = None) -> SchedulerStats:
+        """Запускает обработку профилей и возвращает статистику прогона.
+
+        ``handler(i, profile)`` должен вернуть ``False`` для неудачного профиля.
+        Профили забираются из итератора лениво по мере освобождения полос.
+        """
+        chain_key = chain_key or (lambda _: None)
+        proxy_key = proxy_key or (lambda profile: profile.proxy)
+        jobs = enumerate(profiles, 1)
+        self.stats = SchedulerStats()
+
+        await asyncio.gather(*(
+            self._lane(lane, jobs, handler, chain_key, proxy_key) for lane in range(self.concurrency)
+        ))
+
+        self.stats.finished_at = time.monotonic()
+        logger.info(
+            f"📊 Обработано профилей: {self.stats.succeeded + self.stats.failed} "
+            f"(успешно: {self.stats.succeeded}, с ошибкой: {self.stats.failed}) "
+            f"за {self.stats.elapsed:.1f} сек — {self.stats.throughput:.2f} профилей/мин\n"
+        )
+        return self.stats
@@ -0,0 +1,273 @@
+from typing import Any, Callable, Coroutine, Iterator, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+
+from config.configvalidator import ConfigValidator
+from modules.routes import Route, RouteJob, iter_route_jobs
+from modules.scheduler import ProfileScheduler
+from utils.journal import journal, key_fingerprint
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.profiles import Profile, iter_profiles
+from utils.work_queue import Shard, ShardedProfiles, WorkQueue
+
+ClaimListener = Callable[[Shard, list[Profile]], None]
+
+
+def queue_path(shard_dir: str) -> str:
+    return os.path.join(shard_dir, "queue.sqlite3")
+
+
+class ShardWorker:
+    """Воркер шардированного прогона (отдельный процесс со своим event loop).
+
+    Забирает шарды из общей очереди, пока они есть, продлевает их аренду и публикует
+    в очереди свою статистику и снимок метрик. Журнал прогона и кэш адресов общие для
+    всех воркеров, незавершённые бриджи и остальное состояние — свои у каждого.
+    """
+
+    def __init__(self, worker_id: str, shard_dir: str, private_keys_path: str, proxies_path: str,
+                 slot: Optional[str] = None, workers: int = 1, lease: float = 60.0):
+        self.worker_id = worker_id
+        self.shard_dir = shard_dir
+        # Каталог слота переживает перезапуск воркера: новый процесс продолжит отслеживание его бриджей
+        self.directory = os.path.join(shard_dir, "workers", slot or worker_id)
+        self.private_keys_path = private_keys_path
+        self.proxies_path = proxies_path
+        self.workers = workers
+        self.queue = WorkQueue(queue_path(shard_dir), lease=lease)
+        self.scheduler: Optional[ProfileScheduler] = None
+        self._profiles: Optional[ShardedProfiles] = None
+        self._listeners: list[ClaimListener] = []
+        self._tasks: set[asyncio.Task] = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def configure(self):
+        """Направляет журнал, кэш адресов и файл незавершённых бриджей в каталог прогона."""
+        from modules.status_tracker import status_tracker
+        from utils.address_cache import address_cache
+
+        journal.path = os.path.join(self.shard_dir, "journal.sqlite3")
+        address_cache.path = os.path.join(self.shard_dir, "addresses.sqlite3")
+        status_tracker.state_path = os.path.join(self.directory, "pending_intents.json")
+
+    def open(self):
+        self.queue.open()
+        self._profiles = ShardedProfiles(self.queue, self.worker_id, self.private_keys_path, self.proxies_path,
+                                         on_claim=self._on_claim)
+        self._heartbeat_task = asyncio.ensure_future(self._heartbeat_loop())
+
+    def add_claim_listener(self, listener: ClaimListener):
+        self._listeners.append(listener)
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any]):
+        """Фоновая задача воркера (например, предзагрузка балансов шарда)."""
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_claim(self, shard: Shard, profiles: list[Profile]):
+        logger.info(f"🧩 {self.worker_id}: шард #{shard.shard_id} ({len(profiles)} профилей)\n")
+        if shard.stolen:
+            # Прежний владелец мог успеть подписать и отправить бриджи: берём их состояние с диска
+            journal.reload([key_fingerprint(profile.private_key) for profile in profiles])
+        for listener in self._listeners:
+            listener(shard, profiles)
+
+    def jobs(self, routes: list[Route]) -> Iterator[RouteJob]:
+        return self._profiles.jobs(lambda profiles: iter_route_jobs(profiles, routes))
+
+    def done(self, job: RouteJob):
+        self._profiles.done(job.profile.line)
+
+    def owns(self, job: RouteJob) -> bool:
+        """Проверка аренды перед отправкой транзакции: без неё кошелёк мог уже перейти к другому воркеру."""
+        try:
+            return self._profiles.owns(job.profile.line)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ {self.worker_id}: не удалось проверить аренду шарда: {e}")
+            return False
+
+    def _beat(self, finished: bool = False):
+        stats = {}
+        if self.scheduler is not None:
+            stats = {"succeeded": self.scheduler.stats.succeeded, "failed": self.scheduler.stats.failed,
+                     "elapsed": self.scheduler.stats.elapsed}
+        owned = self.queue.heartbeat(self.worker_id, stats, metrics.dump(), finished=finished)
+        if not finished:
+            self._profiles.keep(owned)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            try:
+                self._beat()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ {self.worker_id}: не удалось продлить аренду шардов: {e}")
+
+    async def close(self):
+        if self._heartbeat_task is None:
+            return
+        self._heartbeat_task.cancel()
+        self._heartbeat_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        self._beat(finished=True)
+        # Шарды, которые воркер не успел закончить (например, после ошибки), вернутся в очередь
+        self.queue.release(self.worker_id)
+        self.queue.close()
+
+
+def _worker_process(worker_id: str, slot: str, workers: int, log_level: int, options: dict):
+    import main
+
+    formatter = logging.Formatter(f"%(asctime)s - {worker_id} - %(levelname)s - %(message)s")
+    for handler in logger.handlers:
+        handler.setFormatter(formatter)
+    logger.setLevel(log_level)
+    shard_worker = ShardWorker(worker_id, options["shard_dir"], options["private_keys_path"],
+                               options["proxies_path"], slot=slot, workers=workers)
+    options = {key: value for key, value in options.items() if key != "shard_dir"}
+    asyncio.run(main.main(shard_worker=shard_worker, **options))
+
+
+class ShardCoordinator:
+    """Делит профили на шарды и запускает воркеры в отдельных процессах.
+
+    Очередь, журнал и кэш адресов лежат в ``shard_dir``. Чтобы подключить ещё один хост,
+    на нём запускается координатор с ``join=True`` и тем же ``shard_dir`` на общем диске
+    (нужны рабочие блокировки файлов SQLite). Упавший воркер перезапускается, его
+    незавершённые шарды возвращаются в очередь. В конце метрики и статистика всех
+    воркеров сводятся в один отчёт.
+    """
+
+    def __init__(self, workers: int, shard_size: int = 50, shard_dir: str = "data", max_restarts: int = 3,
+                 report_interval: float = 15.0):
+        self.workers = max(1, workers)
+        self.shard_size = max(1, shard_size)
+        self.shard_dir = shard_dir
+        self.max_restarts = max_restarts
+        self.report_interval = report_interval
+        self.queue = WorkQueue(queue_path(shard_dir))
+        self.host = socket.gethostname()
+        self._processes: dict[str, multiprocessing.Process] = {}
+
+    async def _prepare(self, resume: bool, join: bool, private_keys_path: str, proxies_path: str):
+        from utils.address_cache import address_cache
+
+        if join:
+            logger.info(f"🧩 Подключение к прогону в {self.shard_dir}: осталось шардов {self.queue.remaining()}\n")
+            return
+
+        if resume and self.queue.remaining():
+            # Координатор прошлого запуска не завершился: его шарды ничьи
+            self.queue.release()
+            logger.info(f"🧩 Продолжаем шардированный прогон: осталось шардов {self.queue.remaining()}\n")
+        else:
+            shards = self.queue.create(iter_profiles(private_keys_path, proxies_path), self.shard_size)
+            logger.info(f"🧩 Профили разбиты на {shards} шардов по {self.shard_size}\n")
+
+        # Прогон в журнале создаётся здесь, воркеры присоединяются к нему
+        journal.path = os.path.join(self.shard_dir, "journal.sqlite3")
+        journal.open(resume=resume)
+        await journal.close()
+
+        # Адреса выводятся один раз на все ядра, воркеры берут их из общего кэша
+        address_cache.path = os.path.join(self.shard_dir, "addresses.sqlite3")
+        address_cache.open()
+        try:
+            await address_cache.derive(iter_profiles(private_keys_path, proxies_path))
+        finally:
+            address_cache.close()
+
+    def _spawn(self, slot: int, attempt: int, options: dict):
+        context = multiprocessing.get_context("spawn")
+        slot_name = f"{self.host}-w{slot}"
+        worker_id = slot_name if not attempt else f"{slot_name}.{attempt}"
+        process = context.Process(target=_worker_process, name=worker_id,
+                                  args=(worker_id, slot_name, self.workers, logger.getEffectiveLevel(), options))
+        process.start()
+        self._processes[worker_id] = process
+
+    def _collect_metrics(self):
+        """Сводит метрики всех воркеров в общий реестр для экспорта и итогового отчёта."""
+        metrics.reset()
+        for worker in self.queue.workers():
+            if worker["metrics"]:
+                metrics.merge(worker["metrics"])
+
+    async def run(self, options: dict, resume: bool = False, join: bool = False):
+        """Запускает воркеры и ждёт, пока очередь не опустеет. ``options`` — аргументы ``main.main``."""
+        self.queue.open()
+        try:
+            await self._prepare(resume, join, options["private_keys_path"], options["proxies_path"])
+            options = dict(options, shard_dir=self.shard_dir)
+            started = time.perf_counter()
+            for slot in range(self.workers):
+                self._spawn(slot, 0, options)
+            logger.info(f"👷 Запущено воркеров: {self.workers}\n")
+
+            attempts = {slot: 0 for slot in range(self.workers)}
+            last_report = time.monotonic()
+            while self._processes:
+                await asyncio.sleep(0.5)
+                for worker_id, process in list(self._processes.items()):
+                    if process.is_alive():
+                        continue
+                    del self._processes[worker_id]
+                    if process.exitcode == 0:
+                        continue
+                    self.queue.release(worker_id)
+                    slot = int(worker_id.rsplit("-w", 1)[1].split(".")[0])
+                    if self.queue.remaining() and attempts[slot] < self.max_restarts:
+                        attempts[slot] += 1
+                        logger.warning(f"⚠️ Воркер {worker_id} завершился с кодом {process.exitcode}, перезапуск\n")
+                        self._spawn(slot, attempts[slot], options)
+                    else:
+                        logger.error(f"❌ Воркер {worker_id} завершился с кодом {process.exitcode}\n")
+
+                if time.monotonic() - last_report >= self.report_interval:
+                    last_report = time.monotonic()
+                    self._collect_metrics()
+                    done, total = self.queue.progress()
+                    logger.info(f"🧩 Готово шардов: {done}/{total}\n")
+
+            self._collect_metrics()
+            self.log_report(time.perf_counter() - started)
+        finally:
+            for process in self._processes.values():
+                process.terminate()
+            self.queue.close()
+
+    def log_report(self, elapsed: float):
+        workers = self.queue.workers()
+        done, total = self.queue.progress()
+        succeeded = sum(worker["succeeded"] for worker in workers)
+        failed = sum(worker["failed"] for worker in workers)
+        lines = [f"📊 Шардированный прогон: шардов {done}/{total}, профилей {succeeded + failed} "
+                 f"(успешно: {succeeded}, с ошибкой: {failed}) за {elapsed:.1f} сек"]
+        for worker in workers:
+            lines.append(f"    {worker['worker_id']}: шардов {worker['shards']}, профилей "
+                         f"{worker['succeeded'] + worker['failed']} (с ошибкой: {worker['failed']}) "
+                         f"за {worker['elapsed']:.1f} сек" + ("" if worker["finished"] else " — не завершён"))
+        logger.info("\n".join(lines) + "\n")
+        if done < total:
+            logger.warning(f"⚠️ Не обработано шардов: {total - done}, запустите с --resume\n")
+        metrics.log_summary()
+
+
+async def run_sharded(workers: int, shard_size: int = 50, shard_dir: str = "data", resume: bool = False,
+                      join: bool = False, **options):
+    """Шардированный прогон: координатор и ``workers`` процессов-воркеров на этом хосте."""
+    settings = await ConfigValidator(options["settings_path"], options["networks_path"]).validate_config()
+    coordinator = ShardCoordinator(workers, shard_size, shard_dir)
+    await metrics.start(settings["metrics_file"], settings["metrics_port"], host=settings["metrics_host"])
+    try:
+        await coordinator.run(options, resume=resume, join=join)
+    finally:
+        await metrics.close()
@@ -0,0 +1,258 @@
+from typing import Awaitable, Callable, Optional, Union
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from utils.logger import logger
+from utils.metrics import metrics, proxy_label
+from utils.rate_limiter import rate_limiter
+from utils.session_pool import session_pool
+
+# Адрес API можно переопределить переменной окружения (бенчмарк подставляет локальный сервер)
+RELAY_API_URL = os.environ.get("RELAY_API_URL", "https://api.relay.link").rstrip("/")
+RELAY_STATUS_URL = f"{RELAY_API_URL}/intents/status/v2"
+TERMINAL_STATUSES = ("success", "failure", "refund")
+
+
+async def fetch_intent_status(request_id: str, proxy: Optional[str] = None) -> dict:
+    """Один запрос статуса интента Relay. Возвращает пустой словарь при ошибке."""
+    session = await session_pool.get(proxy)
+    with metrics.timer("http_request_seconds", target="relay_status", proxy=proxy_label(proxy)) as timer:
+        # Статус опрашивается повторно и так, поэтому при 429 запрос не повторяется
+        async with rate_limiter.request(session, "GET", RELAY_STATUS_URL, max_attempts=1,
+                                        params={"requestId": request_id},
+                                        proxy=session_pool.proxy_url(proxy)) as response:
+            if response.status != 200:
+                timer.outcome = "error"
+                text = await response.text()
+                logger.error(f"❌ Ошибка запроса: статус {response.status}, ответ: {text}\n")
+                return {}
+            try:
+                return await response.json()
+            except aiohttp.ContentTypeError:
+                timer.outcome = "error"
+                text = await response.text()
+                logger.error(f"❌ Некорректный JSON в ответе: {text}\n")
+                return {}
+
+
+class IntentEvent:
+    def __init__(self, request_id: str, status: str, sent_at: float, finished_at: float, result: dict,
+                 profile_key: Optional[str] = None):
+        self.request_id = request_id
+        self.profile_key = profile_key
+        self.status = status
+        self.sent_at = sent_at
+        self.finished_at = finished_at
+        self.result = result
+
+    @property
+    def latency(self) -> float:
+        """Время от отправки транзакции в сети отправления до исполнения в сети назначения."""
+        return self.finished_at - self.sent_at
+
+
+class _Intent:
+    def __init__(self, request_id: str, proxy: Optional[str], sent_at: float, tx_hash: Optional[str],
+                 delay: float, profile_key: Optional[str] = None, confirmed: bool = True):
+        self.request_id = request_id
+        self.profile_key = profile_key
+        self.proxy = proxy
+        self.sent_at = sent_at
+        self.tx_hash = tx_hash
+        # Транзакция в сети отправления подтверждена; до этого интент только хранится на диске
+        self.confirmed = confirmed
+        self.delay = delay
+        self.next_poll = time.monotonic() + delay
+        self.future: Optional[asyncio.Future] = None
+
+    def to_dict(self) -> dict:
+        return {"request_id": self.request_id, "proxy": self.proxy, "sent_at": self.sent_at, "tx_hash": self.tx_hash,
+                "profile_key": self.profile_key, "confirmed": self.confirmed}
+
+
+Listener = Callable[[IntentEvent], Union[None, Awaitable[None]]]
+
+
+class IntentStatusTracker:
+    """Отслеживает исполнение интентов Relay в сети назначения.
+
+    Все интенты в полёте опрашиваются одним циклом с экспоненциальной задержкой для
+    каждого интента и общими HTTP-сессиями. Незавершённые ``requestId`` сохраняются
+    на диск, поэтому после перезапуска отслеживание продолжается через ``resume``.
+    Интент записывается на диск уже при отправке транзакции (``register``), а опрашивается
+    после её подтверждения в сети отправления (``track``).
+    """
+
+    def __init__(self, state_path: str = "data/pending_intents.json", initial_delay: float = 2,
+                 max_delay: float = 60, timeout: float = 1800, max_parallel: int = 20):
+        self.state_path = state_path
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_parallel = max_parallel
+        self._intents: dict[str, _Intent] = {}
+        self._listeners: list[Listener] = [self._log_event]
+        self._task: Optional[asyncio.Task] = None
+        self.events: list[IntentEvent] = []
+        self.polls = 0
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def register(self, request_id: str, proxy: Optional[str] = None, tx_hash: Optional[str] = None,
+                 sent_at: Optional[float] = None, profile_key: Optional[str] = None):
+        """Сохраняет интент отправленной транзакции на диск, не начиная опрос статуса."""
+        if request_id in self._intents:
+            return
+        self._intents[request_id] = _Intent(request_id, proxy, sent_at or time.time(), tx_hash, self.initial_delay,
+                                            profile_key, confirmed=False)
+        session_pool.acquire(proxy)
+        self._save()
+
+    def track(self, request_id: str, proxy: Optional[str] = None, tx_hash: Optional[str] = None,
+              sent_at: Optional[float] = None, profile_key: Optional[str] = None) -> asyncio.Future:
+        """Ставит интент на отслеживание и возвращает future с итоговым событием.
+
+        Интент, сохранённый через ``register``, отмечается подтверждённым (с итоговым хэшем).
+        """
+        intent = self._intents.get(request_id)
+        if intent is None:
+            intent = _Intent(request_id, proxy, sent_at or time.time(), tx_hash, self.initial_delay, profile_key)
+            self._intents[request_id] = intent
+            session_pool.acquire(proxy)
+            self._save()
+        elif not intent.confirmed:
+            intent.confirmed = True
+            intent.tx_hash = tx_hash or intent.tx_hash
+            intent.next_poll = time.monotonic() + intent.delay
+            self._save()
+        if intent.future is None:
+            intent.future = asyncio.get_running_loop().create_future()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return intent.future
+
+    async def discard(self, request_id: str):
+        """Снимает интент, транзакция которого не исполнилась в сети отправления: бриджа не будет."""
+        intent = self._intents.pop(request_id, None)
+        if intent is None:
+            return
+        self._save()
+        await session_pool.release(intent.proxy)
+        if intent.future is not None and not intent.future.done():
+            intent.future.cancel()
+
+    def resume(self) -> int:
+        """Загружает незавершённые интенты прошлого запуска и продолжает их отслеживание."""
+        if not os.path.exists(self.state_path):
+            return 0
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                saved = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать {self.state_path}: {e}")
+            return 0
+
+        for item in saved:
+            # Неподтверждённый интент начнёт опрашиваться, когда профиль дождётся своей транзакции
+            method = self.track if item.get("confirmed", True) else self.register
+            method(item["request_id"], item.get("proxy"), item.get("tx_hash"), item.get("sent_at"),
+                   item.get("profile_key"))
+        if saved:
+            logger.info(f"🔁 Продолжаем отслеживание {len(saved)} незавершённых бриджей\n")
+        return len(saved)
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._intents)
+
+    @property
+    def _polled(self) -> list[_Intent]:
+        return [intent for intent in self._intents.values() if intent.confirmed]
+
+    async def wait_all(self, timeout: Optional[float] = None):
+        futures = [intent.future for intent in self._polled if intent.future is not None]
+        if futures:
+            logger.info(f"⏳ Ожидание исполнения {len(futures)} бриджей в сети назначения...\n")
+            await asyncio.wait(futures, timeout=timeout)
+
+    def _save(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump([intent.to_dict() for intent in self._intents.values()], file)
+        os.replace(tmp_path, self.state_path)
+
+    async def _emit(self, event: IntentEvent):
+        self.events.append(event)
+        for listener in self._listeners:
+            try:
+                result = listener(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка обработчика события бриджа: {e}")
+
+    @staticmethod
+    def _log_event(event: IntentEvent):
+        if event.status == "success":
+            logger.info(f"✅ Бридж {event.request_id} исполнен в сети назначения за {event.latency:.1f} сек\n")
+        else:
+            logger.error(f"❌ Бридж {event.request_id} завершился со статусом '{event.status}'\n")
+
+    async def _finish(self, intent: _Intent, status: str, result: dict):
+        self._intents.pop(intent.request_id, None)
+        self._save()
+        await session_pool.release(intent.proxy)
+        event = IntentEvent(intent.request_id, status, intent.sent_at, time.time(), result, intent.profile_key)
+        await self._emit(event)
+        if intent.future is not None and not intent.future.done():
+            intent.future.set_result(event)
+
+    async def _poll(self, intent: _Intent, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            self.polls += 1
+            try:
+                result = await fetch_intent_status(intent.request_id, intent.proxy)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка при запросе статуса {intent.request_id}: {e}")
+                result = {}
+
+        status = result.get("status")
+        if status in TERMINAL_STATUSES:
+            await self._finish(intent, status, result)
+        elif time.time() - intent.sent_at > self.timeout:
+            await self._finish(intent, "timeout", result)
+        else:
+            intent.delay = min(self.max_delay, intent.delay * 2)
+            intent.next_poll = time.monotonic() + intent.delay
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        while self._polled:
+            now = time.monotonic()
+            due = [intent for intent in self._polled if intent.next_poll <= now]
+            if due:
+                await asyncio.gather(*(self._poll(intent, semaphore) for intent in due))
+            if self._polled:
+                next_poll = min(intent.next_poll for intent in self._polled)
+                await asyncio.sleep(max(0.1, next_poll - time.monotonic()))
+
+    def log_stats(self):
+        if not self.events:
+            return
+        latencies = sorted(event.latency for event in self.events if event.status == "success")
+        message = f"🏁 Бриджей завершено: {len(self.events)}, успешно: {len(latencies)}, запросов статуса: {self.polls}"
+        if latencies:
+            message += (f", задержка отправка→исполнение: медиана {latencies[len(latencies) // 2]:.1f} сек, "
+                        f"максимум {latencies[-1]:.1f} сек")
+        logger.info(message + "\n")
+
+
+status_tracker = IntentStatusTracker()
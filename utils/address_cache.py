@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import time
+
+from eth_account import Account
+
+from utils.journal import key_fingerprint
+from utils.logger import logger
+
+if TYPE_CHECKING:
+    from utils.profiles import Profile
+
+
+def derive_addresses(private_keys: list[str]) -> list[str]:
+    """Вычисляет адреса по приватным ключам. Выполняется в дочерних процессах."""
+    return [Account.from_key(private_key).address for private_key in private_keys]
+
+
+def _chunks(profiles: Iterable["Profile"], size: int) -> Iterator[list["Profile"]]:
+    chunk = []
+    for profile in profiles:
+        chunk.append(profile)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class AddressCache:
+    """Кэш адресов кошельков в SQLite, ключ — отпечаток приватного ключа.
+
+    Сами ключи на диск не попадают. Адреса недостающих ключей вычисляются пачками в пуле
+    процессов на всех ядрах (вывод публичного ключа secp256k1 упирается в CPU), после чего
+    предзагрузка балансов, журнал и логи берут адрес из кэша без повторного вывода.
+    """
+
+    def __init__(self, path: str = "data/addresses.sqlite3", chunk_size: int = 5000,
+                 workers: Optional[int] = None, min_parallel: int = 200):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel = min_parallel
+        self._conn: Optional[sqlite3.Connection] = None
+        self.cached = 0
+        self.derived = 0
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS addresses (fingerprint TEXT PRIMARY KEY, address TEXT NOT NULL)")
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute("SELECT address FROM addresses WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return row[0] if row else None
+
+    def _lookup(self, fingerprints: list[str]) -> dict[str, str]:
+        found = {}
+        # Ограничение SQLite на число параметров в запросе
+        for start in range(0, len(fingerprints), 900):
+            batch = fingerprints[start:start + 900]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT fingerprint, address FROM addresses WHERE fingerprint IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    async def _derive(self, executor: Optional[ProcessPoolExecutor], private_keys: list[str]) -> list[str]:
+        if executor is None:
+            return derive_addresses(private_keys)
+        loop = asyncio.get_running_loop()
+        step = -(-len(private_keys) // self.workers)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(executor, derive_addresses, private_keys[start:start + step])
+            for start in range(0, len(private_keys), step)
+        ))
+        return [address for part in parts for address in part]
+
+    async def derive(self, profiles: Iterable["Profile"]):
+        """Заполняет кэш адресами всех профилей, вычисляя только отсутствующие."""
+        if self._conn is None:
+            return
+        started = time.perf_counter()
+        executor: Optional[ProcessPoolExecutor] = None
+        try:
+            for chunk in _chunks(profiles, self.chunk_size):
+                fingerprints = [key_fingerprint(profile.private_key) for profile in chunk]
+                found = self._lookup(fingerprints)
+                missing = [(fingerprint, profile.private_key)
+                           for fingerprint, profile in zip(fingerprints, chunk) if fingerprint not in found]
+                self.cached += len(chunk) - len(missing)
+                if not missing:
+                    continue
+
+                if executor is None and self.workers > 1 and len(missing) >= self.min_parallel:
+                    executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+                addresses = await self._derive(executor, [private_key for _, private_key in missing])
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO addresses (fingerprint, address) VALUES (?, ?)",
+                        [(fingerprint, address) for (fingerprint, _), address in zip(missing, addresses)]
+                    )
+                self.derived += len(missing)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        logger.info(f"🔑 Адреса кошельков: из кэша {self.cached}, вычислено {self.derived} "
+                    f"за {time.perf_counter() - started:.2f} сек\n")
+
+    def addresses(self, profiles: Iterable["Profile"]) -> list[str]:
+        """Адреса профилей в порядке файла; отсутствующие в кэше вычисляются на месте."""
+        result = []
+        for chunk in _chunks(profiles, self.chunk_size):
+            fingerprints = [key_fingerprint(profile.private_key) for profile in chunk]
+            found = self._lookup(fingerprints) if self._conn is not None else {}
+            result.extend(found.get(fingerprint) or Account.from_key(profile.private_key).address
+                          for fingerprint, profile in zip(fingerprints, chunk))
+        return result
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+address_cache = AddressCache()
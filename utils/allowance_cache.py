@@ -0,0 +1,139 @@
+from collections import defaultdict
+from typing import TYPE_CHECKING, Iterable, Optional
+import asyncio
+
+from web3 import AsyncWeb3
+
+from client.client import load_abi, make_web3
+from client.networks import Network
+from client.rpc_pool import rpc_endpoints
+from utils.balance_prefetch import MULTICALL3_ABI, MULTICALL3_ADDRESS
+from utils.logger import logger
+
+if TYPE_CHECKING:
+    from client.client import Client
+
+MAX_UINT256 = 2 ** 256 - 1
+
+
+class AllowanceCache:
+    """Таблица allowance кошельков на время прогона: (сеть, токен, владелец, spender) → сумма.
+
+    Allowance адреса запрашивается один раз за прогон. Для адресов, зарегистрированных
+    через ``register`` (при предзагрузке балансов), первое обращение к паре (токен, spender)
+    загружает allowance всех этих адресов через Multicall3 ``aggregate3``, как и балансы;
+    остальные адреса запрашиваются профилем через его прокси. После approve и бриджа
+    запись обновляется локально, без повторных запросов.
+    """
+
+    def __init__(self, chunk_size: int = 500):
+        self.chunk_size = chunk_size
+        self._values: dict[tuple[int, str, str, str], int] = {}
+        self._networks: dict[int, dict] = {}
+        self._addresses: dict[int, set[str]] = defaultdict(set)
+        # Адреса, allowance которых уже запрошен пачкой, по (сеть, токен, spender)
+        self._loaded: dict[tuple[int, str, str], set[str]] = defaultdict(set)
+        self._loading: dict[tuple[int, str, str], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.multicalls = 0
+        self.approvals = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _key(chain_id: int, token_address: str, owner: str, spender: str) -> tuple[int, str, str, str]:
+        return chain_id, token_address.lower(), owner.lower(), spender.lower()
+
+    def register(self, network: dict, addresses: Iterable[str]):
+        """Адреса сети, allowance которых можно загружать пачкой через Multicall3."""
+        self._networks[network["chain_id"]] = network
+        self._addresses[network["chain_id"]].update(AsyncWeb3.to_checksum_address(address) for address in addresses)
+
+    async def get(self, client: "Client", token_address: str, spender: str) -> Optional[int]:
+        """Allowance кошелька клиента; ``None``, если его не удалось получить (в таблицу не попадает)."""
+        key = self._key(client.chain_id, token_address, client.address, spender)
+        if key not in self._values and client.address in self._addresses.get(client.chain_id, ()):
+            await self._load(client.chain_id, token_address, spender)
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        self.misses += 1
+        allowance = await client.get_allowance(token_address, client.address, spender)
+        if allowance is not None:
+            # Ошибку запроса не запоминаем: иначе до конца прогона allowance считался бы нулевым
+            self._values[key] = allowance
+        return allowance
+
+    async def _load(self, chain_id: int, token_address: str, spender: str):
+        group = (chain_id, token_address.lower(), spender.lower())
+        task = self._loading.get(group)
+        if task is None:
+            addresses = sorted(self._addresses[chain_id] - self._loaded[group])
+            if not addresses:
+                return
+            self._loaded[group].update(addresses)
+            task = self._loading[group] = asyncio.ensure_future(
+                self._fetch(self._networks[chain_id], token_address, spender, addresses))
+            task.add_done_callback(lambda _: self._loading.pop(group, None))
+        # Загрузку ждут несколько профилей: отмена одного из них не должна её прерывать
+        await asyncio.shield(task)
+
+    async def _fetch(self, network: dict, token_address: str, spender: str, addresses: list[str]):
+        w3 = make_web3(network["rpc_url"], Network.from_chain_id(network["chain_id"]),
+                       rpc_urls=rpc_endpoints(network), ws_url=network.get("ws_url"))
+        multicall_address = AsyncWeb3.to_checksum_address(network.get("multicall_address", MULTICALL3_ADDRESS))
+        multicall = w3.eth.contract(address=multicall_address, abi=MULTICALL3_ABI)
+        token_address = AsyncWeb3.to_checksum_address(token_address)
+        token = w3.eth.contract(address=token_address, abi=load_abi("erc20_abi"))
+        spender = AsyncWeb3.to_checksum_address(spender)
+
+        async def fetch_chunk(chunk: list[str]) -> list:
+            calls = [(token_address, True, token.encodeABI(fn_name="allowance", args=[address, spender]))
+                     for address in chunk]
+            return await multicall.functions.aggregate3(calls).call()
+
+        chunks = [addresses[i:i + self.chunk_size] for i in range(0, len(addresses), self.chunk_size)]
+        self.multicalls += len(chunks)
+        results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        loaded = 0
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Не удалось получить allowance через Multicall3 ({len(chunk)} адресов): {result}\n")
+                continue
+            for address, (success, data) in zip(chunk, result):
+                if success:
+                    key = self._key(network["chain_id"], token_address, address, spender)
+                    self._values[key] = w3.codec.decode(["uint256"], data)[0]
+                    loaded += 1
+        logger.info(f"🔓 Загружены allowance {loaded}/{len(addresses)} адресов за {len(chunks)} eth_call\n")
+
+    def record_approval(self, client: "Client", token_address: str, spender: str, amount: int):
+        """Approve отправлен: следующая транзакция кошелька уже может на него рассчитывать."""
+        self.approvals += 1
+        self._values[self._key(client.chain_id, token_address, client.address, spender)] = amount
+
+    def record_skip(self):
+        self.skipped += 1
+
+    def record_spent(self, client: "Client", token_address: str, spender: str, amount: int):
+        """Бридж подтверждён: ``transferFrom`` уменьшил allowance (кроме бесконечного)."""
+        key = self._key(client.chain_id, token_address, client.address, spender)
+        if key in self._values and self._values[key] != MAX_UINT256:
+            self._values[key] = max(0, self._values[key] - amount)
+
+    def forget(self, client: "Client", token_address: str, spender: str):
+        """Значение больше не соответствует сети (например, approve не прошёл) — запросить заново."""
+        self._values.pop(self._key(client.chain_id, token_address, client.address, spender), None)
+
+    def log_stats(self):
+        if not self.hits + self.misses:
+            return
+        logger.info(
+            f"🔓 Allowance: проверок {self.hits + self.misses} (из таблицы {self.hits}, запросом профиля "
+            f"{self.misses}, Multicall3-запросов {self.multicalls}), approve отправлено {self.approvals}, "
+            f"пропущено {self.skipped}\n"
+        )
+
+
+allowance_cache = AllowanceCache()
@@ -1,33 +1,45 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+import asyncio
 
-from client.client import Client
-from utils.logger import logger
+if TYPE_CHECKING:
+    from client.client import Client
+    from utils.balance_prefetch import BalanceSnapshot
 
 
-async def check_balance(client: Client, settings: dict, from_network: Optional[dict] = None,
-                        fee: Optional[int] = None) -> float:
-    # Проверка баланса
-    native_balance = await client.get_native_balance()
-    gas = await client.get_tx_fee()
+async def _native_balance(client: "Client", snapshot: Optional["BalanceSnapshot"]) -> int:
+    if snapshot is not None and snapshot.chain_id == client.chain_id:
+        balance = snapshot.get_native(client.address)
+        if balance is not None:
+            return balance
+    return await client.get_native_balance()
 
+
+async def _erc20_balance(client: "Client", token_address: str, snapshot: Optional["BalanceSnapshot"]) -> int:
+    if snapshot is not None and snapshot.chain_id == client.chain_id:
+        balance = snapshot.get_erc20(token_address, client.address)
+        if balance is not None:
+            return balance
+    return await client.get_erc20_balance(token_address)
+
+
+async def check_balance(client: "Client", settings: dict, from_network: Optional[dict] = None,
+                        fee: Optional[int] = None, snapshot: Optional["BalanceSnapshot"] = None) -> int:
+    """Баланс бриджуемого актива кошелька: USDC для токена, иначе нативный.
+
+    Баланс берётся из предзагруженного снимка, иначе через RPC; баланс и комиссия запрашиваются
+    одновременно и уходят в RPC одним batch-запросом. С суммой бриджа баланс здесь не
+    сравнивается: сумма известна только после ``Client.set_amount``. Если нативной монеты не
+    хватает на газ бриджа USDC, бросает ``ValueError`` — завершается только этот профиль.
+    """
     if settings["token"] == "USDC":
-        balance = await client.get_erc20_balance(from_network["usdc_address"])
-        if client.amount > balance:
-            logger.error(f"Недостаточно баланса {settings['token']}! Требуется: "
-                         f"{await client.from_wei_main(client.amount):.8f} "
-                         f"фактический баланс: "
-                         f"{await client.from_wei_main(balance, from_network['usdc_address']):.8f}\n")
-            exit(1)
-        if gas + fee > native_balance:
-            logger.error(f"Недостаточно баланса для оплаты газа! Требуется: "
-                         f"{await client.from_wei_main(gas):.8f} "
-                         f"фактический баланс: {await client.from_wei_main(native_balance):.8f}\n")
-            exit(1)
-    elif settings["token"] == "ETH":
-        total_cost = client.amount + gas
-        if total_cost > native_balance:
-            logger.error(f"Недостаточно баланса! Требуется: {await client.from_wei_main(total_cost):.8f}"
-                         f" фактический баланс: {await client.from_wei_main(native_balance):.8f}\n")
-            exit(1)
-
-    return native_balance
+        native_balance, gas, balance = await asyncio.gather(
+            _native_balance(client, snapshot), client.get_tx_fee(),
+            _erc20_balance(client, from_network["usdc_address"], snapshot)
+        )
+        if gas + (fee or 0) > native_balance:
+            raise ValueError(f"Недостаточно баланса для оплаты газа! Требуется: "
+                             f"{await client.from_wei_main(gas + (fee or 0)):.8f} "
+                             f"фактический баланс: {await client.from_wei_main(native_balance):.8f}")
+        return balance
+
+    return await _native_balance(client, snapshot)
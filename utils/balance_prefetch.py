@@ -0,0 +1,156 @@
+from typing import Optional
+import asyncio
+import time
+
+from web3 import AsyncWeb3
+
+from client.client import load_abi, make_web3
+from client.rpc_pool import rpc_endpoints
+from client.networks import Network
+from utils.logger import logger
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "addr", "type": "address"}],
+        "name": "getEthBalance",
+        "outputs": [{"internalType": "uint256", "name": "balance", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    }
+]
+
+
+class BalanceSnapshot:
+    """Снимок балансов всех кошельков прогона, полученный до запуска профилей.
+
+    Баланс старше ``ttl`` секунд (0 — без ограничения) не отдаётся: профиль, до которого
+    очередь дошла не сразу, читает баланс из сети.
+    """
+
+    def __init__(self, chain_id: int, token_address: Optional[str] = None, ttl: float = 0):
+        self.chain_id = chain_id
+        self.token_address = token_address
+        self.ttl = ttl
+        self.native: dict[str, int] = {}
+        self.erc20: dict[str, int] = {}
+        self.fetched_at: dict[str, float] = {}
+
+    def _fresh(self, address: str) -> bool:
+        return not self.ttl or time.monotonic() - self.fetched_at.get(address, 0.0) <= self.ttl
+
+    def get_native(self, address: str) -> Optional[int]:
+        address = AsyncWeb3.to_checksum_address(address)
+        return self.native.get(address) if self._fresh(address) else None
+
+    def get_erc20(self, token_address: str, address: str) -> Optional[int]:
+        if not self.token_address or token_address.lower() != self.token_address.lower():
+            return None
+        address = AsyncWeb3.to_checksum_address(address)
+        return self.erc20.get(address) if self._fresh(address) else None
+
+    def forget(self, address: str):
+        """Убирает адрес из снимка, например после того как его баланс изменился."""
+        address = AsyncWeb3.to_checksum_address(address)
+        self.native.pop(address, None)
+        self.erc20.pop(address, None)
+        self.fetched_at.pop(address, None)
+
+    def __len__(self) -> int:
+        return len(self.native)
+
+
+async def _fetch_chunk(w3: AsyncWeb3, multicall_address: str, addresses: list[str],
+                       token_address: Optional[str]) -> tuple[dict[str, int], dict[str, int]]:
+    multicall = w3.eth.contract(address=multicall_address, abi=MULTICALL3_ABI)
+    token = w3.eth.contract(address=token_address, abi=load_abi("erc20_abi")) if token_address else None
+
+    calls = []
+    for address in addresses:
+        calls.append((multicall_address, True, multicall.encodeABI(fn_name="getEthBalance", args=[address])))
+        if token:
+            calls.append((token_address, True, token.encodeABI(fn_name="balanceOf", args=[address])))
+
+    results = await multicall.functions.aggregate3(calls).call()
+
+    step = 2 if token else 1
+    native, erc20 = {}, {}
+    for index, address in enumerate(addresses):
+        success, data = results[index * step]
+        if success:
+            native[address] = w3.codec.decode(["uint256"], data)[0]
+        if token:
+            success, data = results[index * step + 1]
+            if success:
+                erc20[address] = w3.codec.decode(["uint256"], data)[0]
+    return native, erc20
+
+
+async def prefetch_balances(network: dict, addresses: list[str], token_address: Optional[str] = None,
+                            chunk_size: int = 500, snapshot: Optional[BalanceSnapshot] = None,
+                            ttl: float = 0) -> BalanceSnapshot:
+    """Получает нативные и ERC20 балансы всех адресов чанками через Multicall3 ``aggregate3``.
+
+    Адрес Multicall3 можно переопределить ключом ``multicall_address`` в networks_data.json.
+    Если вызов чанка не удался, балансы его адресов в снимок не попадают и профили
+    запросят их через RPC как раньше. Если передан ``snapshot``, балансы добавляются в него,
+    иначе создаётся новый снимок со сроком годности ``ttl`` секунд.
+    """
+    w3 = make_web3(network["rpc_url"], Network.from_chain_id(network["chain_id"]), rpc_urls=rpc_endpoints(network),
+                   ws_url=network.get("ws_url"))
+    multicall_address = AsyncWeb3.to_checksum_address(network.get("multicall_address", MULTICALL3_ADDRESS))
+    if token_address:
+        token_address = AsyncWeb3.to_checksum_address(token_address)
+    addresses = [AsyncWeb3.to_checksum_address(address) for address in addresses]
+
+    if snapshot is None:
+        snapshot = BalanceSnapshot(network["chain_id"], token_address, ttl)
+    chunks = [addresses[i:i + chunk_size] for i in range(0, len(addresses), chunk_size)]
+    results = await asyncio.gather(
+        *(_fetch_chunk(w3, multicall_address, chunk, token_address) for chunk in chunks),
+        return_exceptions=True
+    )
+
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.warning(f"⚠️ Не удалось получить балансы через Multicall3 ({len(chunk)} адресов): {result}\n")
+            continue
+        native, erc20 = result
+        fetched_at = time.monotonic()
+        snapshot.native.update(native)
+        snapshot.erc20.update(erc20)
+        snapshot.fetched_at.update(dict.fromkeys(native, fetched_at))
+
+    logger.info(f"💰 Предзагружены балансы {sum(address in snapshot.native for address in addresses)}/"
+                f"{len(addresses)} адресов "
+                f"за {len(chunks)} eth_call\n")
+    return snapshot
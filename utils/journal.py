@@ -0,0 +1,199 @@
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.logger import logger
+
+COMPLETED_STATES = ("confirmed", "filled", "skipped")
+# fill_timeout: отслеживание интента прервано по таймауту, при --resume оно начинается заново
+IN_FLIGHT_STATES = ("signed", "sent", "fill_timeout")
+PROFILE_COLUMNS = "profile_key, address, state, tx_hash, request_id, sent_at, raw_tx"
+
+
+def fill_state(status: str) -> str:
+    """Состояние профиля по итоговому статусу интента Relay.
+
+    Только ``success`` завершает профиль. После ``failure`` и ``refund`` средства не дошли
+    до сети назначения, и --resume повторит бридж (``fill_failed``).
+    """
+    if status == "success":
+        return "filled"
+    if status == "timeout":
+        return "fill_timeout"
+    return "fill_failed"
+
+
+def key_fingerprint(private_key: str) -> str:
+    """Отпечаток приватного ключа для хранения на диске вместо самого ключа."""
+    normalized = private_key.lower().removeprefix("0x")
+    return hashlib.sha256(f"relay-bridge:{normalized}".encode()).hexdigest()
+
+
+class RunJournal:
+    """Журнал прогона в SQLite (режим WAL).
+
+    Для каждого профиля хранится последний переход состояния (balance_checked, quoted,
+    signed, sent, confirmed, filled, fill_failed, fill_timeout, skipped, failed) вместе с хэшем транзакции и
+    ``requestId``. Записи копятся в памяти и сбрасываются пачками; состояние ``signed``
+    сбрасывается сразу вместе с подписанной транзакцией (``raw_tx``), чтобы после падения
+    не отправить бридж повторно, а отправить ту же транзакцию ещё раз.
+    """
+
+    def __init__(self, path: str = "data/journal.sqlite3", flush_interval: float = 1.0, batch_size: int = 200):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.run_id: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queue: list[tuple] = []
+        self._states: dict[str, dict] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def open(self, resume: bool = False):
+        """Открывает журнал. При ``resume`` продолжает последний прогон, иначе начинает новый."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # В шардированном прогоне в журнал пишут несколько процессов: ждём чужую запись, а не падаем
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS profiles (
+                run_id INTEGER NOT NULL,
+                profile_key TEXT NOT NULL,
+                address TEXT,
+                state TEXT NOT NULL,
+                tx_hash TEXT,
+                request_id TEXT,
+                sent_at REAL,
+                raw_tx TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, profile_key)
+            );
+            CREATE TABLE IF NOT EXISTS transitions (
+                run_id INTEGER NOT NULL,
+                profile_key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                data TEXT,
+                ts REAL NOT NULL
+            );
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(profiles)")}
+        if "raw_tx" not in columns:
+            # Журнал прошлой версии: подписанная транзакция в нём не хранилась
+            self._conn.execute("ALTER TABLE profiles ADD COLUMN raw_tx TEXT")
+
+        row = self._conn.execute("SELECT MAX(run_id) FROM runs").fetchone() if resume else None
+        if row and row[0] is not None:
+            self.run_id = row[0]
+            for key, address, state, tx_hash, request_id, sent_at, raw_tx in self._conn.execute(
+                    f"SELECT {PROFILE_COLUMNS} FROM profiles WHERE run_id = ?", (self.run_id,)):
+                self._states[key] = {"address": address, "state": state, "tx_hash": tx_hash,
+                                     "request_id": request_id, "sent_at": sent_at, "raw_tx": raw_tx}
+            logger.info(f"📒 Продолжаем прогон #{self.run_id}: в журнале {len(self._states)} профилей\n")
+        else:
+            self.run_id = self._conn.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),)).lastrowid
+            self._conn.commit()
+        self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    def reload(self, wallet_keys: list[str]):
+        """Перечитывает с диска состояния профилей кошельков ``wallet_keys``.
+
+        Нужно, когда журнал ведут несколько процессов и шард кошельков перешёл к этому
+        процессу от другого: ключ профиля на маршруте начинается с отпечатка кошелька.
+        """
+        if not self.enabled or not wallet_keys:
+            return
+        for start in range(0, len(wallet_keys), 900):
+            batch = wallet_keys[start:start + 900]
+            placeholders = ",".join("?" * len(batch))
+            for key, address, state, tx_hash, request_id, sent_at, raw_tx in self._conn.execute(
+                    f"""SELECT {PROFILE_COLUMNS} FROM profiles
+                        WHERE run_id = ? AND substr(profile_key, 1, 64) IN ({placeholders})""",
+                    (self.run_id, *batch)):
+                self._states[key] = {"address": address, "state": state, "tx_hash": tx_hash,
+                                     "request_id": request_id, "sent_at": sent_at, "raw_tx": raw_tx}
+
+    def get(self, profile_key: str) -> Optional[dict]:
+        return self._states.get(profile_key)
+
+    def record(self, profile_key: Optional[str], state: str, durable: bool = False, **fields):
+        """Записывает переход состояния профиля. ``durable`` сбрасывает очередь на диск сразу."""
+        if not self.enabled or not profile_key:
+            return
+        current = self._states.setdefault(profile_key, {})
+        current.update({name: value for name, value in fields.items() if value is not None})
+        current["state"] = state
+        now = time.time()
+        self._queue.append((profile_key, state, dict(current), json.dumps(fields, default=str), now))
+
+        if durable or len(self._queue) >= self.batch_size:
+            self._write(self._drain())
+
+    def _drain(self) -> list[tuple]:
+        queue, self._queue = self._queue, []
+        return queue
+
+    def _write(self, queue: list[tuple]):
+        if not queue or self._conn is None:
+            return
+        with self._write_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO transitions (run_id, profile_key, state, data, ts) VALUES (?, ?, ?, ?, ?)",
+                [(self.run_id, key, state, data, ts) for key, state, _, data, ts in queue]
+            )
+            self._conn.executemany(
+                """INSERT INTO profiles (run_id, profile_key, address, state, tx_hash, request_id, sent_at, raw_tx,
+                                         updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (run_id, profile_key) DO UPDATE SET
+                       address = excluded.address, state = excluded.state, tx_hash = excluded.tx_hash,
+                       request_id = excluded.request_id, sent_at = excluded.sent_at, raw_tx = excluded.raw_tx,
+                       updated_at = excluded.updated_at
+                   WHERE excluded.updated_at >= profiles.updated_at""",
+                [(self.run_id, key, snapshot.get("address"), state, snapshot.get("tx_hash"),
+                  snapshot.get("request_id"), snapshot.get("sent_at"), snapshot.get("raw_tx"), ts)
+                 for key, state, snapshot, _, ts in queue]
+            )
+
+    async def flush(self):
+        async with self._flush_lock:
+            queue = self._drain()
+            if queue:
+                await asyncio.to_thread(self._write, queue)
+
+    async def _flush_loop(self):
+        while self.enabled:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Ошибка записи журнала: {e}")
+
+    async def close(self):
+        if not self.enabled:
+            return
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+        self._conn.close()
+        self._conn = None
+
+
+journal = RunJournal()
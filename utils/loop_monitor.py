@@ -0,0 +1,54 @@
+from typing import Optional
+import asyncio
+import time
+
+from utils.logger import logger
+
+
+class LoopMonitor:
+    """Измеряет задержки event loop.
+
+    Фоновая задача засыпает на ``interval`` и замеряет, насколько позже она проснулась.
+    Всё, что дольше ``threshold``, считается простоем цикла: в это время ни один другой
+    запрос не обрабатывался (например, синхронная подпись транзакции).
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.01):
+        self.interval = interval
+        self.threshold = threshold
+        self._task: Optional[asyncio.Task] = None
+        self.samples = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.max_stall = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.samples += 1
+            if lag > self.threshold:
+                self.stalls += 1
+                self.stall_time += lag
+                self.max_stall = max(self.max_stall, lag)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def log_stats(self):
+        if not self.samples:
+            return
+        logger.info(
+            f"🐢 Event loop: задержек дольше {self.threshold * 1000:.0f} мс — {self.stalls}, "
+            f"суммарно {self.stall_time:.2f} сек, максимум {self.max_stall * 1000:.1f} мс\n"
+        )
+
+
+loop_monitor = LoopMonitor()
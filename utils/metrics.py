@@ -0,0 +1,298 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Optional
+import asyncio
+import math
+import os
+import time
+
+from utils.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def proxy_label(proxy: Optional[str]) -> str:
+    """Метка прокси без логина и пароля."""
+    if not proxy:
+        return "direct"
+    return proxy.split("://")[-1].split("@")[-1]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам с линейной интерполяцией, как ``histogram_quantile``."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = min(self.buckets[index], self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class Timer:
+    __slots__ = ("outcome", "started")
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.started = time.perf_counter()
+
+
+class MetricsRegistry:
+    """Счётчики и гистограммы задержек с метками (сеть, фаза, исход и т.п.).
+
+    Экспортируются в текстовом формате Prometheus — в файл (для textfile-коллектора
+    node_exporter) и/или по HTTP на ``/metrics``. В конце прогона ``log_summary`` выводит
+    таблицу по фазам, самые медленные прокси и RPC-методы.
+    """
+
+    def __init__(self, prefix: str = "relay_bridge"):
+        self.prefix = prefix
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._help: dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._runner = None
+        self.path: Optional[str] = None
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = self._labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self._histograms.setdefault(name, {})
+        key = self._labels(labels)
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Замеряет блок кода. Исход ``error`` при исключении, либо задаётся через ``timer.outcome``."""
+        timer = Timer()
+        try:
+            yield timer
+        except asyncio.CancelledError:
+            timer.outcome = "cancelled"
+            raise
+        except Exception:
+            timer.outcome = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - timer.started, outcome=timer.outcome, **labels)
+
+    def phase(self, phase: str, chain: int | str, **labels):
+        return self.timer("phase_seconds", phase=phase, chain=chain, **labels)
+
+    def dump(self) -> dict:
+        """Снимок всех серий в JSON-совместимом виде (для сведения метрик нескольких процессов)."""
+        return {
+            "counters": {name: [[list(map(list, labels)), value] for labels, value in series.items()]
+                         for name, series in self._counters.items()},
+            "histograms": {name: [[list(map(list, labels)), histogram.counts, histogram.count, histogram.sum,
+                                   histogram.max] for labels, histogram in series.items()]
+                           for name, series in self._histograms.items()}
+        }
+
+    def merge(self, dump: dict):
+        """Добавляет снимок ``dump`` к текущим сериям: счётчики и корзины гистограмм суммируются."""
+        for name, rows in dump.get("counters", {}).items():
+            series = self._counters.setdefault(name, {})
+            for labels, value in rows:
+                key = tuple(map(tuple, labels))
+                series[key] = series.get(key, 0) + value
+        for name, rows in dump.get("histograms", {}).items():
+            series = self._histograms.setdefault(name, {})
+            for labels, counts, count, total, maximum in rows:
+                key = tuple(map(tuple, labels))
+                histogram = series.setdefault(key, Histogram())
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.sum += total
+                histogram.max = max(histogram.max, maximum)
+
+    def reset(self):
+        self._counters.clear()
+        self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+        items = labels + extra
+        if not items:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in items)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            full_name = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in series.items():
+                lines.append(f"{full_name}{self._format_labels(labels)} {value:g}")
+
+        for name, series in sorted(self._histograms.items()):
+            full_name = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{full_name}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(self.render())
+        os.replace(tmp_path, path)
+
+    async def _write_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write_textfile(self.path)
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось записать метрики в {self.path}: {e}")
+
+    async def start(self, path: Optional[str] = None, port: int = 0, interval: float = 15, host: str = "127.0.0.1"):
+        """Запускает экспорт: периодическая запись в файл и/или HTTP-эндпоинт ``/metrics``.
+
+        Эндпоинт слушает только ``host`` (по умолчанию локальный): в метках видны прокси и сети.
+        """
+        self.path = path or None
+        if self.path:
+            self._task = asyncio.ensure_future(self._write_loop(interval))
+        if port:
+            from aiohttp import web
+
+            async def handle(_: web.Request) -> web.Response:
+                return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+            app = web.Application()
+            app.router.add_get("/metrics", handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host, port).start()
+            logger.info(f"📡 Метрики доступны на http://{host}:{port}/metrics\n")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.path:
+            self.write_textfile(self.path)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _rows(self, name: str, group_by: tuple[str, ...]) -> dict[tuple, tuple[Histogram, int]]:
+        """Сводит серии гистограммы по меткам ``group_by``: общая гистограмма и число ошибок."""
+        rows: dict[tuple, tuple[Histogram, int]] = {}
+        for labels, histogram in self._histograms.get(name, {}).items():
+            values = dict(labels)
+            key = tuple(values.get(label, "") for label in group_by)
+            merged, errors = rows.get(key) or (Histogram(histogram.buckets), 0)
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+            merged.max = max(merged.max, histogram.max)
+            if values.get("outcome", "ok") != "ok":
+                errors += histogram.count
+            rows[key] = (merged, errors)
+        return rows
+
+    @staticmethod
+    def _row(title: str, histogram: Histogram, errors: int) -> str:
+        return (f"    {title:<34}{histogram.count:>8}{errors:>8}{histogram.quantile(0.5):>10.3f}"
+                f"{histogram.quantile(0.95):>10.3f}{histogram.max:>10.3f}")
+
+    def log_summary(self, top: int = 5):
+        phases = self._rows("phase_seconds", ("chain", "phase"))
+        if not phases:
+            return
+        header = f"    {'':<34}{'всего':>8}{'ошибок':>8}{'p50, с':>10}{'p95, с':>10}{'макс, с':>10}"
+        lines = ["📈 Задержки по фазам (сеть · фаза):", header]
+        for (chain, phase), (histogram, errors) in sorted(phases.items()):
+            lines.append(self._row(f"{chain} · {phase}", histogram, errors))
+
+        methods = self._rows("rpc_request_seconds", ("chain", "method"))
+        if methods:
+            lines.append("  Самые долгие RPC-методы (по суммарному времени):")
+            for (chain, method), (histogram, errors) in sorted(
+                    methods.items(), key=lambda item: item[1][0].sum, reverse=True)[:top]:
+                lines.append(self._row(f"{chain} · {method}", histogram, errors))
+
+        proxies = self._rows("http_request_seconds", ("proxy",))
+        if len(proxies) > 1:
+            lines.append("  Самые медленные прокси (по p95):")
+            for (proxy,), (histogram, errors) in sorted(
+                    proxies.items(), key=lambda item: item[1][0].quantile(0.95), reverse=True)[:top]:
+                lines.append(self._row(proxy, histogram, errors))
+
+        counters = {name: sum(series.values()) for name, series in self._counters.items()}
+        if counters:
+            lines.append("  Счётчики: " + ", ".join(f"{name} {value:g}" for name, value in sorted(counters.items())))
+        logger.info("\n".join(lines) + "\n")
+
+
+metrics = MetricsRegistry()
+metrics.describe("phase_seconds", "Длительность фаз профиля")
+metrics.describe("rpc_request_seconds", "Задержка JSON-RPC вызова от постановки в очередь до ответа")
+metrics.describe("http_request_seconds", "Задержка HTTP-запроса к RPC или API Relay")
+metrics.describe("rpc_calls_total", "Число JSON-RPC вызовов")
+metrics.describe("rpc_retries_total", "Повторные отправки JSON-RPC вызовов")
+metrics.describe("proxy_errors_total", "Ошибки соединения через прокси")
+metrics.describe("profiles_total", "Обработанные профили по исходу")
+metrics.describe("proxy_circuit_open_total", "Срабатывания выключателя прокси")
+metrics.describe("rpc_endpoint_failures_total", "Отказы RPC-эндпоинтов (ошибки, таймауты, лимиты)")
+metrics.describe("rpc_failovers_total", "Переходы на запасной RPC-эндпоинт")
+metrics.describe("rpc_hedged_total", "Чтения, продублированные на второй RPC-эндпоинт")
+metrics.describe("rpc_hedge_wins_total", "Продублированные чтения, где второй эндпоинт ответил первым")
+metrics.describe("rpc_broadcasts_total", "Транзакции, разосланные на несколько RPC-эндпоинтов")
+metrics.describe("rate_limit_wait_seconds", "Ожидание в очереди ограничителя частоты запросов")
+metrics.describe("rate_limited_total", "Ответы 429 и ошибки лимита запросов по хостам")
+metrics.describe("rate_limit_retries_total", "Повторы запросов после ответа 429")
+metrics.describe("tx_replacements_total", "Зависшие транзакции, заменённые тем же nonce с повышенной комиссией")
+metrics.describe("ws_reconnects_total", "Переподключения WebSocket сети")
+metrics.describe("ws_fallbacks_total", "Вызовы, отправленные по HTTP из-за недоступности WebSocket")
+metrics.describe("preflight_total", "Пробные прогоны транзакций бриджа по исходу")
+metrics.describe("preflight_requotes_total", "Квоты, перезапрошенные после неудачного пробного прогона")
+metrics.describe("preflight_saved_gas_total", "Лимит газа транзакций, не отправленных после пробного прогона")
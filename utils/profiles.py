@@ -0,0 +1,58 @@
+from itertools import zip_longest
+from typing import Iterator, Optional
+import re
+
+PRIVATE_KEY_PATTERN = re.compile(r"^(0x)?[0-9a-fA-F]{64}$")
+
+
+class Profile:
+    """Профиль кошелька: приватный ключ и прокси из одной строки файлов конфигурации.
+
+    ``__slots__`` убирает ``__dict__`` у каждого экземпляра — при сотнях тысяч строк
+    это заметно меньше памяти, чем словарь на профиль.
+    """
+
+    __slots__ = ("line", "private_key", "proxy")
+
+    def __init__(self, line: int, private_key: str, proxy: Optional[str]):
+        self.line = line
+        self.private_key = private_key
+        self.proxy = proxy
+
+    def __repr__(self) -> str:
+        # Приватный ключ не должен попадать в логи и трейсбеки
+        return f"Profile(line={self.line}, proxy={self.proxy!r})"
+
+
+def _non_empty_lines(path: str) -> Iterator[tuple[int, str]]:
+    with open(path, "r", encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            line = line.strip()
+            if line:
+                yield line_no, line
+
+
+def iter_profiles(private_keys_path: str, proxies_path: str) -> Iterator[Profile]:
+    """Лениво читает оба файла построчно и выдаёт профили по одному.
+
+    Пустые строки пропускаются, пары составляются по порядку непустых строк. При ошибке
+    в сообщении указывается файл и номер строки.
+    """
+    pairs = zip_longest(_non_empty_lines(private_keys_path), _non_empty_lines(proxies_path))
+    for key_line, proxy_line in pairs:
+        if key_line is None:
+            raise ValueError(f"Количество приватных ключей и прокси не совпадает! "
+                             f"Прокси {proxies_path}:{proxy_line[0]} без приватного ключа")
+        if proxy_line is None:
+            raise ValueError(f"Количество приватных ключей и прокси не совпадает! "
+                             f"Ключ {private_keys_path}:{key_line[0]} без прокси")
+
+        line_no, private_key = key_line
+        if not PRIVATE_KEY_PATTERN.match(private_key):
+            raise ValueError(f"Некорректный приватный ключ в {private_keys_path}:{line_no}")
+        yield Profile(line_no, private_key, proxy_line[1])
+
+
+def count_profiles(private_keys_path: str, proxies_path: str) -> int:
+    """Проверяет оба файла целиком, не держа их в памяти, и возвращает число профилей."""
+    return sum(1 for _ in iter_profiles(private_keys_path, proxies_path))
@@ -0,0 +1,234 @@
+from typing import Iterable, Optional
+import asyncio
+import time
+
+import aiohttp
+
+from utils.logger import logger
+from utils.metrics import metrics, proxy_label
+from utils.session_pool import session_pool
+
+PROXY_POLICIES = ("strict", "fastest")
+
+# Ошибки, которые считаются отказом прокси (а не целевого сервиса)
+PROXY_FAILURES = (
+    aiohttp.ClientProxyConnectionError,
+    aiohttp.ClientHttpProxyError,
+    aiohttp.ServerDisconnectedError,
+    aiohttp.ClientOSError,
+    asyncio.TimeoutError,
+)
+
+
+class ProxyHealth:
+    __slots__ = ("proxy", "latency", "error_rate", "samples", "failures", "state", "opened_at", "cooldown",
+                 "in_use")
+
+    def __init__(self, proxy: str, cooldown: float):
+        self.proxy = proxy
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.in_use = 0
+
+    def score(self, default_latency: float) -> float:
+        """Чем меньше, тем лучше: задержка с поправкой на долю ошибок и текущую нагрузку."""
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + 4 * self.error_rate) * (1 + self.in_use)
+
+
+class ProxyManager:
+    """Пул прокси с оценкой здоровья и автоматическим выключателем (circuit breaker).
+
+    Задержка и доля ошибок каждого прокси обновляются по всем HTTP-запросам через
+    ``session_pool``. После ``failure_threshold`` отказов подряд (или при высокой доле
+    ошибок) прокси выключается на ``cooldown`` секунд, затем пробуется снова; каждое
+    повторное выключение удваивает паузу. Фоновые пробы проверяют выключенные прокси.
+
+    Политика ``strict`` сохраняет привязку кошелёк↔прокси: профиль с мёртвым прокси
+    быстро завершается ошибкой, а не ждёт таймаута. Политика ``fastest`` выдаёт профилю
+    самый быстрый здоровый прокси из всего списка.
+    """
+
+    def __init__(self, failure_threshold: int = 3, error_rate_threshold: float = 0.5, min_samples: int = 5,
+                 cooldown: float = 30, max_cooldown: float = 600, probe_interval: float = 30,
+                 probe_timeout: float = 10, alpha: float = 0.2, max_parallel_probes: int = 20):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.alpha = alpha
+        self.max_parallel_probes = max_parallel_probes
+        self.policy = "strict"
+        self.probe_url: Optional[str] = None
+        self._health: dict[str, ProxyHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.trips = 0
+        session_pool.add_observer(self.record)
+
+    def configure(self, policy: str = "strict", probe_url: Optional[str] = None):
+        if policy not in PROXY_POLICIES:
+            raise ValueError(f"Неизвестная политика прокси: {policy}")
+        self.policy = policy
+        self.probe_url = probe_url
+
+    def register(self, proxies: Iterable[str]):
+        """Добавляет прокси в пул выбора (нужно для политики ``fastest``)."""
+        for proxy in proxies:
+            self._get(proxy)
+
+    def _get(self, proxy: str) -> ProxyHealth:
+        health = self._health.get(proxy)
+        if health is None:
+            health = self._health[proxy] = ProxyHealth(proxy, self.cooldown)
+        return health
+
+    def record(self, proxy: Optional[str], latency: float, error: Optional[BaseException] = None):
+        """Учитывает результат запроса через прокси."""
+        if not proxy:
+            return
+        health = self._get(proxy)
+        failed = error is not None and isinstance(error, PROXY_FAILURES)
+        health.samples += 1
+        health.error_rate += self.alpha * ((1.0 if failed else 0.0) - health.error_rate)
+        if not failed:
+            health.latency = latency if health.latency is None else \
+                health.latency + self.alpha * (latency - health.latency)
+            health.failures = 0
+            if health.state != "closed":
+                logger.info(f"🟢 Прокси {proxy_label(proxy)} снова доступен\n")
+                health.state = "closed"
+                health.cooldown = self.cooldown
+            return
+
+        health.failures += 1
+        if health.state == "half_open":
+            health.cooldown = min(self.max_cooldown, health.cooldown * 2)
+            self._open(health)
+        elif health.state == "closed" and (
+                health.failures >= self.failure_threshold
+                or (health.samples >= self.min_samples and health.error_rate >= self.error_rate_threshold)):
+            self._open(health)
+
+    def _open(self, health: ProxyHealth):
+        health.state = "open"
+        health.opened_at = time.monotonic()
+        self.trips += 1
+        metrics.inc("proxy_circuit_open_total", proxy=proxy_label(health.proxy))
+        logger.warning(f"🔴 Прокси {proxy_label(health.proxy)} выключен на {health.cooldown:.0f} сек "
+                       f"(ошибок подряд: {health.failures})\n")
+
+    def available(self, proxy: Optional[str]) -> bool:
+        if not proxy:
+            return True
+        health = self._health.get(proxy)
+        if health is None or health.state != "open":
+            return True
+        if time.monotonic() - health.opened_at >= health.cooldown:
+            # Пауза истекла: пропускаем пробный запрос
+            health.state = "half_open"
+            return True
+        return False
+
+    def _default_latency(self) -> float:
+        known = [health.latency for health in self._health.values() if health.latency is not None]
+        return sum(known) / len(known) if known else 1.0
+
+    def _fastest(self, exclude: Optional[str] = None) -> Optional[str]:
+        default_latency = self._default_latency()
+        candidates = [health for health in self._health.values()
+                      if health.proxy != exclude and self.available(health.proxy)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda health: health.score(default_latency)).proxy
+
+    def acquire(self, preferred: Optional[str]) -> Optional[str]:
+        """Выбирает прокси для профиля согласно политике и отмечает его занятым."""
+        proxy = preferred
+        if self.policy == "fastest":
+            proxy = self._fastest() or preferred
+        if proxy:
+            self._get(proxy).in_use += 1
+        return proxy
+
+    def release(self, proxy: Optional[str]):
+        health = self._health.get(proxy) if proxy else None
+        if health is not None and health.in_use:
+            health.in_use -= 1
+
+    def replacement(self, proxy: Optional[str]) -> Optional[str]:
+        """Здоровый прокси на замену отказавшему, если политика разрешает замену."""
+        if self.policy == "strict":
+            return None
+        return self._fastest(exclude=proxy)
+
+    async def probe(self, proxy: str) -> bool:
+        """Пробный запрос через прокси (``eth_chainId`` к RPC сети отправления)."""
+        if not self.probe_url:
+            return self.available(proxy)
+        session_pool.acquire(proxy)
+        try:
+            session = await session_pool.get(proxy)
+            async with session.post(
+                    self.probe_url,
+                    json={"jsonrpc": "2.0", "method": "eth_chainId", "params": [], "id": 1},
+                    proxy=session_pool.proxy_url(proxy),
+                    timeout=aiohttp.ClientTimeout(total=self.probe_timeout)
+            ) as response:
+                await response.read()
+                return response.status < 500
+        except Exception:
+            # Результат уже учтён через наблюдателя session_pool
+            return False
+        finally:
+            await session_pool.release(proxy)
+
+    async def _probe_loop(self):
+        semaphore = asyncio.Semaphore(self.max_parallel_probes)
+
+        async def probe(proxy: str):
+            async with semaphore:
+                await self.probe(proxy)
+
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            due = [health.proxy for health in self._health.values()
+                   if health.state == "open" and self.available(health.proxy)]
+            if self.policy == "fastest":
+                # Незнакомые прокси тоже проверяем, чтобы знать их задержку до выбора
+                due += [health.proxy for health in self._health.values()
+                        if health.samples == 0 and health.state == "closed"][:self.max_parallel_probes]
+            if due:
+                await asyncio.gather(*(probe(proxy) for proxy in due))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._probe_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def log_stats(self):
+        if not self._health:
+            return
+        open_count = sum(1 for health in self._health.values() if health.state != "closed")
+        message = (f"🧭 Прокси: {len(self._health)}, выключено сейчас {open_count}, "
+                   f"срабатываний выключателя {self.trips}")
+        fastest = sorted((health for health in self._health.values() if health.latency is not None),
+                         key=lambda health: health.latency)
+        if fastest:
+            message += (f", задержка: лучший {proxy_label(fastest[0].proxy)} {fastest[0].latency:.2f} сек, "
+                        f"худший {proxy_label(fastest[-1].proxy)} {fastest[-1].latency:.2f} сек")
+        logger.info(message + "\n")
+
+
+proxy_manager = ProxyManager()
@@ -0,0 +1,272 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Hashable, Optional
+from urllib.parse import urlsplit
+import asyncio
+import math
+import time
+
+import aiohttp
+
+from utils.logger import logger
+from utils.metrics import metrics, proxy_label
+from utils.session_pool import session_pool
+
+# Владелец запросов для честной очереди: профиль задаёт его через ``set_owner``,
+# фоновые задачи (отслеживание интентов, пробы прокси) идут в общей очереди ``None``
+current_owner: ContextVar[Optional[Hashable]] = ContextVar("rate_limit_owner", default=None)
+
+
+def set_owner(owner: Hashable):
+    current_owner.set(owner)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение ``Retry-After`` в секундах: число или HTTP-дата."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """Token bucket для одного хоста с подстройкой скорости по принципу AIMD.
+
+    Пока хост отвечает без ограничений и очередь не пуста, скорость растёт на
+    ``increase`` запросов/сек за секунду; на 429 (или ошибку лимита в JSON-RPC) она
+    уменьшается вдвое, не чаще раза в ``decrease_interval``. ``Retry-After`` приостанавливает
+    выдачу токенов до указанного момента. Ожидающие обслуживаются по кругу между
+    владельцами, поэтому один профиль не может занять всю очередь.
+    """
+
+    def __init__(self, host: str, rate: float, min_rate: float = 0.5, max_rate: Optional[float] = None,
+                 burst: Optional[float] = None, increase: float = 2.0, decrease: float = 0.5,
+                 decrease_interval: float = 1.0, proxy: Optional[str] = None):
+        self.host = host
+        self.proxy = proxy
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 10
+        self.burst = burst or max(1.0, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.decrease_interval = decrease_interval
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._queues: OrderedDict[Optional[Hashable], deque[asyncio.Future]] = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.limited = 0
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self):
+        self.requests += 1
+        self._refill()
+        if not self._queues and self.tokens >= 1 and time.monotonic() >= self.blocked_until:
+            self.tokens -= 1
+            return
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        owner = current_owner.get()
+        self._queues.setdefault(owner, deque()).append(future)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await future
+        finally:
+            if not future.done():
+                future.cancel()
+            waited = time.monotonic() - started
+            self.waited += waited
+            metrics.observe("rate_limit_wait_seconds", waited, host=self.host)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        while self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            # Владелец уходит в конец круга, даже если у него ещё есть ожидающие
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+            if not future.done():
+                return future
+        return None
+
+    async def _dispatch(self):
+        while self._queues:
+            delay = self.blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            future = self._next_waiter()
+            if future is not None:
+                self.tokens -= 1
+                future.set_result(None)
+
+    @property
+    def title(self) -> str:
+        return f"{self.host} через {proxy_label(self.proxy)}" if self.proxy else self.host
+
+    def record(self, limited: bool, retry_after: Optional[float] = None):
+        """Учитывает ответ хоста: ``limited`` — 429 или ошибка лимита в теле ответа."""
+        now = time.monotonic()
+        if not limited:
+            if self.queued or self.tokens < 1:
+                # Растём только когда лимитер действительно сдерживает поток
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            return
+
+        self.limited += 1
+        metrics.inc("rate_limited_total", host=self.host)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        if now - self._last_decrease >= self.decrease_interval:
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            logger.warning(f"🚦 {self.title}: превышен лимит запросов, снижаем скорость до {self.rate:.1f}/сек"
+                           + (f", пауза {retry_after:.1f} сек" if retry_after else "") + "\n")
+
+
+class _BucketStats:
+    """Сводная статистика нескольких вёдер одного хоста (в том числе уже удалённых из реестра)."""
+
+    __slots__ = ("buckets", "requests", "limited", "waited", "min_rate", "max_rate")
+
+    def __init__(self):
+        self.buckets = 0
+        self.requests = 0
+        self.limited = 0
+        self.waited = 0.0
+        self.min_rate = math.inf
+        self.max_rate = 0.0
+
+    def add(self, limiter: HostLimiter):
+        self.buckets += 1
+        self.requests += limiter.requests
+        self.limited += limiter.limited
+        self.waited += limiter.waited
+        self.min_rate = min(self.min_rate, limiter.rate)
+        self.max_rate = max(self.max_rate, limiter.rate)
+
+    def copy(self) -> "_BucketStats":
+        stats = _BucketStats()
+        for name in self.__slots__:
+            setattr(stats, name, getattr(self, name))
+        return stats
+
+
+class RateLimiter:
+    """Реестр ограничителей частоты по хостам и обёртка над запросами aiohttp.
+
+    Лимиты RPC и API Relay считаются по IP клиента, поэтому у запросов через прокси своё
+    ведро на пару (хост, прокси): 429 через один прокси не замедляет остальные. Запросы
+    без прокси делят одно ведро хоста. Вёдра прокси удаляются, когда прокси больше не
+    использует ни один профиль (см. ``SessionPool.release``), поэтому их число зависит
+    от concurrency, а не от числа прокси в прогоне.
+    """
+
+    def __init__(self, rate: float = 20):
+        self.rate = rate
+        self._hosts: dict[tuple[str, Optional[str]], HostLimiter] = {}
+        self._retired: dict[str, _BucketStats] = {}
+
+    def configure(self, rate: float):
+        """``rate`` — начальная скорость запросов к одному хосту в секунду, 0 — без ограничения."""
+        self.rate = rate
+        self._hosts.clear()
+        self._retired.clear()
+
+    def forget(self, proxy: Optional[str]):
+        """Удаляет вёдра прокси из proxies.txt, сохраняя их счётчики для отчёта."""
+        proxy = session_pool.proxy_url(proxy)
+        if proxy is None:
+            return
+        for key in [key for key in self._hosts if key[1] == proxy]:
+            limiter = self._hosts[key]
+            if limiter.queued:
+                # Запросы ещё ждут токен: ведро остаётся до следующего освобождения прокси
+                continue
+            del self._hosts[key]
+            if limiter.requests:
+                self._retired.setdefault(limiter.host, _BucketStats()).add(limiter)
+
+    def get(self, url: str, proxy: Optional[str] = None) -> Optional[HostLimiter]:
+        """Ограничитель запросов к хосту ``url`` через ``proxy`` (``None`` — без прокси)."""
+        if not self.rate:
+            return None
+        host = urlsplit(url).netloc or url
+        limiter = self._hosts.get((host, proxy))
+        if limiter is None:
+            limiter = self._hosts[(host, proxy)] = HostLimiter(host, self.rate, proxy=proxy)
+        return limiter
+
+    @asynccontextmanager
+    async def request(self, session: aiohttp.ClientSession, method: str, url: str, max_attempts: int = 3,
+                      **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """``session.request`` с ожиданием токена хоста; на 429 повторяет после ``Retry-After``."""
+        limiter = self.get(url, kwargs.get("proxy"))
+        for attempt in range(1, max_attempts + 1):
+            if limiter is not None:
+                await limiter.acquire()
+            response = await session.request(method, url, **kwargs)
+            limited = response.status == 429
+            if limiter is not None:
+                limiter.record(limited, parse_retry_after(response.headers.get("Retry-After")))
+            if limited and attempt < max_attempts:
+                response.release()
+                metrics.inc("rate_limit_retries_total", host=urlsplit(url).netloc)
+                if limiter is None:
+                    await asyncio.sleep(parse_retry_after(response.headers.get("Retry-After")) or 1)
+                continue
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    def log_stats(self):
+        # Вёдра прокси одного хоста сводятся в одну строку, иначе отчёт растёт с числом прокси
+        groups: dict[tuple[str, bool], _BucketStats] = {}
+        for host, retired in self._retired.items():
+            groups[(host, True)] = retired.copy()
+        for limiter in self._hosts.values():
+            if limiter.requests:
+                groups.setdefault((limiter.host, limiter.proxy is not None), _BucketStats()).add(limiter)
+        rows = []
+        for (host, proxied), stats in groups.items():
+            title = f"{host} через прокси ({stats.buckets})" if proxied else host
+            rate = (f"{stats.min_rate:.1f}" if stats.min_rate == stats.max_rate
+                    else f"{stats.min_rate:.1f}–{stats.max_rate:.1f}")
+            rows.append(f"    {title}: скорость {rate}/сек, запросов {stats.requests}, "
+                        f"ограничений {stats.limited}, ожидание {stats.waited:.1f} сек")
+        if rows:
+            logger.info("🚦 Ограничение частоты запросов:\n" + "\n".join(rows) + "\n")
+
+
+rate_limiter = RateLimiter()
+session_pool.add_release_listener(rate_limiter.forget)
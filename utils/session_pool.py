@@ -0,0 +1,179 @@
+from typing import Callable, Optional
+import asyncio
+
+import aiohttp
+
+from utils.logger import logger
+
+
+class SessionPool:
+    """Пул долгоживущих aiohttp-сессий, по одной на каждый прокси.
+
+    Сессии создаются при первом обращении, поэтому TCP+TLS рукопожатие через прокси
+    выполняется один раз, а не на каждый запрос. Владельцы сессии отмечаются через
+    ``acquire``/``release``: когда последний из них освобождает прокси, сессия закрывается,
+    и число открытых сессий определяется активными профилями, а не размером прогона.
+    Статистика собирается через ``aiohttp.TraceConfig``; наблюдатели из ``add_observer``
+    получают задержку и исход каждого запроса вместе с прокси.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, keepalive_timeout: float = 60,
+                 dns_cache_ttl: int = 300, timeout: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self._sessions: dict[Optional[str], aiohttp.ClientSession] = {}
+        self._users: dict[Optional[str], int] = {}
+        self._lock = asyncio.Lock()
+        self._observers: list[Callable[[Optional[str], float, Optional[BaseException]], None]] = []
+        self._release_listeners: list[Callable[[Optional[str]], None]] = []
+        self.sessions_created = 0
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    @staticmethod
+    def proxy_url(proxy: Optional[str]) -> Optional[str]:
+        """Приводит прокси из proxies.txt к URL для aiohttp."""
+        if not proxy:
+            return None
+        return proxy if "://" in proxy else f"http://{proxy}"
+
+    def add_observer(self, observer: Callable[[Optional[str], float, Optional[BaseException]], None]):
+        """Регистрирует ``observer(proxy, latency, error)``, вызываемый после каждого запроса."""
+        self._observers.append(observer)
+
+    def add_release_listener(self, listener: Callable[[Optional[str]], None]):
+        """Регистрирует ``listener(proxy)``, вызываемый, когда прокси больше никто не использует."""
+        self._release_listeners.append(listener)
+
+    def _notify(self, proxy: Optional[str], context, error: Optional[BaseException] = None):
+        started = getattr(context, "started", None)
+        if started is None:
+            return
+        latency = asyncio.get_running_loop().time() - started
+        for observer in self._observers:
+            observer(proxy, latency, error)
+
+    def _trace_config(self, proxy: Optional[str] = None) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(_, context, __):
+            self.requests += 1
+            context.started = asyncio.get_running_loop().time()
+
+        async def on_request_end(_, context, __):
+            self._notify(proxy, context)
+
+        async def on_request_exception(_, context, params):
+            self._notify(proxy, context, params.exception)
+
+        async def on_connection_create_end(*_):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(*_):
+            self.connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _create_session(self, proxy: Optional[str] = None) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[self._trace_config(proxy)]
+        )
+
+    async def get(self, proxy: Optional[str] = None) -> aiohttp.ClientSession:
+        """Возвращает общую сессию для прокси. Сам прокси передаётся в каждый запрос."""
+        session = self._sessions.get(proxy)
+        if session is not None and not session.closed:
+            return session
+
+        async with self._lock:
+            session = self._sessions.get(proxy)
+            if session is None or session.closed:
+                session = self._create_session(proxy)
+                self._sessions[proxy] = session
+                self.sessions_created += 1
+            return session
+
+    def acquire(self, proxy: Optional[str] = None):
+        """Отмечает, что прокси используется, и его сессию нельзя закрывать."""
+        self._users[proxy] = self._users.get(proxy, 0) + 1
+
+    async def release(self, proxy: Optional[str] = None):
+        """Снимает отметку ``acquire``; сессия закрывается, когда прокси больше никто не использует."""
+        users = self._users.get(proxy, 0) - 1
+        if users > 0:
+            self._users[proxy] = users
+            return
+        self._users.pop(proxy, None)
+        for listener in self._release_listeners:
+            listener(proxy)
+        session = self._sessions.pop(proxy, None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    @property
+    def open_connections(self) -> int:
+        total = 0
+        for session in self._sessions.values():
+            connector = session.connector
+            if connector is None or connector.closed:
+                continue
+            # У aiohttp нет публичного счётчика соединений
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            total += idle + len(getattr(connector, "_acquired", ()))
+        return total
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "sessions": self.sessions_created,
+            "open_sessions": len(self._sessions),
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+            "open_connections": self.open_connections
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"🌐 HTTP-пул: сессий {stats['sessions']} (активных {stats['open_sessions']}), "
+            f"запросов {stats['requests']}, новых соединений {stats['connections_created']}, переиспользовано {stats['connections_reused']} "
+            f"(доля {stats['reuse_ratio']:.1%}), открыто {stats['open_connections']}\n"
+        )
+
+    async def close(self):
+        """Закрывает все сессии пула. Вызывается один раз при завершении прогона."""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        self._users.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+        # Даём SSL-транспортам корректно закрыться
+        await asyncio.sleep(0.25)
+
+
+session_pool = SessionPool()
@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+import importlib
+import time
+
+from utils.logger import logger
+
+STARTED_AT = time.perf_counter()
+
+
+class StartupReport:
+    """Замеры времени запуска: этапы и импорт тяжёлых модулей.
+
+    Модули импортируются по очереди, поэтому время каждого — это прирост относительно
+    уже загруженных до него (как в ``python -X importtime``, но только для верхнего уровня).
+    """
+
+    def __init__(self):
+        self.phases: list[tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def import_modules(self, *names: str):
+        for name in names:
+            with self.phase(f"import {name}"):
+                importlib.import_module(name)
+
+    def log(self):
+        total = time.perf_counter() - STARTED_AT
+        lines = [f"⏱️ Время запуска: {total:.3f} сек"]
+        for name, duration in sorted(self.phases, key=lambda phase: phase[1], reverse=True):
+            lines.append(f"    {duration:8.3f} сек  {name}")
+        logger.info("\n".join(lines) + "\n")
+
+
+startup = StartupReport()
@@ -0,0 +1,305 @@
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+import json
+import os
+import sqlite3
+import time
+
+from utils.journal import key_fingerprint
+from utils.logger import logger
+from utils.profiles import Profile, iter_profiles
+
+T = TypeVar("T")
+
+
+class Shard:
+    """Непрерывный диапазон строк файла ключей, который обрабатывает один воркер."""
+    __slots__ = ("shard_id", "first_line", "last_line", "stolen")
+
+    def __init__(self, shard_id: int, first_line: int, last_line: int, stolen: bool = False):
+        self.shard_id = shard_id
+        self.first_line = first_line
+        self.last_line = last_line
+        # Шард забран у воркера, который перестал продлевать аренду
+        self.stolen = stolen
+
+    def __contains__(self, line: int) -> bool:
+        return self.first_line <= line <= self.last_line
+
+    def __repr__(self) -> str:
+        return f"Shard({self.shard_id}, lines {self.first_line}-{self.last_line})"
+
+
+class WorkQueue:
+    """Очередь шардов профилей в SQLite для нескольких процессов (и хостов с общим диском).
+
+    Координатор делит файл ключей на шарды по ``shard_size`` профилей. Воркеры забирают
+    шарды по одному по мере освобождения (``claim``), поэтому быстрый воркер успевает
+    обработать больше — это и есть перераспределение работы. Шард принадлежит одному
+    воркеру, пока тот продлевает аренду (``heartbeat``); каждый кошелёк входит ровно в
+    один шард (повторы ключа в файле пропускаются), поэтому nonce одного адреса никогда
+    не выдают два процесса. Шард воркера, переставшего продлевать аренду, забирает другой,
+    но не раньше чем через ``grace`` секунд после её истечения: прежний владелец перед каждой
+    отправкой транзакции проверяет аренду (``owns``) и за это время перестаёт отправлять.
+    """
+
+    def __init__(self, path: str = "data/queue.sqlite3", lease: float = 60.0, grace: float = 30.0):
+        self.path = path
+        self.lease = lease
+        self.grace = grace
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Чужой процесс может держать блокировку записи, пока забирает шард
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY,
+                first_line INTEGER NOT NULL,
+                last_line INTEGER NOT NULL,
+                profiles INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL,
+                claims INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS duplicate_lines (
+                line INTEGER PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat REAL NOT NULL,
+                shards INTEGER NOT NULL DEFAULT 0,
+                succeeded INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                elapsed REAL NOT NULL DEFAULT 0,
+                finished INTEGER NOT NULL DEFAULT 0,
+                metrics TEXT
+            );
+        """)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def create(self, profiles: Iterable[Profile], shard_size: int) -> int:
+        """Заполняет очередь заново: шарды по ``shard_size`` профилей. Возвращает число шардов."""
+        shards, duplicates = [], []
+        seen: set[bytes] = set()
+        current: list[int] = []
+        for profile in profiles:
+            fingerprint = bytes.fromhex(key_fingerprint(profile.private_key))
+            if fingerprint in seen:
+                duplicates.append((profile.line,))
+                continue
+            seen.add(fingerprint)
+            current.append(profile.line)
+            if len(current) >= shard_size:
+                shards.append((len(shards), current[0], current[-1], len(current)))
+                current = []
+        if current:
+            shards.append((len(shards), current[0], current[-1], len(current)))
+
+        with self._transaction():
+            self._conn.execute("DELETE FROM shards")
+            self._conn.execute("DELETE FROM duplicate_lines")
+            self._conn.execute("DELETE FROM workers")
+            self._conn.executemany(
+                "INSERT INTO shards (shard_id, first_line, last_line, profiles) VALUES (?, ?, ?, ?)", shards
+            )
+            self._conn.executemany("INSERT INTO duplicate_lines (line) VALUES (?)", duplicates)
+        if duplicates:
+            logger.warning(f"⚠️ Повторяющихся приватных ключей: {len(duplicates)}, повторы пропущены\n")
+        return len(shards)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: два воркера не заберут один шард
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def duplicate_lines(self) -> set[int]:
+        return {line for line, in self._conn.execute("SELECT line FROM duplicate_lines")}
+
+    def claim(self, worker_id: str) -> Optional[Shard]:
+        """Забирает свободный шард или шард с истёкшей арендой; ``None`` — работы не осталось."""
+        now = time.time()
+        with self._transaction():
+            row = self._conn.execute(
+                """SELECT shard_id, first_line, last_line, claims FROM shards
+                   WHERE state = 'pending' OR (state = 'claimed' AND lease_until < ?)
+                   ORDER BY shard_id LIMIT 1""", (now - self.grace,)
+            ).fetchone()
+            if row is None:
+                return None
+            shard_id, first_line, last_line, claims = row
+            self._conn.execute(
+                """UPDATE shards SET state = 'claimed', owner = ?, lease_until = ?, claims = claims + 1
+                   WHERE shard_id = ?""", (worker_id, now + self.lease, shard_id)
+            )
+        return Shard(shard_id, first_line, last_line, stolen=claims > 0)
+
+    def owns(self, worker_id: str, shard_id: int) -> bool:
+        """Шард принадлежит воркеру и его аренда ещё не истекла."""
+        row = self._conn.execute(
+            "SELECT 1 FROM shards WHERE shard_id = ? AND state = 'claimed' AND owner = ? AND lease_until > ?",
+            (shard_id, worker_id, time.time())
+        ).fetchone()
+        return row is not None
+
+    def complete(self, worker_id: str, shard_id: int):
+        self._conn.execute("UPDATE shards SET state = 'done', lease_until = NULL WHERE shard_id = ? AND owner = ?",
+                           (shard_id, worker_id))
+
+    def release(self, worker_id: Optional[str] = None):
+        """Возвращает незавершённые шарды воркера (или всех воркеров) в очередь, например после падения."""
+        if worker_id is None:
+            self._conn.execute("UPDATE shards SET state = 'pending', lease_until = NULL WHERE state = 'claimed'")
+            return
+        self._conn.execute("UPDATE shards SET state = 'pending', lease_until = NULL "
+                           "WHERE state = 'claimed' AND owner = ?", (worker_id,))
+
+    def heartbeat(self, worker_id: str, stats: Optional[dict] = None, metrics: Optional[dict] = None,
+                  finished: bool = False) -> set[int]:
+        """Продлевает аренду шардов воркера и сохраняет его статистику и метрики.
+
+        Возвращает шарды, которые по-прежнему принадлежат воркеру; шард с истёкшей
+        арендой воркеру больше не принадлежит, даже если его ещё никто не забрал.
+        """
+        now = time.time()
+        stats = stats or {}
+        with self._transaction():
+            # Истёкшая аренда не продлевается: воркер мог уже отказаться от отправок по этому шарду
+            self._conn.execute("UPDATE shards SET lease_until = ? WHERE state = 'claimed' AND owner = ? "
+                               "AND lease_until > ?", (now + self.lease, worker_id, now))
+            self._conn.execute(
+                """INSERT INTO workers (worker_id, heartbeat, shards, succeeded, failed, elapsed, finished, metrics)
+                   VALUES (?, ?, (SELECT COUNT(*) FROM shards WHERE owner = ? AND state = 'done'), ?, ?, ?, ?, ?)
+                   ON CONFLICT (worker_id) DO UPDATE SET
+                       heartbeat = excluded.heartbeat, shards = excluded.shards, succeeded = excluded.succeeded,
+                       failed = excluded.failed, elapsed = excluded.elapsed, finished = excluded.finished,
+                       metrics = COALESCE(excluded.metrics, workers.metrics)""",
+                (worker_id, now, worker_id, stats.get("succeeded", 0), stats.get("failed", 0),
+                 stats.get("elapsed", 0.0), int(finished), json.dumps(metrics) if metrics is not None else None)
+            )
+            return {shard_id for shard_id, in self._conn.execute(
+                "SELECT shard_id FROM shards WHERE state = 'claimed' AND owner = ? AND lease_until > ?",
+                (worker_id, now))}
+
+    def remaining(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM shards WHERE state != 'done'").fetchone()[0]
+
+    def progress(self) -> tuple[int, int]:
+        """(готовых шардов, всего шардов)"""
+        done, total = self._conn.execute(
+            "SELECT COALESCE(SUM(state = 'done'), 0), COUNT(*) FROM shards"
+        ).fetchone()
+        return done, total
+
+    def workers(self) -> list[dict]:
+        columns = ("worker_id", "heartbeat", "shards", "succeeded", "failed", "elapsed", "finished", "metrics")
+        rows = self._conn.execute(f"SELECT {', '.join(columns)} FROM workers ORDER BY worker_id").fetchall()
+        workers = [dict(zip(columns, row)) for row in rows]
+        for worker in workers:
+            worker["metrics"] = json.loads(worker["metrics"]) if worker["metrics"] else None
+        return workers
+
+
+class ShardedProfiles:
+    """Задания воркера из очереди шардов: шарды забираются лениво, когда полосам планировщика нужна работа.
+
+    Файлы ключей и прокси читаются одним проходом вперёд; если забранный шард лежит
+    раньше текущей позиции (например, отобран у упавшего воркера), чтение начинается заново.
+    Шард отмечается выполненным, когда завершены все его задания (``done``).
+    """
+
+    def __init__(self, queue: WorkQueue, worker_id: str, private_keys_path: str, proxies_path: str,
+                 on_claim: Optional[Callable[[Shard, list[Profile]], None]] = None):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.private_keys_path = private_keys_path
+        self.proxies_path = proxies_path
+        self.on_claim = on_claim
+        self.duplicates = queue.duplicate_lines()
+        self.claimed = 0
+        self._profiles: Optional[Iterator[Profile]] = None
+        self._lookahead: Optional[Profile] = None
+        # Незавершённые задания по шардам и шарды, все задания которых уже выданы
+        self._outstanding: dict[int, int] = {}
+        self._dispatched: set[int] = set()
+        self._shards: list[Shard] = []
+        self._lost: set[int] = set()
+
+    def _read(self, shard: Shard) -> list[Profile]:
+        if self._lookahead is None or self._lookahead.line > shard.first_line:
+            self._profiles = iter_profiles(self.private_keys_path, self.proxies_path)
+            self._lookahead = next(self._profiles, None)
+
+        profiles = []
+        while self._lookahead is not None and self._lookahead.line <= shard.last_line:
+            profile = self._lookahead
+            self._lookahead = next(self._profiles, None)
+            if profile.line >= shard.first_line and profile.line not in self.duplicates:
+                profiles.append(profile)
+        return profiles
+
+    def jobs(self, expand: Callable[[list[Profile]], Iterable[T]]) -> Iterator[T]:
+        """Задания всех забранных шардов: ``expand`` превращает профили шарда в задания."""
+        while True:
+            shard = self.queue.claim(self.worker_id)
+            if shard is None:
+                return
+            self.claimed += 1
+            profiles = self._read(shard)
+            if self.on_claim is not None:
+                self.on_claim(shard, profiles)
+            self._shards.append(shard)
+            self._outstanding[shard.shard_id] = 0
+            for job in expand(profiles):
+                if shard.shard_id in self._lost:
+                    logger.warning(f"⚠️ {self.worker_id}: аренда шарда #{shard.shard_id} истекла, "
+                                   f"его оставшиеся профили обработает другой воркер\n")
+                    break
+                self._outstanding[shard.shard_id] += 1
+                yield job
+            self._dispatched.add(shard.shard_id)
+            self._complete(shard)
+
+    def keep(self, owned: set[int]):
+        """Отмечает потерянными шарды, которые очередь уже отдала другому воркеру."""
+        for shard in self._shards:
+            if shard.shard_id not in owned:
+                self._lost.add(shard.shard_id)
+
+    def owns(self, line: int) -> bool:
+        """Шард профиля из строки ``line`` по-прежнему принадлежит воркеру (аренда не истекла)."""
+        for shard in self._shards:
+            if line in shard:
+                return shard.shard_id not in self._lost and self.queue.owns(self.worker_id, shard.shard_id)
+        return False
+
+    def done(self, line: int):
+        """Задание профиля из строки ``line`` завершено."""
+        for shard in self._shards:
+            if line in shard:
+                self._outstanding[shard.shard_id] -= 1
+                self._complete(shard)
+                return
+
+    def _complete(self, shard: Shard):
+        if shard.shard_id in self._dispatched and not self._outstanding[shard.shard_id]:
+            if shard.shard_id not in self._lost:
+                self.queue.complete(self.worker_id, shard.shard_id)
+            self._shards.remove(shard)
+            self._dispatched.discard(shard.shard_id)
+            del self._outstanding[shard.shard_id]
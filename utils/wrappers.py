@@ -1,3 +1,5 @@
+from typing import Optional
+
 from eth_typing import ChecksumAddress
 from web3 import AsyncWeb3
 
@@ -30,7 +32,8 @@ WETH_ABI = [
 ]
 
 
-async def wrap_native_token(w3: AsyncWeb3, network: str, amount_wei: int, wallet_address: ChecksumAddress):
+async def wrap_native_token(w3: AsyncWeb3, network: str, amount_wei: int, wallet_address: ChecksumAddress,
+                            nonce: Optional[int] = None):
     """Оборачивает нативный токен в WETH/WBNB/..."""
     token_address = WRAPPED_NATIVE_ADDRESSES[network.upper()]
     token_address = AsyncWeb3.to_checksum_address(token_address)
@@ -42,21 +45,22 @@ async def wrap_native_token(w3: AsyncWeb3, network: str, amount_wei: int, wallet
     tx = await contract.functions.deposit().build_transaction({
         "from": wallet_address,
         "value": amount_wei,
-        "nonce": await w3.eth.get_transaction_count(wallet_address),
+        "nonce": nonce if nonce is not None else await w3.eth.get_transaction_count(wallet_address),
         "gas": int(gas_estimate * 1.2),
         "gasPrice": await w3.eth.gas_price
     })
     return tx
 
 
-async def unwrap_native_token(w3: AsyncWeb3, network: str, amount_wei: int, wallet_address: ChecksumAddress):
+async def unwrap_native_token(w3: AsyncWeb3, network: str, amount_wei: int, wallet_address: ChecksumAddress,
+                              nonce: Optional[int] = None):
     """Разворачивает WETH/WBNB/... обратно в нативный токен"""
     token_address = WRAPPED_NATIVE_ADDRESSES[network.upper()]
     token_address = AsyncWeb3.to_checksum_address(token_address)
     contract = w3.eth.contract(address=token_address, abi=WETH_ABI)
     tx = await contract.functions.withdraw(amount_wei).build_transaction({
         "from": wallet_address,
-        "nonce": await w3.eth.get_transaction_count(wallet_address),
+        "nonce": nonce if nonce is not None else await w3.eth.get_transaction_count(wallet_address),
         "gas": 100_000,
         "gasPrice": await w3.eth.gas_price
     })